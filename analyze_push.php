@@ -3,6 +3,7 @@
 // SPE - Analyze pending texts via FastAPI (batch)
 // - Splits display into "Reflection" and "Peer comments"
 // - Updates spe_sentiment.{sentiment,label,status}
+// - Stores the pre-threshold features in spe_sentiment_feat (for /relabel)
 // - Uses X-API-Token header (from plugin setting 'sentiment_api_token')
 //   and API URL from 'sentiment_live_url' (e.g., http://127.0.0.1:8000/analyze)
 // - If the API is not reachable, attempt to bootstrap it (Windows) via api_boot.php
@@ -144,7 +145,13 @@ foreach ($pendings as $row) {
 if (count($items) > 2000) {
     $items = array_slice($items, 0, 2000);
 }
-$payload = json_encode(['items' => $items], JSON_UNESCAPED_UNICODE);
+// Only compound + label (+ features for relabeling) are stored; the API skips everything else.
+// 'activity' selects the analyzer profile mapped to this SPE instance, if any.
+$payload = json_encode([
+    'items'    => $items,
+    'fields'   => ['compound', 'label', 'features'],
+    'activity' => (int)$cm->instance,
+], JSON_UNESCAPED_UNICODE);
 
 // ---------------------------------------------------------------------------
 // Call FastAPI with token header
@@ -230,6 +237,13 @@ if (!isset($data->results) || !is_array($data->results)) {
 // Update database & render
 // ---------------------------------------------------------------------------
 $processedids = [];
+$hasfeat = $DB->get_manager()->table_exists('spe_sentiment_feat');
+$featcols = [
+    'base' => 'base', 'contrast' => 'contrast', 'extreme' => 'extreme',
+    'neutral_cue' => 'neutralcue', 'strong_pos' => 'strongpos', 'strong_neg' => 'strongneg',
+    'toxic' => 'toxic', 'length' => 'textlength',
+];
+$feats = [];   // sentimentid => feature row, written in one batch below
 
 foreach ($data->results as $res) {
     $id = (int)($res->id ?? 0);
@@ -243,11 +257,31 @@ foreach ($data->results as $res) {
         $row->sentiment    = $compound;
         $row->label        = $label;
         $row->status       = 'done';
+        $row->leaseowner   = null;     // release any worker claim
+        $row->leaseuntil   = 0;
         $row->timemodified = time();
         $DB->update_record('spe_sentiment', $row);
+
+        if ($hasfeat && isset($res->features) && is_object($res->features)) {
+            $feat = (object)['sentimentid' => $id, 'timemodified' => time()];
+            foreach ($featcols as $key => $col) {
+                $v = $res->features->{$key} ?? null;
+                $feat->{$col} = is_bool($v) ? (int)$v : $v;
+            }
+            $feats[$id] = $feat;
+        }
     }
 }
 
+// Replace the feature rows of all analyzed items: one delete + one bulk insert.
+if ($feats) {
+    $transaction = $DB->start_delegated_transaction();
+    list($finsql, $finparams) = $DB->get_in_or_equal(array_keys($feats), SQL_PARAMS_NAMED, 'f');
+    $DB->delete_records_select('spe_sentiment_feat', "sentimentid $finsql", $finparams);
+    $DB->insert_records('spe_sentiment_feat', array_values($feats));
+    $transaction->allow_commit();
+}
+
 if (!$processedids) {
     echo $OUTPUT->notification('No items were processed (check API token).', 'notifyinfo');
     $back = new moodle_url('/mod/spe/instructor.php', ['id' => $cm->id]);
@@ -288,6 +322,15 @@ echo html_writer::div(
     'alert alert-success'
 );
 
+// Items the API skipped because the request ran out of its time budget stay pending.
+$deferred = (isset($data->deferred) && is_array($data->deferred)) ? count($data->deferred) : 0;
+if ($deferred) {
+    echo $OUTPUT->notification(
+        $deferred . ' item(s) were deferred by the Sentiment API time budget and are still pending — run the analysis again.',
+        'notifywarning'
+    );
+}
+
 // Label badge
 $badge = function (string $label): string {
     $style = 'background:#6c757d;';
@@ -6,38 +6,62 @@
 # - Disparity detection between numeric score and text sentiment
 # - Unified /analyze endpoint (single or batch), plus CORS and /health
 # - HTTP 204 preflight for OPTIONS /analyze
+# - Opt-in per-request stage timings and sampled flame-graph profiles
+# - In-tree fast VADER core (bit-for-bit equal to vaderSentiment, see selfcheck)
+# - Tiered modes: "live" (display-only badge approximation) and "full" (anything stored)
+# - Prefork supervisor: N workers on one socket, warm-up, rolling restarts
+# - Offline bulk mode: stream JSONL/CSV through all cores, JSONL/CSV out
+# - Database worker: drains pending spe_sentiment rows with leases + bulk writes
+# - Optional near-duplicate clustering of batch items (MinHash + LSH)
+# - Worst-case latency guards: text/sentence budgets, batch CPU deadline
+# - Read-only lexicon tables, one analyzer shared by all threads (free-threaded CPython)
+# - Feature store: relabel an activity from stored features (POST /relabel)
+# - Per-activity analyzer profiles (SPE_PROFILES) in a bounded LRU (GET /profiles)
+# - Opt-in sampled traffic capture (SPE_CAPTURE_FILE) for spe_replay.py
+# - Draft prefetch: idle-time analysis of autosaves so batches hit warm results
+#
+# This module holds the app, its routes and the CLI. The pipeline lives next
+# to it: spe_config (settings), spe_vader + spe_lexicon (scoring tables),
+# spe_core (analysis), spe_schemas, spe_profiles, spe_profiling, spe_neardup,
+# spe_prefetch, spe_capture, spe_db, spe_prefork, spe_bulk and spe_bench.
 from __future__ import annotations
 
+from time import perf_counter
 from typing import List, Optional, Tuple, Dict
+import argparse
+import json
 import os
-import re
+import sys
+import threading
+import time
 
 from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
-from pydantic import BaseModel
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 
-# =============================================================================
-# Configuration / thresholds
-# =============================================================================
-SCORE_MIN_DEFAULT: float = 5
-SCORE_MAX_DEFAULT: float = 25
-
-DISPARITY_LOW_MIN: float = 5
-DISPARITY_LOW_MAX: float = 10
-DISPARITY_HIGH_MIN: float = 20
-DISPARITY_HIGH_MAX: float = 25
-
-# Polarity thresholds (after mapping VADER compound → [0,1])
-POS_THR: float = 0.62
-NEG_THR: float = 0.44
-
-API_TOKEN: str = os.environ.get("SPE_API_TOKEN", "").strip()
-BIND_HOST: str = os.environ.get("SPE_BIND", "127.0.0.1")
-PORT: int = int(os.environ.get("PORT", "8000"))
-RELOAD: bool = os.environ.get("RELOAD", "").lower() == "true"
+from spe_bench import bench_guards, bench_projection, bench_threads, bench_vader, mode_agreement_report, selfcheck
+from spe_bulk import bulk_analyze
+from spe_capture import CaptureMiddleware, traffic_capture
+from spe_config import API_TOKEN, BIND_HOST, DB_PREFIX, DB_URL, NEG_THR, PORT, POS_THR, PROFILE_DIR, RELOAD
+from spe_core import ANALYZE_FIELDS, analyze_text_fields, analyze_text_full, cpu_deadline
+from spe_db import SentimentDB, SentimentWorker, backfill_features, relabel_activity
+from spe_neardup import near_duplicate_clusters
+from spe_prefetch import WarmResult, draft_prefetch
+from spe_prefork import PreforkSupervisor, find_running_instance
+from spe_profiles import CompiledProfile, analyzer_profiles
+from spe_profiling import StackSampler, lap, server_timing_header, should_sample_profile, timings_requested
+from spe_schemas import (
+    AnalyzeBatchOut,
+    AnalyzeItemOut,
+    AnalyzeMode,
+    AnalyzeOut,
+    AnalyzeUnifiedIn,
+    LabelRules,
+    NearDupIn,
+    PrefetchIn,
+    RelabelIn,
+)
 
 # =============================================================================
 # App setup
@@ -53,516 +77,467 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-analyzer = SentimentIntensityAnalyzer()
-
-# =============================================================================
-# Lexicon tuning (polite academic negatives & phrase collapsing)
-# =============================================================================
-CUSTOM_WEAK_NEG: Dict[str, float] = {
-    "concern": -2.6,
-    "concerns": -2.6,
-    "issue": -2.6,
-    "issues": -2.6,
-    "problem": -2.9,
-    "problems": -2.9,
-    "challenge": -2.6,
-    "challenges": -2.6,
-    "difficult": -2.1,
-    "difficulty": -2.1,
-    "difficulties": -2.1,
-    "delay": -2.5,
-    "delayed": -2.5,
-    "late": -2.5,
-    "inconsistent": -2.6,
-    "inconsistency": -2.6,
-    "struggle": -2.7,
-    "struggles": -2.7,
-    "struggling": -2.7,
-    "unreliable": -3.0,
-    "unresponsive": -3.0,
-    "lack": -2.4,
-    "lacking": -2.4,
-    "insufficient": -2.6,
-    "inflexible": -2.8,
-    "dominating": -2.8,
-    "dominant": -2.6,
-    "needs": -1.2,
-    "improvement": -1.2,
-    "improve": -1.2,
-    "improving": -1.0,
-    "blocking": -2.9,
-    "obstructive": -3.2,
-    "conflict": -2.9,
-    "frustrating": -3.0,
-    "frustration": -3.0,
-}
-analyzer.lexicon.update(CUSTOM_WEAK_NEG)
-
-PHRASE_PATTERNS: Dict[str, str] = {
-    r"\b(can\s+)?create\s+challenges\b": "create_challenges",
-    r"\b(could\s+)?create\s+challenges\b": "create_challenges",
-    r"\b(dominate|dominates|dominating)\s+discussions?\b": "dominate_discussions",
-    r"\brush\s+through\s+tasks?\b": "rush_through_tasks",
-    r"\bminor\s+misunderstandings?\b": "minor_misunderstandings",
-    r"\b(in)?consistenc(y|ies)\b": "inconsistencies",
-    r"\bstrong\s+opinions\b": "strong_opinions",
-    r"\b(in)?flexible\b": "inflexible",
-    r"\btime\s+management\s+could\s+improve\b": "time_mgmt_could_improve",
-    r"\bdelays?\s+in\s+completing\b": "delays_in_completing",
-    r"\baffect(s|ed)?\s+overall\s+progress\b": "affects_overall_progress",
-    r"\bneeds?\s+improvement\b": "needs_improvement",
-    r"\b(in\s+)need\s+of\s+improvement\b": "needs_improvement",
-    r"\broom\s+for\s+improvement\b": "room_for_improvement",
-    r"\bnot\s+always\s+take\s+a\s+leading\s+role\b": "not_leading_role",
-    r"\b(quiet|understated)\b": "quiet_understated",
-    r"\b(neutral|balanced|steady|dependable)\s+member\b": "neutral_member",
-}
-PHRASE_LEXICON: Dict[str, float] = {
-    "create_challenges": -3.1,
-    "dominate_discussions": -3.0,
-    "rush_through_tasks": -2.7,
-    "minor_misunderstandings": -1.8,
-    "inconsistencies": -2.4,
-    "strong_opinions": -1.4,
-    "inflexible": -3.0,
-    "time_mgmt_could_improve": -2.6,
-    "delays_in_completing": -2.8,
-    "affects_overall_progress": -2.6,
-    "needs_improvement": -2.9,
-    "room_for_improvement": -2.2,
-    "not_leading_role": -0.8,
-    "quiet_understated": -0.6,
-    "neutral_member": -0.5,
-}
-analyzer.lexicon.update(PHRASE_LEXICON)
-
-
-def preprocess_phrases(text: str) -> str:
-    """Collapse multi-word phrases into single tokens recognized by VADER."""
-    t = text
-    for pat, token in PHRASE_PATTERNS.items():
-        t = re.sub(pat, token, t, flags=re.IGNORECASE)
-    return t
+# Opt-in traffic capture (SPE_CAPTURE_FILE); added last, so it wraps CORS.
+if traffic_capture is not None:
+    app.add_middleware(CaptureMiddleware, capture=traffic_capture)
 
 
 # =============================================================================
-# Contrastive handling (tail dominates)
+# Routes
 # =============================================================================
-CONTRAST_RE = re.compile(r"\b(but|however|although|though|yet|while|despite)\b", re.IGNORECASE)
-NEG_TAIL_CUES_RE = re.compile(
-    r"\b("
-    r"challenge|challenges|concern|concerns|issue|issues|problem|problems|"
-    r"delay|delays|late|inconsistent|inconsistency|"
-    r"struggle|struggles|inflexible|conflict|"
-    r"create_challenges|dominate_discussions|rush_through_tasks|"
-    r"needs_improvement|room_for_improvement|delays_in_completing|"
-    r"affects_overall_progress|inconsistencies|not_leading_role|quiet_understated"
-    r")\b",
-    re.IGNORECASE,
-)
-
-
-def split_contrast(text: str) -> Tuple[str, Optional[str], Optional[str]]:
-    """Split on the first contrastive cue; return (head, cue, tail)."""
-    m = CONTRAST_RE.search(text)
-    if not m:
-        return text, None, None
-    head = text[: m.start()].strip()
-    cue = m.group(0)
-    tail = text[m.end() :].strip()
-    return head if head else "", cue, tail if tail else ""
-
+@app.get("/health")
+def health():
+    """Lightweight health endpoint (recommended for control-page probes)."""
+    return {"ok": True, "version": app.version}
 
-def count_negative_cues(t: str) -> int:
-    return len(list(NEG_TAIL_CUES_RE.finditer(t or "")))
 
+_MODE_REPORT: Optional[Dict[str, object]] = None
+_MODE_REPORT_LOCK = threading.Lock()
 
-# =============================================================================
-# Toxic patterns
-# =============================================================================
-TOXIC_PATTERNS = [
-    r"\b(dumb(?:-|\s*)ass|dumbass|idiot|stupid|moron|retard(?:ed)?)\b",
-    r"\b(useless|garbage|trash|loser|worthless)\b",
-    r"\b(asshole|prick|dick|bitch|cunt|whore|slut)\b",
-    r"\b(fuck(?:ing)?|shit|bullshit|damn|bloody)\b",
-    r"\b(hate|hostile|toxic)\b",
-    r"\b(shut\s*up)\b",
-]
-TOXIC_RE = re.compile("|".join(TOXIC_PATTERNS), re.IGNORECASE)
 
+@app.get("/profiles")
+def profiles():
+    """Defined analyzer profiles and compiled-profile cache stats (hits, evictions, memory)."""
+    return analyzer_profiles.report()
 
-def is_toxic(text: str) -> bool:
-    return bool(TOXIC_RE.search(text or ""))
 
+@app.get("/modes")
+def modes_report(x_api_token: Optional[str] = Header(default=None, convert_underscores=True)):
+    """
+    Live vs. full speed and label disagreement on the built-in benchmark corpus.
+    The benchmark costs seconds of CPU, so it runs once per process (later
+    calls get the cached report) and requires X-API-Token == SPE_API_TOKEN
+    when set (quiet ok=False otherwise).
+    """
+    global _MODE_REPORT
+    if API_TOKEN and (x_api_token or "").strip() != API_TOKEN:
+        return {"ok": False}
+    with _MODE_REPORT_LOCK:
+        if _MODE_REPORT is None:
+            _MODE_REPORT = mode_agreement_report()
+    return _MODE_REPORT
 
-# =============================================================================
-# Labeling & utility
-# =============================================================================
-def polarity_from_compound(c: float) -> float:
-    """Map VADER compound [-1,1] to [0,1]."""
-    return max(0.0, min(1.0, (c + 1.0) / 2.0))
 
+@app.options("/analyze")
+def options_analyze():
+    """CORS preflight."""
+    return Response(status_code=204)
 
-def label_from_compound(c: float) -> str:
-    """Convert compound to label via thresholds on mapped polarity."""
-    p = polarity_from_compound(c)
-    if p >= POS_THR:
-        return "positive"
-    if p <= NEG_THR:
-        return "negative"
-    return "neutral"
 
+@app.post("/analyze", response_model=AnalyzeOut | AnalyzeBatchOut, response_model_exclude_unset=True)
+def analyze_unified(
+    payload: AnalyzeUnifiedIn,
+    response: Response,
+    x_api_token: Optional[str] = Header(default=None, convert_underscores=True),
+    x_spe_profile: Optional[str] = Header(default=None, convert_underscores=True),
+):
+    """
+    - Single: payload.text (no token required)
+    - Batch:  payload.items (requires X-API-Token == SPE_API_TOKEN when set)
+      On token mismatch, return ok=False with empty results (quiet failure).
+    - Debug:  X-SPE-Profile: 1 (or true/yes/on) with a valid X-API-Token returns a
+      per-stage breakdown in the Server-Timing response header.
+    - Batches report prefetched-draft hits in the X-SPE-Prefetch header, not
+      the body, so replayed responses stay byte-comparable.
+    """
+    timings: Optional[Dict[str, float]] = None
+    batch: Dict[str, int] = {}
+    if timings_requested(x_spe_profile) and API_TOKEN and (x_api_token or "").strip() == API_TOKEN:
+        timings = {}
 
-def sentence_scores(text: str) -> List[Dict[str, float]]:
-    parts = re.split(r"(?<=[.!?])\s+", (text or "").strip())
-    return [analyzer.polarity_scores(p) for p in parts if p]
+    draft_prefetch.begin()  # pauses prefetch work until /analyze traffic is idle
+    try:
+        if should_sample_profile():
+            with StackSampler() as sampler:
+                t_start = perf_counter()
+                out = _analyze_payload(payload, x_api_token, timings, batch)
+                elapsed = perf_counter() - t_start
+            sampler.dump(PROFILE_DIR, "analyze")
+        else:
+            t_start = perf_counter()
+            out = _analyze_payload(payload, x_api_token, timings, batch)
+            elapsed = perf_counter() - t_start
+    finally:
+        draft_prefetch.end()
+
+    target = out if isinstance(out, Response) else response
+    if timings is not None:
+        target.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    summary = draft_prefetch.summary(batch["hits"], batch["lookups"]) if batch else None
+    if summary is not None:
+        target.headers["X-SPE-Prefetch"] = summary
+    return out
+
+
+def _analyze_projected(
+    payload: AnalyzeUnifiedIn,
+    x_api_token: Optional[str],
+    timings: Optional[Dict[str, float]],
+    want: frozenset,
+    profile: CompiledProfile,
+    batch: Dict[str, int],
+) -> Response:
+    """Projected responses skip model construction and omit unrequested fields."""
+    if payload.items is not None:
+        if API_TOKEN and (x_api_token or "").strip() != API_TOKEN:
+            return JSONResponse({"ok": False, "results": []})
+        deadline = cpu_deadline()
+        items = payload.items[:2000]  # safety cap
+        results: List[Dict[str, object]] = []
+        hits = 0
+        for it in items:
+            if time.thread_time() > deadline:
+                break
+            warm = _warm_result(it.text, payload.mode, profile)
+            hits += warm is not None
+            row = analyze_text_fields(
+                it.text, it.score_total, it.score_min, it.score_max, want, timings, payload.mode, profile, warm
+            )
+            results.append({"id": it.id, **row})
+        deferred = [it.id for it in items[len(results) :]]
+        if payload.near_duplicates is not None:
+            dups = _dup_pass([it.text for it in items], payload.near_duplicates, timings)
+            for row, dup in zip(results, dups):
+                row["dup_cluster"], row["dup_similarity"] = dup if dup else (None, None)
+        batch["hits"], batch["lookups"] = hits, len(results)
+        return JSONResponse({"ok": True, "results": results, "deferred": deferred})
+    if payload.text is not None:
+        return JSONResponse(
+            analyze_text_fields(
+                payload.text, payload.score_total, payload.score_min, payload.score_max,
+                want, timings, payload.mode, profile,
+            )
+        )
+    raise HTTPException(status_code=422, detail="Provide either 'text' or 'items'.")
 
 
-def contrast_tail_adjustment(text: str, s_all_compound: float) -> float:
-    """Weight contrastive tail and negative cue counts over the global score."""
-    _, cue, tail = split_contrast(text)
-    if not cue or not tail:
-        return s_all_compound
+def _projection(fields: Optional[List[str]]) -> Optional[frozenset]:
+    if fields is None:
+        return None
+    unknown = sorted(set(fields).difference(ANALYZE_FIELDS))
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(ANALYZE_FIELDS)}.",
+        )
+    return frozenset(fields)
 
-    tail_scores = analyzer.polarity_scores(tail)
-    tail_c = float(tail_scores["compound"])
-    cues = count_negative_cues(tail)
 
-    if cues >= 3:
-        enforced = min(tail_c, -0.20)
-        return 0.97 * enforced + 0.03 * s_all_compound
+def _dup_pass(
+    texts: List[str], opts: NearDupIn, timings: Optional[Dict[str, float]]
+) -> List[Optional[Tuple[int, float]]]:
+    t0 = perf_counter()
+    res = near_duplicate_clusters(texts, opts.threshold, opts.shingle, opts.bands, opts.rows)
+    if timings is not None:
+        lap(timings, "dedup", t0)
+    return res
 
-    if tail_c < -0.05 or cues >= 1:
-        return 0.95 * tail_c + 0.05 * s_all_compound
 
-    if tail_c > 0.05 and s_all_compound < -0.05:
-        return 0.70 * tail_c + 0.30 * s_all_compound
+def _warm_result(text: str, mode: AnalyzeMode, profile: CompiledProfile) -> Optional[WarmResult]:
+    """Prefetched result for a batch item (full mode only; prefetch runs the full pipeline)."""
+    if mode != "full" or not draft_prefetch.enabled:
+        return None
+    return draft_prefetch.lookup(text, profile)
 
-    return 0.60 * s_all_compound + 0.40 * tail_c
 
+def _analyzer_profile(pid: Optional[str]) -> CompiledProfile:
+    try:
+        return analyzer_profiles.get(pid)
+    except KeyError:
+        raise HTTPException(status_code=422, detail=f"Unknown profile: {pid}") from None
 
-def adjusted_compound(raw_text: str) -> Tuple[float, Dict[str, float]]:
-    """Compute compound with phrase preprocessing, contrast adjustment, and extreme sentence emphasis."""
-    text = preprocess_phrases(raw_text or "")
-    s_all = analyzer.polarity_scores(text)
-    base_c = float(s_all["compound"])
-    c_contrast = contrast_tail_adjustment(text, base_c)
 
-    sents = sentence_scores(text)
-    if sents:
-        extreme_c = float(max(sents, key=lambda s: abs(s["compound"]))["compound"])
-        c_final = 0.5 * c_contrast + 0.5 * extreme_c
+def _analyze_payload(
+    payload: AnalyzeUnifiedIn,
+    x_api_token: Optional[str],
+    timings: Optional[Dict[str, float]],
+    batch: Dict[str, int],
+):
+    """Analyze a payload; batches store prefetch hits/lookups in `batch`."""
+    want = _projection(payload.fields)
+    if payload.profile is not None:
+        profile = _analyzer_profile(payload.profile)
     else:
-        c_final = c_contrast
-
-    return max(-1.0, min(1.0, c_final)), s_all
-
-
-def word_char_counts(text: str) -> Tuple[int, int]:
-    words = re.findall(r"\b\w+\b", text or "")
-    return len(words), len(text or "")
-
-
-# =============================================================================
-# Schemas
-# =============================================================================
-class AnalyzeIn(BaseModel):
-    text: Optional[str] = None
-    score_total: Optional[float] = None
-    score_min: Optional[float] = None
-    score_max: Optional[float] = None
+        profile = analyzer_profiles.for_activity(payload.activity)
+    if want is not None:
+        return _analyze_projected(payload, x_api_token, timings, want, profile, batch)
 
+    # Batch path
+    if payload.items is not None:
+        if API_TOKEN and (x_api_token or "").strip() != API_TOKEN:
+            return AnalyzeBatchOut(ok=False, results=[])
 
-class AnalyzeItemIn(BaseModel):
-    id: str
-    text: str
-    score_total: Optional[float] = None
-    score_min: Optional[float] = None
-    score_max: Optional[float] = None
-
-
-class AnalyzeUnifiedIn(BaseModel):
-    text: Optional[str] = None
-    items: Optional[List[AnalyzeItemIn]] = None
-    score_total: Optional[float] = None
-    score_min: Optional[float] = None
-    score_max: Optional[float] = None
-
-
-class AnalyzeOut(BaseModel):
-    label: str
-    score: float
-    confidence: float
-    compound: float
-    pos: float
-    neu: float
-    neg: float
-    toxic: bool
-    word_count: int
-    char_count: int
-    disparity: bool
-    disparity_reason: Optional[str] = None
-    suggest_confirm: bool
-
+        deadline = cpu_deadline()
+        items = payload.items[:2000]  # safety cap
+        dups: List[Optional[Tuple[int, float]]] = [None] * len(items)
+        if payload.near_duplicates is not None:
+            dups = _dup_pass([it.text for it in items], payload.near_duplicates, timings)
+        with_dups = payload.near_duplicates is not None
 
-class AnalyzeItemOut(AnalyzeOut):
-    id: str
+        results: List[AnalyzeItemOut] = []
+        hits = 0
+        for it, dup in zip(items, dups):
+            if time.thread_time() > deadline:
+                break
+            warm = _warm_result(it.text, payload.mode, profile)
+            hits += warm is not None
+            r = analyze_text_full(
+                it.text, it.score_total, it.score_min, it.score_max, timings, payload.mode, profile, warm
+            )
+            item = AnalyzeItemOut(
+                id=it.id,
+                label=r.label,
+                score=r.score,
+                confidence=r.confidence,
+                compound=r.compound,
+                pos=r.pos,
+                neu=r.neu,
+                neg=r.neg,
+                toxic=r.toxic,
+                word_count=r.word_count,
+                char_count=r.char_count,
+                disparity=r.disparity,
+                disparity_reason=r.disparity_reason,
+                suggest_confirm=r.suggest_confirm,
+                trimmed=r.trimmed,
+            )
+            if with_dups:
+                item.dup_cluster, item.dup_similarity = dup if dup else (None, None)
+            results.append(item)
+        deferred = [it.id for it in items[len(results) :]]
+        batch["hits"], batch["lookups"] = hits, len(results)
+        return AnalyzeBatchOut(ok=True, results=results, deferred=deferred)
 
+    # Single path
+    if payload.text is not None:
+        return analyze_text_full(
+            payload.text, payload.score_total, payload.score_min, payload.score_max, timings, payload.mode, profile
+        )
 
-class AnalyzeBatchOut(BaseModel):
-    ok: bool
-    results: List[AnalyzeItemOut]
+    raise HTTPException(status_code=422, detail="Provide either 'text' or 'items'.")
 
 
-# =============================================================================
-# Disparity evaluation
-# =============================================================================
-def evaluate_disparity(
-    label: str,
-    score_total: Optional[float],
-    score_min: float,
-    score_max: float,
-) -> Tuple[bool, Optional[str], bool]:
+@app.post("/relabel")
+def relabel(
+    payload: RelabelIn,
+    x_api_token: Optional[str] = Header(default=None, convert_underscores=True),
+):
     """
-    Determine if numeric score and comment sentiment disagree enough
-    to request confirmation.
+    Recompute labels and disparities of one activity from stored feature
+    vectors (no VADER), optionally under different rules, sweeping
+    thresholds, or writing the new labels back. Needs SPE_DB_URL and, when
+    set, X-API-Token == SPE_API_TOKEN (quiet ok=False otherwise).
     """
-    if score_total is None:
-        return False, None, False
-
+    if API_TOKEN and (x_api_token or "").strip() != API_TOKEN:
+        return {"ok": False}
+    if not DB_URL:
+        raise HTTPException(status_code=503, detail="No feature store configured (set SPE_DB_URL).")
+    if payload.rules is not None:
+        rules = payload.rules
+    elif payload.profile is not None:
+        rules = _analyzer_profile(payload.profile).rules
+    else:
+        rules = None  # the activity's profile
+    db = SentimentDB(DB_URL, DB_PREFIX)
     try:
-        st = float(score_total)
-    except (TypeError, ValueError):
-        return False, None, False
-
-    if st < score_min or st > score_max:
-        return False, None, False
-
-    if DISPARITY_LOW_MIN <= st <= DISPARITY_LOW_MAX and label == "positive":
-        reason = (
-            f"Your total score is {int(st)}, but your comment reads as {label}. "
-            f"Do you want to continue with submission?"
+        sweep = payload.sweep
+        return relabel_activity(
+            db,
+            payload.speid,
+            rules,
+            sweep.pos_thr if sweep else None,
+            sweep.neg_thr if sweep else None,
+            payload.write,
+            payload.rows,
         )
-        return True, reason, True
-
-    if DISPARITY_HIGH_MIN <= st <= DISPARITY_HIGH_MAX and label in ("negative", "toxic"):
-        reason = (
-            f"Your total score is {int(st)}, but your comment reads as {label}. "
-            f"Do you want to continue with submission?"
-        )
-        return True, reason, True
-
-    return False, None, False
-
-
-# =============================================================================
-# Core analyzer
-# =============================================================================
-def analyze_text_full(
-    text: str,
-    score_total: Optional[float],
-    score_min: Optional[float],
-    score_max: Optional[float],
-) -> AnalyzeOut:
-    tx = (text or "").strip()
-    wc, cc = word_char_counts(tx)
-
-    smin = float(score_min) if score_min is not None else SCORE_MIN_DEFAULT
-    smax = float(score_max) if score_max is not None else SCORE_MAX_DEFAULT
-
-    if not tx:
-        lbl = "neutral"
-        conf = 0.5
-        disp, reason, confirm = evaluate_disparity(lbl, score_total, smin, smax)
-        return AnalyzeOut(
-            label=lbl,
-            score=conf,
-            confidence=conf,
-            compound=0.0,
-            pos=0.0,
-            neu=1.0,
-            neg=0.0,
-            toxic=False,
-            word_count=wc,
-            char_count=cc,
-            disparity=disp,
-            disparity_reason=reason,
-            suggest_confirm=confirm,
-        )
-
-    comp, scores = adjusted_compound(tx)
-
-    # Heuristics for neutral cues / long neutral-ish text
-    NEUTRAL_CUE_PATTERNS = [
-        r"\bsteady\b",
-        r"\bconsisten(t|cy)\b",
-        r"\breliable\b",
-        r"\bdependable\b",
-        r"\bregular(ly)?\b",
-        r"\bon\s*time\b",
-        r"\bmeets?\s+expectations\b",
-        r"\badequate\b",
-        r"\bsatisfactory\b",
-        r"\bprofessional\b",
-        r"\bparticipat(es|e|ed)\b",
-        r"\bcomplete(s|d)?\s+(their\s+)?assigned\s*tasks?\b",
-        r"\bwithin\s+(the\s+)?(group|team)\b",
-    ]
-    STRONG_POS_WORDS = [
-        "excellent",
-        "outstanding",
-        "exceptional",
-        "amazing",
-        "brilliant",
-        "superb",
-        "fantastic",
-        "remarkable",
-        "innovative",
-        "transformative",
-        "inspirational",
-        "exemplary",
-        "great",
-        "phenomenal",
-        "goes above and beyond",
-        "proactive",
-        "initiative",
-        "leadership",
-    ]
-    STRONG_NEG_WORDS = [
-        "toxic",
-        "incompetent",
-        "useless",
-        "garbage",
-        "terrible",
-        "awful",
-        "unacceptable",
-        "obstructive",
-        "dishonest",
-        "hostile",
-        "aggressive",
-        "disrespectful",
-        "rude",
-        "lazy",
-        "unreliable",
-        "unresponsive",
-        "inflexible",
-    ]
-
-    def _has_any_pattern(t: str, pats: List[str]) -> bool:
-        return any(re.search(p, t) for p in pats)
-
-    def _has_any_word(t: str, words: List[str]) -> bool:
-        low = t.lower()
-        for w in words:
-            if " " in w:
-                if w in low:
-                    return True
-            else:
-                if re.search(rf"\b{re.escape(w)}\b", low):
-                    return True
-        return False
-
-    low = tx.lower()
-    has_neutral_cue = _has_any_pattern(low, NEUTRAL_CUE_PATTERNS)
-    has_strong_pos = _has_any_word(low, STRONG_POS_WORDS)
-    has_strong_neg = _has_any_word(low, STRONG_NEG_WORDS)
-
-    if has_neutral_cue and not has_strong_pos and not has_strong_neg:
-        comp *= 0.3
-        comp = max(-0.15, min(0.15, comp))
-
-    if abs(comp) <= 0.35 and len(tx) >= 140 and not (has_strong_pos or has_strong_neg):
-        comp *= 0.5
-        comp = max(-0.20, min(0.20, comp))
-
-    label = label_from_compound(comp)
-    toxic_flag = is_toxic(tx)
-    if toxic_flag and comp > -0.60:
-        comp = -0.60
-        label = "toxic"
-
-    conf = round(polarity_from_compound(comp), 6)
-    disparity, reason, suggest = evaluate_disparity(label, score_total, smin, smax)
-
-    return AnalyzeOut(
-        label=label,
-        score=conf,
-        confidence=conf,
-        compound=round(comp, 6),
-        pos=round(float(scores["pos"]), 6),
-        neu=round(float(scores["neu"]), 6),
-        neg=round(float(scores["neg"]), 6),
-        toxic=toxic_flag,
-        word_count=wc,
-        char_count=cc,
-        disparity=disparity,
-        disparity_reason=reason,
-        suggest_confirm=suggest,
-    )
-
-
-# =============================================================================
-# Routes
-# =============================================================================
-@app.get("/health")
-def health():
-    """Lightweight health endpoint (recommended for control-page probes)."""
-    return {"ok": True, "version": app.version}
-
-
-@app.options("/analyze")
-def options_analyze():
-    """CORS preflight."""
-    return Response(status_code=204)
+    finally:
+        db.conn.close()
 
 
-@app.post("/analyze", response_model=AnalyzeOut | AnalyzeBatchOut)
-def analyze_unified(
-    payload: AnalyzeUnifiedIn,
+@app.post("/prefetch", status_code=202)
+def prefetch(
+    payload: PrefetchIn,
     x_api_token: Optional[str] = Header(default=None, convert_underscores=True),
 ):
     """
-    - Single: payload.text (no token required)
-    - Batch:  payload.items (requires X-API-Token == SPE_API_TOKEN when set)
-      On token mismatch, return ok=False with empty results (quiet failure).
+    Draft snapshot (draft.php autosave): queue its texts for idle-time
+    analysis so the approval batch finds them warm, and return at once.
+    Requires X-API-Token == SPE_API_TOKEN when set (quiet ok=False otherwise).
     """
-    # Batch path
-    if payload.items is not None:
-        if API_TOKEN and (x_api_token or "").strip() != API_TOKEN:
-            return AnalyzeBatchOut(ok=False, results=[])
-
-        results: List[AnalyzeItemOut] = []
-        for it in payload.items[:2000]:  # safety cap
-            r = analyze_text_full(it.text, it.score_total, it.score_min, it.score_max)
-            results.append(
-                AnalyzeItemOut(
-                    id=it.id,
-                    label=r.label,
-                    score=r.score,
-                    confidence=r.confidence,
-                    compound=r.compound,
-                    pos=r.pos,
-                    neu=r.neu,
-                    neg=r.neg,
-                    toxic=r.toxic,
-                    word_count=r.word_count,
-                    char_count=r.char_count,
-                    disparity=r.disparity,
-                    disparity_reason=r.disparity_reason,
-                    suggest_confirm=r.suggest_confirm,
-                )
-            )
-        return AnalyzeBatchOut(ok=True, results=results)
+    if API_TOKEN and (x_api_token or "").strip() != API_TOKEN:
+        return {"ok": False}
+    if not draft_prefetch.enabled:
+        return {"ok": True, "queued": 0}
+    fields = [(f.key, f.text) for f in payload.fields]
+    return {"ok": True, "queued": draft_prefetch.submit(payload.activity, payload.student, fields)}
 
-    # Single path
-    if payload.text is not None:
-        return analyze_text_full(payload.text, payload.score_total, payload.score_min, payload.score_max)
 
-    raise HTTPException(status_code=422, detail="Provide either 'text' or 'items'.")
+@app.get("/prefetch")
+def prefetch_report():
+    """Prefetch queue/store counters and the lifetime batch hit rate."""
+    return draft_prefetch.report()
 
 
 # =============================================================================
 # Entrypoint
 # =============================================================================
+def _already_running(host: str, port: int) -> bool:
+    info = find_running_instance(host, port)
+    if info:
+        print(f"SPE Sentiment API already running on http://{info['host']}:{info['port']}/ (pid {info['pid']})")
+        return True
+    return False
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="SPE Sentiment API")
+    sub = parser.add_subparsers(dest="cmd")
+    capture_note = (
+        "SPE_CAPTURE_FILE logs sampled requests for spe_replay.py. With the default SPE_CAPTURE_TEXT=hash "
+        "no student text is stored, so replay can check status and latency only (spe_replay.py --latency-only); "
+        "set SPE_CAPTURE_TEXT=raw for captures whose responses replay can verify."
+    )
+    p_serve = sub.add_parser("serve", help="run the HTTP service (default)", epilog=capture_note)
+    p_prefork = sub.add_parser(
+        "prefork", help="run N pre-forked workers on one socket (Linux/Unix)", epilog=capture_note
+    )
+    p_prefork.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes; more than 1 disables /prefetch and adds -{pid} to SPE_CAPTURE_FILE",
+    )
+    p_prefork.add_argument("--graceful-timeout", type=float, default=30.0)
+    for p in (p_serve, p_prefork):
+        p.add_argument("--host", default=BIND_HOST)
+        p.add_argument("--port", type=int, default=PORT)
+    p_status = sub.add_parser("status", help="exit 0 if an instance is serving, 1 otherwise")
+    p_status.add_argument("--host", default=BIND_HOST)
+    p_status.add_argument("--port", type=int, default=PORT)
+    p_check = sub.add_parser("selfcheck", help="verify the fast VADER core against vaderSentiment")
+    p_check.add_argument("--random", type=int, default=2000, help="extra seeded random texts")
+    p_bench = sub.add_parser("bench", help="single-text VADER benchmark")
+    p_bench.add_argument("--repeat", type=int, default=200)
+    p_modes = sub.add_parser("modes", help="live vs. full cost and label disagreement")
+    p_modes.add_argument("--items", type=int, default=1000)
+    p_modes.add_argument("--seed", type=int, default=42)
+    p_fields = sub.add_parser("fields", help="benchmark field projections used by our callers")
+    p_fields.add_argument("--items", type=int, default=1000)
+    p_threads = sub.add_parser("threads", help="throughput vs. thread count (GIL or free-threaded build)")
+    p_threads.add_argument("--items", type=int, default=1000)
+    p_threads.add_argument("--max-threads", type=int, default=8)
+    p_guards = sub.add_parser(
+        "guards", help="regex audit, adversarial latency fuzz and label agreement of the input budgets"
+    )
+    p_guards.add_argument("--items", type=int, default=2000)
+    p_guards.add_argument("--seed", type=int, default=7)
+    p_guards.add_argument("--max-chars", type=int, default=None, help="text budget to test (default SPE_MAX_CHARS)")
+    p_guards.add_argument("--max-sentences", type=int, default=None, help="default SPE_MAX_SENTENCES")
+    p_bulk = sub.add_parser("bulk", help="analyze a JSONL/CSV file offline across all cores")
+    p_bulk.add_argument("input", help="JSONL or CSV of {id, text, score_total}")
+    p_bulk.add_argument("output", help="JSONL or CSV results ('-' for stdout)")
+    p_bulk.add_argument("--in-format", choices=["auto", "jsonl", "csv"], default="auto")
+    p_bulk.add_argument("--out-format", choices=["auto", "jsonl", "csv"], default="auto")
+    p_bulk.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    p_bulk.add_argument("--chunk-size", type=int, default=256)
+    p_bulk.add_argument("--max-in-flight", type=int, default=None, help="queued chunks (default 2/worker)")
+    p_bulk.add_argument("--resume-from", type=int, default=0, help="record offset to start at (appends)")
+    p_bulk.add_argument("--mode", choices=["full", "live"], default="full")
+    p_bulk.add_argument("--progress", type=float, default=5.0, help="seconds between progress lines")
+    p_bulk.add_argument("--features", action="store_true", help="add each text's feature vector")
+    p_worker = sub.add_parser("worker", help="drain pending spe_sentiment rows from the database")
+    p_worker.add_argument("--db", required=True, help="sqlite:///path.db, mysql://u:p@host/db, postgresql://…")
+    p_worker.add_argument("--prefix", default="mdl_", help="Moodle table prefix")
+    p_worker.add_argument("--page", type=int, default=500, help="rows claimed per transaction")
+    p_worker.add_argument("--lease", type=int, default=300, help="seconds before a claim is abandoned")
+    p_worker.add_argument("--max-attempts", type=int, default=5)
+    p_worker.add_argument("--backoff", type=float, default=2.0, help="first retry delay (doubles)")
+    p_worker.add_argument("--poll", type=float, default=2.0, help="idle sleep between polls")
+    p_worker.add_argument("--speid", type=int, default=None, help="only this SPE activity")
+    p_worker.add_argument("--mode", choices=["full", "live"], default="full")
+    p_worker.add_argument("--once", action="store_true", help="exit when nothing is pending")
+    p_worker.add_argument("--init-sqlite", action="store_true", help="create the table (SQLite stand-in)")
+    p_relabel = sub.add_parser("relabel", help="relabel an activity from stored features")
+    p_relabel.add_argument("--db", required=True, help="sqlite:///path.db, mysql://u:p@host/db, postgresql://…")
+    p_relabel.add_argument("--prefix", default="mdl_", help="Moodle table prefix")
+    p_relabel.add_argument("--speid", type=int, required=True)
+    p_relabel.add_argument("--pos-thr", type=float, default=POS_THR)
+    p_relabel.add_argument("--neg-thr", type=float, default=NEG_THR)
+    p_relabel.add_argument("--sweep-pos", default="", help="comma-separated pos_thr grid")
+    p_relabel.add_argument("--sweep-neg", default="", help="comma-separated neg_thr grid")
+    p_relabel.add_argument("--write", action="store_true", help="store changed labels")
+    p_relabel.add_argument("--backfill", action="store_true", help="first compute missing features")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "selfcheck":
+        return 1 if selfcheck(args.random) else 0
+    if args.cmd == "bench":
+        bench_vader(args.repeat)
+        return 0
+    if args.cmd == "fields":
+        bench_projection(args.items)
+        return 0
+    if args.cmd == "threads":
+        bench_threads(args.items, args.max_threads)
+        return 0
+    if args.cmd == "guards":
+        return 1 if bench_guards(args.items, args.seed, args.max_chars, args.max_sentences) else 0
+    if args.cmd == "modes":
+        print(json.dumps(mode_agreement_report(args.items, args.seed), indent=2))
+        return 0
+    if args.cmd == "bulk":
+        return bulk_analyze(
+            args.input,
+            args.output,
+            args.in_format,
+            args.out_format,
+            args.workers,
+            args.chunk_size,
+            args.max_in_flight,
+            args.resume_from,
+            args.mode,
+            args.progress,
+            args.features,
+        )
+    if args.cmd == "worker":
+        db = SentimentDB(args.db, args.prefix)
+        if args.init_sqlite:
+            db.create_standin()
+        worker = SentimentWorker(
+            db, args.page, args.lease, args.max_attempts, args.backoff, args.speid, args.mode
+        )
+        stats = worker.run(args.poll, args.once)
+        return 1 if stats.get("error") else 0
+    if args.cmd == "relabel":
+        db = SentimentDB(args.db, args.prefix)
+        if args.backfill:
+            print(f"backfilled {backfill_features(db, args.speid)} rows", file=sys.stderr)
+        grid = [[float(x) for x in g.split(",") if x.strip()] for g in (args.sweep_pos, args.sweep_neg)]
+        rules = LabelRules(pos_thr=args.pos_thr, neg_thr=args.neg_thr)
+        print(json.dumps(relabel_activity(db, args.speid, rules, grid[0], grid[1], args.write), indent=2))
+        return 0
+    if args.cmd == "status":
+        return 0 if _already_running(args.host, args.port) else 1
+
+    host = getattr(args, "host", BIND_HOST)
+    port = getattr(args, "port", PORT)
+    if _already_running(host, port):
+        return 0
+    if args.cmd == "prefork":
+        if not hasattr(os, "fork"):
+            print("prefork needs os.fork (Linux/Unix); use 'serve' on Windows.", file=sys.stderr)
+            return 2
+        if args.workers > 1 and draft_prefetch.enabled:
+            # The prefetch store is per process: a batch would land on the
+            # worker holding its drafts about 1/N of the time.
+            print("prefork: /prefetch disabled with --workers > 1 (per-process store)", file=sys.stderr)
+            draft_prefetch.entries = 0
+        if args.workers > 1 and traffic_capture is not None and traffic_capture.per_process():
+            print(f"prefork: capturing to {traffic_capture.template} (one file per worker)", file=sys.stderr)
+        return PreforkSupervisor(app, host, port, args.workers, args.graceful_timeout).run()
+    uvicorn.run("sentiment_api:app", host=host, port=port, reload=RELOAD)
+    return 0
+
+
 if __name__ == "__main__":
-    uvicorn.run("sentiment_api:app", host=BIND_HOST, port=PORT, reload=RELOAD)
+    sys.exit(main())
@@ -49,6 +49,15 @@ $PidFile= Join-Path $ApiDir "sentiment_api.pid"
 Remove-Item -Force $LogOut -ErrorAction SilentlyContinue
 Remove-Item -Force $LogErr -ErrorAction SilentlyContinue
 
+# -------- ALREADY RUNNING? (reuse instead of a second bind) -----------------
+try {
+    $health = Invoke-WebRequest -UseBasicParsing -TimeoutSec 2 -Uri ("http://{0}:{1}/health" -f $Bind, $Port)
+    if ($health.StatusCode -eq 200) {
+        Write-Host ("Sentiment API already running on http://{0}:{1}/" -f $Bind, $Port)
+        exit 0
+    }
+} catch { }
+
 # -------- FREE PORT (prevents WinError 10048) --------------------------------
 
 try {
@@ -0,0 +1,375 @@
+# spe_bench.py
+# Benchmark corpora, the FastVader self-check and the benchmarks behind the CLI.
+from __future__ import annotations
+
+from collections import Counter
+from time import perf_counter
+from typing import List, Optional, Tuple, Dict
+import json
+import math
+import os
+import random
+import sys
+import threading
+
+from vaderSentiment import vaderSentiment as vader_ref
+
+from spe_config import LIVE_SENTENCE_MIN_CHARS, MAX_INPUT_CHARS, MAX_SENTENCES, MAX_TEXT_CHARS
+from spe_core import (
+    analyze_text_fields,
+    analyze_text_full,
+    apply_label_rules,
+    audited_patterns,
+    budget_text,
+    clip_input,
+    regex_audit,
+    text_features,
+)
+from spe_lexicon import GIL_DISABLED, STRONG_NEG_WORDS, STRONG_POS_WORDS, analyzer, vader
+from spe_profiles import DEFAULT_PROFILE
+from spe_schemas import AnalyzeItemOut, AnalyzeOut
+
+# =============================================================================
+# Self-check / benchmarks (golden corpus, synthetic SPE corpus)
+# =============================================================================
+GOLDEN_CORPUS: List[str] = [
+    "VADER is smart, handsome, and funny.",
+    "VADER is smart, handsome, and funny!",
+    "VADER is very smart, handsome, and funny.",
+    "VADER is VERY SMART, handsome, and FUNNY.",
+    "VADER is VERY SMART, handsome, and FUNNY!!!",
+    "VADER is VERY SMART, uber handsome, and FRIGGIN FUNNY!!!",
+    "VADER is not smart, handsome, nor funny.",
+    "The book was good.",
+    "At least it isn't a horrible book.",
+    "The book was only kind of good.",
+    "The plot was good, but the characters are uncompelling and the dialog is not great.",
+    "Today SUX!",
+    "Today only kinda sux! But I'll get by, lol",
+    "Make sure you :) or :D today!",
+    "Catch utf-8 emoji such as 💘 and 💋 and 😁",
+    "Not bad at all",
+    "Without doubt a great teammate, never so helpful before.",
+    "No problems or concerns at all, he is good but good but bad.",
+    "That demo was the bomb, yeah right, a real kiss of death.",
+    "It was sort of okay, just enough effort, kind of lazy???",
+    "She was the least helpful, at least she tried, very least good.",
+    "Great teammate but often late and needs_improvement in time management.",
+    "They can create_challenges and dominate_discussions, however the work was good.",
+    "Reliable, steady and dependable member who completes assigned tasks on time.",
+    "Honestly a stupid, useless idiot. Shut up!!",
+    "Excellent leadership and initiative; goes above and beyond every week 👍🙂",
+    "",
+    "   ",
+    "?!",
+]
+
+
+def _random_corpus(n: int, seed: int = 1234) -> List[str]:
+    """Seeded random texts mixing lexicon, booster, negation and idiom words."""
+    rng = random.Random(seed)
+    lex_words = sorted(analyzer.lexicon)
+    pools = [
+        lex_words,
+        sorted(vader_ref.BOOSTER_DICT),
+        list(vader_ref.NEGATE) + ["no", "least", "at", "very", "never", "so", "this", "without", "doubt"],
+        ["but", "kind", "of", "the", "bomb", "shit", "yeah", "right", "to", "die", "for", "and", "team"],
+        ["!", "?", "??", "!!!", ",", ".", ":)", ":(", "💘", "😁", "👍"],
+    ]
+    out = []
+    for _ in range(n):
+        toks = []
+        for _ in range(rng.randint(1, 60)):
+            tok = rng.choice(rng.choice(pools))
+            if rng.random() < 0.1:
+                tok = tok.upper()
+            toks.append(tok)
+        out.append(" ".join(toks))
+    return out
+
+
+_SPE_POS = [
+    "{n} was an excellent teammate",
+    "{n} always communicated clearly and was very helpful",
+    "{n} did great work on the final report",
+    "{n} showed real leadership and initiative",
+    "{n} was supportive and kept everyone motivated",
+    "{n} delivered high quality work ahead of deadlines",
+]
+_SPE_NEU = [
+    "{n} attended most of the meetings",
+    "{n} completed their assigned tasks",
+    "{n} participated in the group discussions",
+    "{n} was a steady member within the team",
+    "{n} met expectations for this project",
+    "{n} worked on the data section",
+]
+_SPE_NEG = [
+    "{n} was often late to meetings",
+    "{n} needs improvement in time management",
+    "there were some concerns about {n}'s communication",
+    "{n} tended to dominate discussions",
+    "{n} was unresponsive for most of the week",
+    "{n} rushed through tasks and left issues for others",
+]
+_SPE_TOXIC = ["{n} was honestly useless", "{n} is a lazy idiot", "shut up about {n}, it was trash"]
+_SPE_CUES = ["but", "however", "although"]
+_SPE_NAMES = ["Alex", "Sam", "Jordan", "Priya", "Wei", "Maria", "the team lead"]
+
+
+def spe_corpus(n: int, seed: int = 42) -> List[Dict[str, object]]:
+    """Seeded synthetic SPE comments shaped like view.php / analyze_push.php input."""
+    rng = random.Random(seed)
+    out: List[Dict[str, object]] = []
+    for k in range(n):
+        sents = []
+        for _ in range(rng.randint(1, 6)):
+            name = rng.choice(_SPE_NAMES)
+            roll = rng.random()
+            if roll < 0.03:
+                frag = rng.choice(_SPE_TOXIC)
+            elif roll < 0.2:
+                a, b = rng.sample([_SPE_POS, _SPE_NEU, _SPE_NEG], 2)
+                frag = f"{rng.choice(a)}, {rng.choice(_SPE_CUES)} {rng.choice(b)}"
+            else:
+                frag = rng.choice(rng.choice([_SPE_POS, _SPE_NEU, _SPE_NEG]))
+            sents.append(frag.format(n=name) + rng.choice([".", ".", ".", "!"]))
+        text = " ".join(s[0].upper() + s[1:] for s in sents)
+        out.append({"id": str(k + 1), "text": text, "score_total": float(rng.randint(5, 25))})
+    return out
+
+
+def mode_agreement_report(n: int = 1000, seed: int = 42) -> Dict[str, object]:
+    """
+    Time live vs. full on the synthetic corpus and count label/disparity
+    disagreements, overall and split at LIVE_SENTENCE_MIN_CHARS (the live
+    approximation only differs from full on short multi-sentence or toxic text).
+    """
+    corpus = spe_corpus(n, seed)
+    results: Dict[str, List[AnalyzeOut]] = {}
+    cost: Dict[str, float] = {}
+    for mode in ("full", "live"):
+        t0 = perf_counter()
+        results[mode] = [
+            analyze_text_full(str(r["text"]), r["score_total"], None, None, None, mode) for r in corpus
+        ]
+        cost[mode] = (perf_counter() - t0) * 1e6 / max(1, n)
+    pairs: Counter = Counter()
+    buckets = {"short": [0, 0], "long": [0, 0]}  # [items, label disagreements]
+    label_diff = disp_diff = 0
+    for r, f, lv in zip(corpus, results["full"], results["live"]):
+        bucket = buckets["short" if len(str(r["text"])) < LIVE_SENTENCE_MIN_CHARS else "long"]
+        bucket[0] += 1
+        if f.label != lv.label:
+            label_diff += 1
+            bucket[1] += 1
+            pairs[f"{f.label}->{lv.label}"] += 1
+        if f.disparity != lv.disparity:
+            disp_diff += 1
+    return {
+        "items": n,
+        "seed": seed,
+        "us_per_item": {k: round(v, 1) for k, v in cost.items()},
+        "speedup": round(cost["full"] / cost["live"], 2) if cost["live"] else None,
+        "label_disagreement": round(label_diff / max(1, n), 4),
+        "disparity_disagreement": round(disp_diff / max(1, n), 4),
+        "label_disagreement_by_length": {
+            k: {"items": v[0], "rate": round(v[1] / max(1, v[0]), 4)} for k, v in buckets.items()
+        },
+        "label_changes": dict(pairs.most_common()),
+    }
+
+
+CALLER_PROJECTIONS: Dict[str, Optional[List[str]]] = {
+    "all fields": None,
+    "analyze_push.php": ["compound", "label"],
+    "view.php": ["label", "word_count", "disparity"],
+}
+
+
+def bench_projection(n: int = 1000, seed: int = 42) -> None:
+    """Per-item cost (analysis + JSON encoding) of full responses vs. caller projections."""
+    corpus = spe_corpus(n, seed)
+    base = None
+    for name, fields in CALLER_PROJECTIONS.items():
+        want = None if fields is None else frozenset(fields)
+        t0 = perf_counter()
+        for r in corpus:
+            if want is None:
+                r_out = analyze_text_full(str(r["text"]), r["score_total"], None, None)
+                AnalyzeItemOut(id=str(r["id"]), **r_out.model_dump()).model_dump_json()
+            else:
+                d = analyze_text_fields(str(r["text"]), r["score_total"], None, None, want)
+                json.dumps({"id": r["id"], **d})
+        us = (perf_counter() - t0) * 1e6 / max(1, n)
+        base = base or us
+        print(f"{name:>18}: {us:8.1f} us/item  ({100.0 * (1 - us / base):5.1f}% saved)  fields={fields or 'all'}")
+
+
+def selfcheck(n_random: int = 2000) -> int:
+    """Compare FastVader with vaderSentiment; return the number of mismatches."""
+    bad = 0
+    for t in GOLDEN_CORPUS + _random_corpus(n_random):
+        want = analyzer.polarity_scores(t)
+        got = vader.polarity_scores(t)
+        if want != got:
+            bad += 1
+            print(f"MISMATCH {t!r}\n  vaderSentiment={want}\n  fast={got}")
+    print(f"selfcheck: {len(GOLDEN_CORPUS) + n_random} texts, {bad} mismatches")
+    return bad
+
+
+def bench_vader(repeat: int = 200) -> None:
+    """Single-text throughput of vaderSentiment vs. FastVader on the golden corpus."""
+    short = [t for t in GOLDEN_CORPUS if t.strip()]
+    long = [" ".join(short) * 3]
+    for kind, texts, reps in (("short", short, repeat), ("long", long, max(1, repeat // 10))):
+        for name, fn in (("vaderSentiment", analyzer.polarity_scores), ("fast", vader.polarity_scores)):
+            t0 = perf_counter()
+            for _ in range(reps):
+                for t in texts:
+                    fn(t)
+            dt = perf_counter() - t0
+            print(f"{kind:>5} {name:>15}: {dt * 1e6 / (reps * len(texts)):10.1f} us/text")
+
+
+def bench_threads(n: int = 1000, max_threads: int = 8, seed: int = 42) -> None:
+    """Full-pipeline items/s vs. thread count; every thread analyzes the whole corpus."""
+    texts = [str(r["text"]) for r in spe_corpus(n, seed)]
+    build = "free-threaded, GIL disabled" if GIL_DISABLED else "GIL enabled"
+    print(f"Python {sys.version.split()[0]} ({build}), {os.cpu_count()} CPUs, {n} texts per thread")
+
+    def run(barrier: threading.Barrier) -> None:
+        barrier.wait()
+        for t in texts:
+            analyze_text_fields(t, None, None, None)
+
+    base = 0.0
+    k = 1
+    while k <= max_threads:
+        barrier = threading.Barrier(k + 1)
+        threads = [threading.Thread(target=run, args=(barrier,)) for _ in range(k)]
+        for th in threads:
+            th.start()
+        barrier.wait()
+        t0 = perf_counter()
+        for th in threads:
+            th.join()
+        rate = k * n / (perf_counter() - t0)
+        base = base or rate
+        print(f"{k:>3} threads: {rate:9.0f} items/s  speedup {rate / base:5.2f}x  efficiency {rate / base / k:4.0%}")
+        k *= 2
+
+
+NEUTRAL_CUE_WORDS_FUZZ: List[str] = ["steady", "on  time", "meets expectations", "completed their assigned"]
+
+
+def adversarial_corpus(n: int, seed: int = 7) -> List[str]:
+    """Seeded texts aimed at the slow paths: whitespace runs after pattern
+    prefixes, "but" with many scored words, sentence floods, long tokens,
+    emoji floods and cue-word spam, from a few hundred chars to 2x MAX_INPUT_CHARS."""
+    rng = random.Random(seed)
+    prefixes = ["complete", "on", "dumb", "shut", "create", "delays", "time management could"]
+    scored = ["good", "bad", "GREAT", "awful", "nice", "poor", "very good", "not bad", "kind of"]
+    out = []
+    for _ in range(n):
+        size = int(rng.choice([300, 3000, MAX_TEXT_CHARS, MAX_INPUT_CHARS, 2 * MAX_INPUT_CHARS]) * rng.uniform(0.5, 1.0))
+        kind = rng.randrange(7)
+        if kind == 0:
+            text = rng.choice(prefixes) + " " * size + rng.choice(["x", "tasks", "time"])
+        elif kind == 1:
+            words = ["but"] + [rng.choice(scored + ["the"] * 3) for _ in range(size // 5)]
+            text = " ".join(words)
+        elif kind == 2:
+            text = rng.choice(["Good. ", "a! ", "? ", "Bad but fine. "]) * (size // 6)
+        elif kind == 3:
+            text = "".join(rng.choice("aZ_9'") for _ in range(size))
+        elif kind == 4:
+            text = "".join(rng.choice(["\U0001F600", "\U0001F620", " ", "\u2764", "ok"]) for _ in range(size // 2))
+        elif kind == 5:
+            text = " ".join(rng.choice(STRONG_POS_WORDS + STRONG_NEG_WORDS + NEUTRAL_CUE_WORDS_FUZZ)
+                            for _ in range(size // 8))
+        else:
+            text = ("dumb-" + "-" * rng.randint(0, 8) + "as " + "however " * rng.randint(0, 3)) * (size // 16)
+        out.append(text)
+    return out
+
+
+def _percentiles(samples: List[float], ps: Tuple[float, ...]) -> List[float]:
+    xs = sorted(samples)
+    return [xs[min(len(xs) - 1, int(math.ceil(p / 100.0 * len(xs))) - 1)] for p in ps]
+
+
+# Minimum share of over-budget texts whose budget_text label must match the
+# label of the untrimmed text (bench_guards fails below it).
+BUDGET_LABEL_AGREEMENT: float = 0.9
+
+
+def bench_guards(
+    n: int = 2000,
+    seed: int = 7,
+    max_chars: Optional[int] = None,
+    max_sentences: Optional[int] = None,
+) -> int:
+    """
+    Regex audit, fuzzed worst-case latency, and label agreement of budget_text
+    at max_chars / max_sentences (default: the configured budgets). Returns
+    the number of problems: risky patterns plus corpora whose agreement is
+    below BUDGET_LABEL_AGREEMENT.
+    """
+    max_chars = MAX_TEXT_CHARS if max_chars is None else max_chars
+    max_sentences = MAX_SENTENCES if max_sentences is None else max_sentences
+    problems = regex_audit()
+    print(f"regex audit: {len(audited_patterns())} patterns, {len(problems)} problems")
+    for name, problem in problems:
+        print(f"  {name}: {problem}")
+
+    texts = adversarial_corpus(n, seed)
+    ps = (50.0, 99.0, 99.9, 100.0)
+    for mode in ("live", "full"):
+        lat = []
+        for t in texts:
+            t0 = perf_counter()
+            analyze_text_fields(t, None, None, None, mode=mode)
+            lat.append((perf_counter() - t0) * 1000.0)
+        cells = "  ".join(f"p{p:g}={v:7.2f}ms" for p, v in zip(ps, _percentiles(lat, ps)))
+        print(f"{mode:>4} fuzz ({n} texts, up to {max(map(len, texts))} chars): {cells}")
+
+    # Label agreement of budgeted vs. unlimited scoring on over-budget texts:
+    # "essays" repeat one author's polarity, "mixed" splice unrelated reviews.
+    rng = random.Random(seed)
+    pool = [str(r["text"]) for r in spe_corpus(600, seed)]
+    by_label: Dict[str, List[str]] = {}
+    for t in pool:
+        by_label.setdefault(str(analyze_text_fields(t, None, None, None)["label"]), []).append(t)
+
+    def long_text(src: List[str]) -> str:
+        parts: List[str] = []
+        size = 0
+        while size < max_chars * rng.uniform(1.0, 3.0):
+            parts.append(rng.choice(src))
+            size += len(parts[-1]) + 1
+        return " ".join(parts)
+
+    sets = {
+        "essays": [long_text(by_label[rng.choice(sorted(by_label))]) for _ in range(150)],
+        "mixed": [long_text(pool) for _ in range(150)],
+    }
+
+    def label(text: str, chars: int, sentences: int) -> str:
+        tx, _ = clip_input(text)
+        body, _ = budget_text(tx, chars, sentences)
+        return apply_label_rules(text_features(tx, body)[0], DEFAULT_PROFILE.rules)[1]
+
+    polarity = {"toxic": "negative"}
+    drifted = 0
+    for k, texts in sets.items():
+        pairs = [(label(t, max_chars, max_sentences), label(t, 1 << 30, 1 << 30)) for t in texts]
+        same = sum(a == b for a, b in pairs)
+        close = sum(polarity.get(a, a) == polarity.get(b, b) for a, b in pairs)
+        ok = same >= BUDGET_LABEL_AGREEMENT * len(pairs)
+        drifted += not ok
+        print(f"budget_text labels ({k}, {len(pairs)} over-budget texts): {same} identical, "
+              f"{close} same polarity (toxic counted as negative)"
+              + ("" if ok else f"  ** below {BUDGET_LABEL_AGREEMENT:.0%} **"))
+    return len(problems) + drifted
@@ -0,0 +1,195 @@
+# spe_bulk.py
+# Offline bulk analysis of JSONL/CSV exports across all cores.
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from time import perf_counter
+from typing import List, Optional, Tuple, Dict
+import csv
+import json
+import os
+import sys
+
+from spe_core import ANALYZE_FIELDS, analyze_text_fields
+
+# =============================================================================
+# Offline bulk analysis (JSONL / CSV)
+# =============================================================================
+# Output columns; "features" (the text_features vector) only with features=True.
+BULK_OUT_FIELDS: List[str] = ["id"] + [f for f in ANALYZE_FIELDS if f != "features"]
+_BULK_WANT = frozenset(BULK_OUT_FIELDS)
+_BULK_WANT_FEATURES = _BULK_WANT | {"features"}
+
+
+def _bulk_format(path: str, fmt: str) -> str:
+    if fmt != "auto":
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _opt_float(v: object) -> Optional[float]:
+    if v is None or v == "":
+        return None
+    return float(v)  # type: ignore[arg-type]
+
+
+def iter_bulk_records(path: str, fmt: str):
+    """
+    Yield (offset, record) pairs without loading the file. Records carry
+    id, text, score_total, score_min, score_max; JSONL lines in the
+    requests.jsonl shape (request_id/body) are accepted too. Unreadable
+    lines yield a record with an "error" key instead.
+    """
+    if fmt == "csv":
+        csv.field_size_limit(sys.maxsize)
+        with open(path, "r", encoding="utf-8", newline="") as fh:
+            for offset, row in enumerate(csv.DictReader(fh)):
+                yield offset, row
+        return
+    with open(path, "r", encoding="utf-8") as fh:
+        offset = 0
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+                if not isinstance(rec, dict):
+                    raise ValueError("not an object")
+            except ValueError as exc:
+                rec = {"error": f"invalid JSON: {exc}"}
+            yield offset, rec
+            offset += 1
+
+
+def _bulk_analyze_chunk(chunk: List[Tuple[int, dict]], mode: str, features: bool = False) -> List[Dict[str, object]]:
+    """Worker side: analyze one chunk (rows equal analyze_text_full, identical to the API)."""
+    out: List[Dict[str, object]] = []
+    for offset, rec in chunk:
+        rid = rec.get("id", rec.get("request_id", offset))
+        if "error" in rec:
+            out.append({"id": str(rid), "offset": offset, "error": rec["error"]})
+            continue
+        try:
+            text = rec.get("text")
+            if text is None:
+                text = rec.get("body", "")
+            r = analyze_text_fields(
+                str(text or ""),
+                _opt_float(rec.get("score_total")),
+                _opt_float(rec.get("score_min")),
+                _opt_float(rec.get("score_max")),
+                _BULK_WANT_FEATURES if features else _BULK_WANT,
+                None,
+                mode,  # type: ignore[arg-type]
+            )
+        except (TypeError, ValueError) as exc:
+            out.append({"id": str(rid), "offset": offset, "error": str(exc)})
+            continue
+        out.append({"id": str(rid), **r})
+    return out
+
+
+class _BulkWriter:
+    def __init__(self, path: str, fmt: str, append: bool, features: bool = False) -> None:
+        self.fmt = fmt
+        self.fh = sys.stdout if path == "-" else open(
+            path, "a" if append else "w", encoding="utf-8", newline=""
+        )
+        self.csv = None
+        if fmt == "csv":
+            fields = BULK_OUT_FIELDS + (["features"] if features else []) + ["error"]
+            self.csv = csv.DictWriter(self.fh, fieldnames=fields, extrasaction="ignore")
+            if not append or self.fh.tell() == 0:
+                self.csv.writeheader()
+
+    def write(self, rows: List[Dict[str, object]]) -> None:
+        if self.csv is not None:
+            self.csv.writerows(
+                {**r, "features": json.dumps(r["features"])} if r.get("features") is not None else r for r in rows
+            )
+        else:
+            self.fh.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows))
+        self.fh.flush()
+
+    def close(self) -> None:
+        if self.fh is not sys.stdout:
+            self.fh.close()
+
+
+def bulk_analyze(
+    src: str,
+    dst: str,
+    in_format: str = "auto",
+    out_format: str = "auto",
+    workers: Optional[int] = None,
+    chunk_size: int = 256,
+    max_in_flight: Optional[int] = None,
+    resume_from: int = 0,
+    mode: str = "full",
+    progress_every: float = 5.0,
+    features: bool = False,
+) -> int:
+    """
+    Stream src through a process pool and write results to dst in input order.
+
+    At most max_in_flight chunks (default 2 per worker) are queued at once, so
+    memory is bounded by chunk_size * max_in_flight records whatever the file
+    size. Progress lines on stderr carry the next offset; pass it back as
+    resume_from to continue an interrupted run (output is appended).
+    features=True adds each text's feature vector (a JSON object in CSV).
+    """
+    in_fmt = _bulk_format(src, in_format)
+    out_fmt = _bulk_format(dst, out_format) if dst != "-" else (out_format if out_format != "auto" else "jsonl")
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    writer = _BulkWriter(dst, out_fmt, resume_from > 0, features)
+
+    done = errors = 0
+    next_offset = resume_from
+    t0 = last = perf_counter()
+    inflight: deque = deque()
+
+    def drain_one() -> None:
+        nonlocal done, errors, next_offset, last
+        fut, end = inflight.popleft()
+        rows = fut.result()
+        writer.write(rows)
+        done += len(rows)
+        errors += sum(1 for r in rows if "error" in r)
+        next_offset = end
+        now = perf_counter()
+        if progress_every and now - last >= progress_every:
+            last = now
+            print(
+                f"[bulk] {done} records, {done / (now - t0):.1f}/s, next offset {next_offset}",
+                file=sys.stderr,
+            )
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunk: List[Tuple[int, dict]] = []
+            for offset, rec in iter_bulk_records(src, in_fmt):
+                if offset < resume_from:
+                    continue
+                chunk.append((offset, rec))
+                if len(chunk) >= chunk_size:
+                    fut: Future = pool.submit(_bulk_analyze_chunk, chunk, mode, features)
+                    inflight.append((fut, offset + 1))
+                    chunk = []
+                    while len(inflight) >= max_in_flight:
+                        drain_one()
+            if chunk:
+                inflight.append((pool.submit(_bulk_analyze_chunk, chunk, mode, features), chunk[-1][0] + 1))
+            while inflight:
+                drain_one()
+    finally:
+        writer.close()
+
+    elapsed = perf_counter() - t0
+    print(
+        f"[bulk] done: {done} records ({errors} errors) in {elapsed:.1f}s, "
+        f"{done / elapsed if elapsed else 0.0:.1f}/s, next offset {next_offset}",
+        file=sys.stderr,
+    )
+    return 1 if errors else 0
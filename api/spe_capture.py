@@ -0,0 +1,231 @@
+# spe_capture.py
+# Opt-in sampled traffic capture (SPE_CAPTURE_FILE) for replay with spe_replay.py.
+from __future__ import annotations
+
+from collections import Counter
+from time import perf_counter
+from typing import List, Optional, Tuple, Dict
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import string
+import sys
+import threading
+import time
+
+from spe_config import CAPTURE_BACKUPS, CAPTURE_FILE, CAPTURE_MAX_BYTES, CAPTURE_PATHS, CAPTURE_SAMPLE, CAPTURE_TEXT
+
+# =============================================================================
+# Traffic capture (opt-in, for replay with spe_replay.py)
+# =============================================================================
+# With SPE_CAPTURE_FILE set, a sampled share of requests to CAPTURE_PATHS is
+# appended to a JSONL log: time, endpoint, payload, a digest of the response
+# body and the server-side latency. The middleware only copies bytes; parsing,
+# text hashing/redaction and file I/O happen on a writer thread, and records
+# are dropped (and counted) rather than queued without bound. Each process
+# writes its own file when the path contains "{pid}"; `prefork --workers N`
+# (N > 1) inserts "-{pid}" before the extension when the path lacks it, as
+# workers rotating one shared file would rename each other's logs away.
+_REDACT_TABLE = {c: "x" for c in string.ascii_letters}
+_REDACT_TABLE.update({c: "0" for c in string.digits})
+
+
+def redact_text(text: str) -> str:
+    """Same length, spacing and punctuation; letters -> x, digits -> 0, other word chars -> x."""
+    return "".join(_REDACT_TABLE.get(c, "x" if c.isalnum() else c) for c in text)
+
+
+class TrafficCapture:
+    """Rotating, sampled JSONL request log written by one background thread."""
+
+    def __init__(
+        self,
+        path: str,
+        sample: float = CAPTURE_SAMPLE,
+        text_mode: str = CAPTURE_TEXT,
+        max_bytes: int = CAPTURE_MAX_BYTES,
+        backups: int = CAPTURE_BACKUPS,
+        paths: Tuple[str, ...] = CAPTURE_PATHS,
+    ) -> None:
+        if text_mode not in ("raw", "hash", "redact"):
+            raise ValueError(f"SPE_CAPTURE_TEXT must be raw, hash or redact, not {text_mode!r}")
+        self.template = path
+        self.path = path
+        self.sample = sample
+        self.text_mode = text_mode
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.paths = frozenset(paths)
+        # Keyed hash: short texts ("Good work.") can't be looked up by hashing guesses.
+        self._key = os.environ.get("SPE_CAPTURE_SALT", "").encode("utf-8") or os.urandom(16)
+        self.stats = Counter()
+        self._owner = 0
+        self._start_lock = threading.Lock()
+
+    def _start(self) -> None:
+        """Start the writer in this process (prefork workers inherit no threads)."""
+        with self._start_lock:
+            if self._owner == os.getpid():
+                return
+            self.path = self.template.replace("{pid}", str(os.getpid()))
+            self._queue: "queue.Queue[Optional[Dict[str, object]]]" = queue.Queue(maxsize=10000)
+            self._fh = None
+            self._thread = threading.Thread(target=self._run, name="spe-capture", daemon=True)
+            self._thread.start()
+            self._owner = os.getpid()
+
+    def per_process(self) -> bool:
+        """Make the path per process ("-{pid}" before the extension) unless it has {pid}; True if changed."""
+        if "{pid}" in self.template:
+            return False
+        root, ext = os.path.splitext(self.template)
+        self.template = self.path = f"{root}-{{pid}}{ext}"
+        return True
+
+    def sampled(self, path: str) -> bool:
+        return path in self.paths and random.random() < self.sample
+
+    def submit(self, event: Dict[str, object]) -> None:
+        if self._owner != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def close(self) -> None:
+        """Write what is queued and stop the writer (no-op if this process never captured)."""
+        if self._owner != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._owner = 0
+
+    def _text(self, text: str) -> object:
+        if self.text_mode == "raw":
+            return text
+        if self.text_mode == "redact":
+            return redact_text(text)
+        digest = hmac.new(self._key, text.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+        return {"sha256": digest, "chars": len(text)}
+
+    def _scrub(self, payload: object) -> object:
+        """Apply the text mode to every "text" string in the payload."""
+        if isinstance(payload, dict):
+            return {
+                k: self._text(v) if k == "text" and isinstance(v, str) else self._scrub(v)
+                for k, v in payload.items()
+            }
+        if isinstance(payload, list):
+            return [self._scrub(v) for v in payload]
+        return payload
+
+    def _record(self, ev: Dict[str, object]) -> Dict[str, object]:
+        body: bytes = ev.pop("body")  # type: ignore[assignment]
+        response: bytes = ev.pop("response")  # type: ignore[assignment]
+        try:
+            payload = self._scrub(json.loads(body)) if body else None
+        except ValueError:
+            payload = None
+        return {
+            **ev,
+            "text_mode": self.text_mode,
+            "payload": payload,
+            "payload_bytes": len(body),
+            "response_sha256": hashlib.sha256(response).hexdigest(),
+            "response_bytes": len(response),
+        }
+
+    def _write(self, line: str) -> None:
+        data = line.encode("utf-8")
+        if self._fh is not None and self.max_bytes and self._fh.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        if self._fh is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fh = open(self.path, "ab")
+        self._fh.write(data)
+        self._fh.flush()
+
+    def _rotate(self) -> None:
+        self._fh.close()
+        self._fh = None
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.stats["rotations"] += 1
+
+    def _run(self) -> None:
+        while True:
+            ev = self._queue.get()
+            if ev is None:
+                break
+            try:
+                self._write(json.dumps(self._record(ev), ensure_ascii=False) + "\n")
+                self.stats["written"] += 1
+            except Exception as exc:  # never take the service down for a log line
+                self.stats["errors"] += 1
+                print(f"[capture] {exc}", file=sys.stderr)
+        if self._fh is not None:
+            self._fh.close()
+
+
+class CaptureMiddleware:
+    """ASGI middleware: copy sampled request/response bodies to a TrafficCapture."""
+
+    def __init__(self, app, capture: TrafficCapture) -> None:
+        self.app = app
+        self.capture = capture
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.capture.sampled(scope["path"]):
+            return await self.app(scope, receive, send)
+        ts = time.time()
+        t0 = perf_counter()
+        body: List[bytes] = []
+        out: List[bytes] = []
+        meta: Dict[str, object] = {}
+
+        async def recv():
+            msg = await receive()
+            if msg["type"] == "http.request":
+                body.append(msg.get("body", b""))
+            return msg
+
+        async def snd(msg):
+            if msg["type"] == "http.response.start":
+                meta["status"] = msg["status"]
+            elif msg["type"] == "http.response.body":
+                out.append(msg.get("body", b""))
+                if not msg.get("more_body"):
+                    meta["latency_ms"] = round((perf_counter() - t0) * 1000.0, 3)
+            await send(msg)
+
+        await self.app(scope, recv, snd)
+        headers = dict(scope.get("headers") or [])
+        self.capture.submit(
+            {
+                "ts": round(ts, 6),
+                "method": scope["method"],
+                "endpoint": scope["path"],
+                "status": meta.get("status", 0),
+                # The token itself is never logged; replay sends its own.
+                "auth": b"x-api-token" in headers,
+                "latency_ms": meta.get("latency_ms"),
+                "body": b"".join(body),
+                "response": b"".join(out),
+            }
+        )
+
+
+traffic_capture: Optional[TrafficCapture] = None
+if CAPTURE_FILE:
+    traffic_capture = TrafficCapture(CAPTURE_FILE)  # sentiment_api adds the middleware
+    atexit.register(traffic_capture.close)  # flush queued records on shutdown
@@ -0,0 +1,81 @@
+# spe_config.py
+# Configuration of the SPE Sentiment API: thresholds and SPE_* environment
+# settings, read once at import.
+from __future__ import annotations
+
+from typing import Tuple
+import os
+
+# =============================================================================
+# Configuration / thresholds
+# =============================================================================
+SCORE_MIN_DEFAULT: float = 5
+SCORE_MAX_DEFAULT: float = 25
+
+DISPARITY_LOW_MIN: float = 5
+DISPARITY_LOW_MAX: float = 10
+DISPARITY_HIGH_MIN: float = 20
+DISPARITY_HIGH_MAX: float = 25
+
+# Polarity thresholds (after mapping VADER compound → [0,1])
+POS_THR: float = 0.62
+NEG_THR: float = 0.44
+
+API_TOKEN: str = os.environ.get("SPE_API_TOKEN", "").strip()
+BIND_HOST: str = os.environ.get("SPE_BIND", "127.0.0.1")
+PORT: int = int(os.environ.get("PORT", "8000"))
+RELOAD: bool = os.environ.get("RELOAD", "").lower() == "true"
+
+API_DIR: str = os.path.dirname(os.path.abspath(__file__))
+# Same pidfile the PowerShell bootstrap writes; the ready file is JSON.
+PID_FILE: str = os.environ.get("SPE_PIDFILE", os.path.join(API_DIR, "sentiment_api.pid"))
+READY_FILE: str = os.environ.get("SPE_READYFILE", os.path.join(API_DIR, "sentiment_api.ready"))
+
+# Profiling (off by default). SPE_PROFILE_SAMPLE is the fraction of requests
+# (0..1) that get a sampled stack profile written to SPE_PROFILE_DIR.
+PROFILE_SAMPLE: float = float(os.environ.get("SPE_PROFILE_SAMPLE", "0") or 0)
+PROFILE_DIR: str = os.environ.get("SPE_PROFILE_DIR", os.path.join(API_DIR, "profiles"))
+PROFILE_INTERVAL_MS: float = float(os.environ.get("SPE_PROFILE_INTERVAL_MS", "1") or 1)
+
+# Moodle database holding spe_sentiment(_feat), for POST /relabel.
+DB_URL: str = os.environ.get("SPE_DB_URL", "").strip()
+DB_PREFIX: str = os.environ.get("SPE_DB_PREFIX", "mdl_")
+
+# Analyzer profiles: JSON file {"<id>": {rules + lexicon/phrase overrides}},
+# and how many compiled profiles (one tuned lexicon copy each) stay cached.
+ANALYZER_PROFILES_FILE: str = os.environ.get("SPE_PROFILES", "").strip()
+ANALYZER_CACHE_SIZE: int = int(os.environ.get("SPE_PROFILE_CACHE", "8"))
+
+# Traffic capture (off unless SPE_CAPTURE_FILE is set): sampled JSONL log of
+# requests for spe_replay.py. Text is kept as-is (raw), replaced by a keyed
+# hash (hash) or masked to the same shape (redact). The default, hash, keeps
+# no student text, but then a replay can only measure latency: responses are
+# verified against the capture only for raw text (see `sentiment_api.py
+# serve --help`). Under `prefork --workers N` (N > 1) a path without "{pid}"
+# gets "-{pid}" before its extension.
+CAPTURE_FILE: str = os.environ.get("SPE_CAPTURE_FILE", "").strip()
+CAPTURE_SAMPLE: float = float(os.environ.get("SPE_CAPTURE_SAMPLE", "0.1") or 0)
+CAPTURE_TEXT: str = os.environ.get("SPE_CAPTURE_TEXT", "hash").strip().lower()
+CAPTURE_MAX_BYTES: int = int(float(os.environ.get("SPE_CAPTURE_MAX_MB", "50") or 0) * 1024 * 1024)
+CAPTURE_BACKUPS: int = int(os.environ.get("SPE_CAPTURE_BACKUPS", "5"))
+CAPTURE_PATHS: Tuple[str, ...] = tuple(
+    p.strip() for p in os.environ.get("SPE_CAPTURE_PATHS", "/analyze").split(",") if p.strip()
+)
+
+# Draft prefetch: warm results kept (0 disables /prefetch) and queued draft
+# fields; older queued fields are dropped first. The store is per process, so
+# `prefork --workers N` with N > 1 disables it.
+PREFETCH_ENTRIES: int = int(os.environ.get("SPE_PREFETCH_ENTRIES", "10000"))
+PREFETCH_PENDING: int = int(os.environ.get("SPE_PREFETCH_PENDING", "2000"))
+
+# Live mode: texts shorter than this skip the per-sentence pass.
+LIVE_SENTENCE_MIN_CHARS: int = 160
+
+# Per-request budgets. Longer texts are trimmed before scoring (budget_text);
+# batch items left when the CPU budget runs out come back in "deferred". The
+# CPU budget is checked between batch items, so it never interrupts one text.
+# Input past MAX_INPUT_CHARS (draft.php's cap for a whole draft) is ignored.
+MAX_INPUT_CHARS: int = int(os.environ.get("SPE_MAX_INPUT_CHARS", "200000"))
+MAX_TEXT_CHARS: int = int(os.environ.get("SPE_MAX_CHARS", "20000"))
+MAX_SENTENCES: int = int(os.environ.get("SPE_MAX_SENTENCES", "200"))
+CPU_BUDGET_MS: float = float(os.environ.get("SPE_CPU_BUDGET_MS", "2000") or 0)
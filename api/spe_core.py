@@ -0,0 +1,563 @@
+# spe_core.py
+# The SPE analysis pipeline: compound scoring, input budgets, disparity
+# evaluation, feature vectors and label rules, projected analysis.
+from __future__ import annotations
+
+from time import perf_counter
+from typing import List, Mapping, Optional, Tuple, Dict
+import math
+import re
+import time
+
+from spe_config import (
+    CPU_BUDGET_MS,
+    LIVE_SENTENCE_MIN_CHARS,
+    MAX_INPUT_CHARS,
+    MAX_SENTENCES,
+    MAX_TEXT_CHARS,
+    NEG_THR,
+    POS_THR,
+)
+from spe_lexicon import (
+    CONTRAST_RE,
+    LEXICON,
+    NEG_TAIL_CUES_RE,
+    NEUTRAL_CUE_RE,
+    PHRASE_RES,
+    STRONG_NEG_RE,
+    STRONG_POS_RE,
+    TOXIC_RE,
+    WORD_RE,
+    count_negative_cues,
+    has_any_word,
+    is_toxic,
+    split_contrast,
+)
+from spe_profiles import CompiledProfile, DEFAULT_PROFILE
+from spe_profiling import lap
+from spe_schemas import AnalyzeMode, AnalyzeOut, DEFAULT_RULES, LabelRules
+
+# =============================================================================
+# Labeling & utility
+# =============================================================================
+def preprocess_phrases(text: str, profile: Optional[CompiledProfile] = None) -> str:
+    """Collapse multi-word phrases into single tokens recognized by VADER."""
+    t = text
+    low = t.lower() if t.isascii() else None
+    for rx, token, needles in (profile or DEFAULT_PROFILE).phrase_res:
+        if low is not None and not any(n in low for n in needles):
+            continue
+        t = rx.sub(token, t)
+    return t
+
+
+def polarity_from_compound(c: float) -> float:
+    """Map VADER compound [-1,1] to [0,1]."""
+    return max(0.0, min(1.0, (c + 1.0) / 2.0))
+
+
+def label_from_compound(c: float, pos_thr: float = POS_THR, neg_thr: float = NEG_THR) -> str:
+    """Convert compound to label via thresholds on mapped polarity."""
+    p = polarity_from_compound(c)
+    if p >= pos_thr:
+        return "positive"
+    if p <= neg_thr:
+        return "negative"
+    return "neutral"
+
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def sentence_scores(text: str, profile: Optional[CompiledProfile] = None) -> List[Dict[str, float]]:
+    parts = SENTENCE_SPLIT_RE.split((text or "").strip())
+    score = (profile or DEFAULT_PROFILE).vader.polarity_scores
+    return [score(p) for p in parts if p]
+
+
+def contrast_tail_adjustment(text: str, s_all_compound: float, profile: Optional[CompiledProfile] = None) -> float:
+    """Weight contrastive tail and negative cue counts over the global score."""
+    _, cue, tail = split_contrast(text)
+    if not cue or not tail:
+        return s_all_compound
+
+    tail_scores = (profile or DEFAULT_PROFILE).vader.polarity_scores(tail)
+    tail_c = float(tail_scores["compound"])
+    cues = count_negative_cues(tail)
+
+    if cues >= 3:
+        enforced = min(tail_c, -0.20)
+        return 0.97 * enforced + 0.03 * s_all_compound
+
+    if tail_c < -0.05 or cues >= 1:
+        return 0.95 * tail_c + 0.05 * s_all_compound
+
+    if tail_c > 0.05 and s_all_compound < -0.05:
+        return 0.70 * tail_c + 0.30 * s_all_compound
+
+    return 0.60 * s_all_compound + 0.40 * tail_c
+
+
+def compound_parts(
+    raw_text: str,
+    timings: Optional[Dict[str, float]] = None,
+    live: bool = False,
+    profile: Optional[CompiledProfile] = None,
+) -> Tuple[Dict[str, float], float, Optional[float]]:
+    """
+    Pre-threshold pieces of the compound: (whole-text scores, contrast-adjusted
+    compound, extreme-sentence compound or None when there are no sentences).
+
+    live=True only runs the per-sentence pass when the text has at least
+    LIVE_SENTENCE_MIN_CHARS characters; shorter texts use the whole-text score
+    as the "extreme sentence". This is exact for single-sentence texts.
+    """
+    prof = timings is not None
+    if prof:
+        t0 = perf_counter()
+    text = preprocess_phrases(raw_text or "", profile)
+    if prof:
+        t0 = lap(timings, "preprocess", t0)
+    s_all = (profile or DEFAULT_PROFILE).vader.polarity_scores(text)
+    base_c = float(s_all["compound"])
+    if prof:
+        t0 = lap(timings, "vader", t0)
+    c_contrast = contrast_tail_adjustment(text, base_c, profile)
+    if prof:
+        t0 = lap(timings, "contrast", t0)
+
+    extreme_c: Optional[float] = None
+    if live and len(text) < LIVE_SENTENCE_MIN_CHARS:
+        extreme_c = base_c
+    else:
+        sents = sentence_scores(text, profile)
+        if sents:
+            extreme_c = float(max(sents, key=lambda s: abs(s["compound"]))["compound"])
+        if prof:
+            lap(timings, "sentences", t0)
+    return s_all, c_contrast, extreme_c
+
+
+def combine_compound(c_contrast: float, extreme_c: Optional[float]) -> float:
+    c_final = c_contrast if extreme_c is None else 0.5 * c_contrast + 0.5 * extreme_c
+    return max(-1.0, min(1.0, c_final))
+
+
+def adjusted_compound(
+    raw_text: str,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[float, Dict[str, float]]:
+    """Compute compound with phrase preprocessing, contrast adjustment, and extreme sentence emphasis."""
+    s_all, c_contrast, extreme_c = compound_parts(raw_text, timings)
+    return combine_compound(c_contrast, extreme_c), s_all
+
+
+def live_compound(
+    raw_text: str,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[float, Dict[str, float]]:
+    """
+    Cheaper approximation of adjusted_compound for live badges.
+
+    Same phrase preprocessing, whole-text score and contrast adjustment, but
+    the per-sentence pass is skipped for short texts (see compound_parts).
+    """
+    s_all, c_contrast, extreme_c = compound_parts(raw_text, timings, live=True)
+    return combine_compound(c_contrast, extreme_c), s_all
+
+
+# =============================================================================
+# Input budgets (worst-case latency guards)
+# =============================================================================
+# Every pattern below runs on arbitrary user text. Python's re has no match
+# timeout, so instead each pattern must be free of the shapes that backtrack
+# super-linearly (a repeat inside a repeat, or an alternation under a repeat);
+# `python sentiment_api.py guards` runs regex_audit() and a fuzz benchmark.
+def audited_patterns() -> List[Tuple[str, "re.Pattern[str]"]]:
+    pats = [(f"PHRASE_PATTERNS[{token}]", rx) for rx, token, _ in PHRASE_RES]
+    pats += [
+        ("CONTRAST_RE", CONTRAST_RE),
+        ("NEG_TAIL_CUES_RE", NEG_TAIL_CUES_RE),
+        ("TOXIC_RE", TOXIC_RE),
+        ("NEUTRAL_CUE_RE", NEUTRAL_CUE_RE),
+        ("STRONG_POS_RE", STRONG_POS_RE),
+        ("STRONG_NEG_RE", STRONG_NEG_RE),
+        ("SENTENCE_SPLIT_RE", SENTENCE_SPLIT_RE),
+        ("WORD_RE", WORD_RE),
+    ]
+    return pats
+
+
+def _nested_repeat(tree, in_repeat: bool = False) -> Optional[str]:
+    from re import _constants as c  # type: ignore[attr-defined]
+
+    for op, av in tree:
+        if op in (c.MAX_REPEAT, c.MIN_REPEAT):
+            if in_repeat and av[1] > 1:
+                return "repeat inside a repeat"
+            found = _nested_repeat(av[2], in_repeat or av[1] > 1)
+            if found:
+                return found
+        elif op is c.BRANCH:
+            if in_repeat:
+                return "alternation inside a repeat"
+            for branch in av[1]:
+                found = _nested_repeat(branch, in_repeat)
+                if found:
+                    return found
+        elif op is c.SUBPATTERN:
+            found = _nested_repeat(av[3], in_repeat)
+            if found:
+                return found
+        elif op in (c.ASSERT, c.ASSERT_NOT):
+            found = _nested_repeat(av[1], in_repeat)
+            if found:
+                return found
+    return None
+
+
+def regex_audit() -> List[Tuple[str, str]]:
+    """(name, problem) for every pattern that could backtrack super-linearly."""
+    from re import _parser  # type: ignore[attr-defined]
+
+    problems = []
+    for name, rx in audited_patterns():
+        found = _nested_repeat(_parser.parse(rx.pattern, rx.flags))
+        if found:
+            problems.append((name, found))
+    return problems
+
+
+def clip_input(text: Optional[str]) -> Tuple[str, bool]:
+    """Strip a text and drop anything past MAX_INPUT_CHARS; return (text, cut)."""
+    tx = (text or "").strip()
+    if len(tx) > MAX_INPUT_CHARS:
+        return tx[:MAX_INPUT_CHARS].rstrip(), True
+    return tx, False
+
+
+def _sentence_valence(sentence: str, lexicon: Mapping[str, float]) -> float:
+    """Lexicon valence sum of a sentence, with VADER's "but" weighting (0.5 before, 1.5 after)."""
+    words = WORD_RE.findall(sentence.lower())
+    if "but" not in words:
+        return sum(lexicon.get(w, 0.0) for w in words)
+    j = words.index("but")
+    return 0.5 * sum(lexicon.get(w, 0.0) for w in words[:j]) + 1.5 * sum(lexicon.get(w, 0.0) for w in words[j:])
+
+
+def budget_text(
+    text: str,
+    max_chars: Optional[int] = None,
+    max_sentences: Optional[int] = None,
+    lexicon: Optional[Mapping[str, float]] = None,
+) -> Tuple[str, bool]:
+    """
+    Trim a text to max_sentences / max_chars (default MAX_SENTENCES /
+    MAX_TEXT_CHARS) for the VADER pipeline.
+
+    Returns (text, trimmed). An over-budget text keeps the two sentences most
+    likely to be the extreme sentence (highest and lowest _sentence_valence
+    under `lexicon`, default the built-in LEXICON; pass the profile's), the
+    sentence with the first contrastive cue, and an evenly spaced sample of
+    the rest (so the positive/negative mix of the whole text survives), in
+    their original order and max_sentences in total; if that is still over
+    the character budget (one huge sentence), its middle is cut at whitespace.
+    Toxicity, the cue heuristics and the counts always see the full text.
+    `python sentiment_api.py guards` reports how often the label is unchanged.
+    """
+    max_chars = MAX_TEXT_CHARS if max_chars is None else max_chars
+    max_sentences = MAX_SENTENCES if max_sentences is None else max_sentences
+    if len(text) <= max_chars and sum(map(text.count, ".!?")) < max_sentences:
+        return text, False
+    parts = SENTENCE_SPLIT_RE.split(text)
+    n = len(parts)
+    if n <= max_sentences and len(text) <= max_chars:
+        return text, False
+
+    k = max(1, min(max_sentences, n, max_chars * n // (len(text) + n)))
+    # The extreme sentence weighs half of the compound, so losing it to the
+    # sample flips labels; a lexicon sum finds it without running VADER.
+    lex = LEXICON if lexicon is None else lexicon
+    valence = [_sentence_valence(p, lex) for p in parts]
+    picks = [max(range(n), key=valence.__getitem__), min(range(n), key=valence.__getitem__)]
+    m = CONTRAST_RE.search(text)
+    if m:
+        picks.append(len(SENTENCE_SPLIT_RE.findall(text, 0, m.start())))
+    keep = set(list(dict.fromkeys(picks))[:k])  # in priority order, within the sentence budget
+    others = [i for i in range(n) if i not in keep]
+    rest = k - len(keep)
+    keep.update(others[i * len(others) // rest] for i in range(rest))
+    out = " ".join(parts[i] for i in sorted(keep))
+    if len(out) > max_chars:
+        half = max_chars // 2
+        head, tail = out[:half], out[-half:]
+        out = head[: head.rfind(" ") + 1 or half].rstrip() + " " + tail[tail.find(" ") + 1 :].lstrip()
+    return out, True
+
+
+def cpu_deadline() -> float:
+    """
+    thread_time() value after which a batch stops analyzing further items.
+
+    Checked between items only: a single text (or the item in progress) runs
+    to completion, so its worst case is bounded by the input budgets above
+    (clip_input + budget_text), not by CPU_BUDGET_MS.
+    """
+    if CPU_BUDGET_MS <= 0:
+        return math.inf
+    return time.thread_time() + CPU_BUDGET_MS / 1000.0
+
+
+# =============================================================================
+# Disparity evaluation
+# =============================================================================
+def evaluate_disparity(
+    label: str,
+    score_total: Optional[float],
+    score_min: float,
+    score_max: float,
+    with_reason: bool = True,
+    rules: Optional[LabelRules] = None,
+) -> Tuple[bool, Optional[str], bool]:
+    """
+    Determine if numeric score and comment sentiment disagree enough
+    to request confirmation. with_reason=False skips formatting the message;
+    rules overrides the DISPARITY_* bands.
+    """
+    if score_total is None:
+        return False, None, False
+
+    try:
+        st = float(score_total)
+    except (TypeError, ValueError):
+        return False, None, False
+
+    if st < score_min or st > score_max:
+        return False, None, False
+
+    r = rules or DEFAULT_RULES
+    if (r.disparity_low_min <= st <= r.disparity_low_max and label == "positive") or (
+        r.disparity_high_min <= st <= r.disparity_high_max and label in ("negative", "toxic")
+    ):
+        reason = None
+        if with_reason:
+            reason = (
+                f"Your total score is {int(st)}, but your comment reads as {label}. "
+                f"Do you want to continue with submission?"
+            )
+        return True, reason, True
+
+    return False, None, False
+
+
+# =============================================================================
+# Core analyzer
+# =============================================================================
+ANALYZE_FIELDS: Tuple[str, ...] = tuple(AnalyzeOut.model_fields)
+_ALL_FIELDS = frozenset(ANALYZE_FIELDS)
+# Everything except the opt-in feature vector.
+_DEFAULT_FIELDS = _ALL_FIELDS - {"features"}
+FEATURE_NAMES: Tuple[str, ...] = (
+    "base",  # whole-text VADER compound
+    "contrast",  # contrast-adjusted compound
+    "extreme",  # most extreme sentence compound (None: no sentences)
+    "neutral_cue",
+    "strong_pos",
+    "strong_neg",
+    "toxic",
+    "length",  # characters
+)
+# Empty texts skip VADER; this vector relabels to neutral / 0.0.
+_EMPTY_FEATURES: Dict[str, object] = {
+    "base": 0.0,
+    "contrast": 0.0,
+    "extreme": None,
+    "neutral_cue": False,
+    "strong_pos": False,
+    "strong_neg": False,
+    "toxic": False,
+    "length": 0,
+}
+# Outputs that need the adjusted compound (and hence the whole pipeline).
+_COMPOUND_FIELDS = frozenset(
+    {"label", "score", "confidence", "compound", "disparity", "disparity_reason", "suggest_confirm"}
+)
+# Outputs that only need the whole-text VADER pass.
+_SCORE_FIELDS = frozenset({"pos", "neu", "neg"})
+
+
+def text_features(
+    tx: str,
+    body: str,
+    timings: Optional[Dict[str, float]] = None,
+    mode: AnalyzeMode = "full",
+    profile: Optional[CompiledProfile] = None,
+) -> Tuple[Dict[str, object], Dict[str, float]]:
+    """
+    Pre-threshold feature vector (FEATURE_NAMES) of a stripped, non-empty
+    text, plus its whole-text VADER scores. VADER scores `body` (the
+    budget_text copy); cue flags, toxicity and length use the full text.
+    Labels are a pure function of the vector (apply_label_rules), so stored
+    vectors can be relabeled without re-running VADER.
+    """
+    p = profile or DEFAULT_PROFILE
+    scores, c_contrast, extreme_c = compound_parts(body, timings, mode == "live", p)
+    if timings is not None:
+        t0 = perf_counter()
+    low = tx.lower()
+    feats: Dict[str, object] = {
+        "base": float(scores["compound"]),
+        "contrast": c_contrast,
+        "extreme": extreme_c,
+        "neutral_cue": bool(p.neutral_cue_re.search(low)),
+        "strong_pos": has_any_word(low, p.strong_pos_re, p.strong_pos_phrases),
+        "strong_neg": has_any_word(low, p.strong_neg_re, p.strong_neg_phrases),
+        "toxic": is_toxic(tx),
+        "length": len(tx),
+    }
+    if timings is not None:
+        lap(timings, "heuristics", t0)
+    return feats, scores
+
+
+def apply_label_rules(f: Mapping[str, object], rules: Optional[LabelRules] = None) -> Tuple[float, str]:
+    """Feature vector -> (compound, label): combine, cue damping, thresholds, toxic floor."""
+    r = rules or DEFAULT_RULES
+    comp = combine_compound(f["contrast"], f["extreme"])  # type: ignore[arg-type]
+    strong = f["strong_pos"] or f["strong_neg"]
+
+    # Heuristics for neutral cues / long neutral-ish text
+    if f["neutral_cue"] and not strong:
+        comp *= r.cue_scale
+        comp = max(-r.cue_cap, min(r.cue_cap, comp))
+
+    if abs(comp) <= r.long_abs and f["length"] >= r.long_chars and not strong:  # type: ignore[operator]
+        comp *= r.long_scale
+        comp = max(-r.long_cap, min(r.long_cap, comp))
+
+    label = label_from_compound(comp, r.pos_thr, r.neg_thr)
+    if f["toxic"] and comp > r.toxic_floor:
+        comp = r.toxic_floor
+        label = "toxic"
+    return comp, label
+
+
+def analyze_text_fields(
+    text: str,
+    score_total: Optional[float],
+    score_min: Optional[float],
+    score_max: Optional[float],
+    fields: Optional[frozenset] = None,
+    timings: Optional[Dict[str, float]] = None,
+    mode: AnalyzeMode = "full",
+    profile: Optional[CompiledProfile] = None,
+    warm: Optional[Tuple[Dict[str, object], Dict[str, float]]] = None,
+) -> Dict[str, object]:
+    """
+    Analyze one text and return only the requested AnalyzeOut fields.
+
+    Stages whose outputs are not requested are skipped: word counting,
+    the disparity message, pos/neu/neg rounding, and the whole compound
+    pipeline when none of label/score/compound/disparity is wanted.
+    Requested values are identical to analyze_text_full's.
+
+    mode="full" is the exact pipeline used for batch results. mode="live" is a
+    cheaper approximation for the typing badge: toxic texts short-circuit
+    after a single whole-text score (no contrast/sentence pass, no neutral
+    heuristics) and the sentence pass is skipped for short texts (see
+    live_compound). `python sentiment_api.py modes` reports how often the
+    two modes disagree.
+
+    Text past MAX_INPUT_CHARS is dropped and the VADER pipeline scores a
+    budget_text() copy of over-budget text; "trimmed" reports either.
+
+    profile (a CompiledProfile) swaps in its lexicon, cues and LabelRules,
+    including the default score range; None uses the built-in settings.
+    warm is a precomputed (features, scores) of the same text under the same
+    profile in full mode (DraftPrefetch.lookup); it replaces the VADER pass.
+    """
+    p = profile or DEFAULT_PROFILE
+    r = p.rules
+    want = _DEFAULT_FIELDS if fields is None else fields
+    tx, cut = clip_input(text)
+    body, trimmed = budget_text(tx, lexicon=p.vader.lexicon)
+    trimmed = trimmed or cut
+    out: Dict[str, object] = {}
+
+    need_compound = not want.isdisjoint(_COMPOUND_FIELDS)
+    need_scores = not want.isdisjoint(_SCORE_FIELDS)
+    scores: Optional[Dict[str, float]] = None
+    comp = 0.0
+    label = "neutral"
+    toxic_flag = False
+    feats: Optional[Dict[str, object]] = None
+
+    if not tx:
+        scores = {"pos": 0.0, "neu": 1.0, "neg": 0.0}
+        feats = dict(_EMPTY_FEATURES)
+    elif need_compound and mode == "live" and "features" not in want and is_toxic(tx):
+        # Live-mode short-circuit for toxic text: one whole-text score, no heuristics.
+        scores = p.vader.polarity_scores(preprocess_phrases(body, p))
+        base_c = float(scores["compound"])
+        comp = min(base_c, r.toxic_floor)
+        label = "toxic" if base_c > r.toxic_floor else label_from_compound(comp, r.pos_thr, r.neg_thr)
+        toxic_flag = True
+    elif need_compound or "features" in want:
+        feats, scores = warm if warm is not None else text_features(tx, body, timings, mode, p)
+        comp, label = apply_label_rules(feats, r)
+        toxic_flag = bool(feats["toxic"])
+    else:
+        if need_scores:
+            scores = warm[1] if warm is not None else p.vader.polarity_scores(preprocess_phrases(body, p))
+        if "toxic" in want:
+            toxic_flag = is_toxic(tx)
+
+    if need_compound:
+        smin = float(score_min) if score_min is not None else r.score_min
+        smax = float(score_max) if score_max is not None else r.score_max
+        conf = round(polarity_from_compound(comp), 6)
+        disparity, reason, suggest = evaluate_disparity(
+            label, score_total, smin, smax, "disparity_reason" in want, r
+        )
+        vals: Dict[str, object] = {
+            "label": label,
+            "score": conf,
+            "confidence": conf,
+            "compound": round(comp, 6),
+            "disparity": disparity,
+            "disparity_reason": reason,
+            "suggest_confirm": suggest,
+        }
+    else:
+        vals = {}
+    if need_scores and scores is not None:
+        vals["pos"] = round(float(scores["pos"]), 6)
+        vals["neu"] = round(float(scores["neu"]), 6)
+        vals["neg"] = round(float(scores["neg"]), 6)
+    vals["toxic"] = toxic_flag
+    if "word_count" in want:
+        vals["word_count"] = len(WORD_RE.findall(tx))
+    vals["char_count"] = len(tx)
+    vals["trimmed"] = trimmed
+    vals["features"] = feats
+
+    for k in ANALYZE_FIELDS:
+        if k in want:
+            out[k] = vals[k]
+    return out
+
+
+def analyze_text_full(
+    text: str,
+    score_total: Optional[float],
+    score_min: Optional[float],
+    score_max: Optional[float],
+    timings: Optional[Dict[str, float]] = None,
+    mode: AnalyzeMode = "full",
+    profile: Optional[CompiledProfile] = None,
+    warm: Optional[Tuple[Dict[str, object], Dict[str, float]]] = None,
+) -> AnalyzeOut:
+    """Analyze one text and return every field (see analyze_text_fields)."""
+    return AnalyzeOut(
+        **analyze_text_fields(text, score_total, score_min, score_max, None, timings, mode, profile, warm)
+    )
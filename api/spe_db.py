@@ -0,0 +1,543 @@
+# spe_db.py
+# Database side: the worker that drains pending spe_sentiment rows and the
+# spe_sentiment_feat feature store used to relabel activities.
+from __future__ import annotations
+
+from collections import Counter
+from time import perf_counter
+from typing import List, Mapping, Optional, Tuple, Dict
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import unquote, urlsplit
+
+from spe_core import FEATURE_NAMES, analyze_text_fields, apply_label_rules, evaluate_disparity
+from spe_profiles import analyzer_profiles
+from spe_schemas import DEFAULT_RULES, LabelRules
+
+# =============================================================================
+# Database worker (drains pending spe_sentiment rows)
+# =============================================================================
+# Rows move pending -> done|error. A worker claims a page by writing its
+# token to leaseowner and an expiry to leaseuntil (db/upgrade.php); status and
+# label keep their install.xml meaning while a row is leased, so the PHP pages
+# never see a half-processed row. A lease past leaseuntil is considered
+# abandoned and can be claimed again. Every write is guarded by the token and
+# status = 'pending', so a row finished elsewhere (analyze_push.php) or
+# re-claimed after expiry is left alone.
+class SentimentDB:
+    """Thin DB-API wrapper: sqlite:///path, mysql://…, postgresql://…"""
+
+    def __init__(self, dsn: str, prefix: str = "mdl_") -> None:
+        parts = urlsplit(dsn)
+        scheme = parts.scheme.split("+")[0]
+        if scheme == "sqlite":
+            # sqlite:///relative.db or sqlite:////absolute/path.db
+            path = dsn.split(":///", 1)[1] if ":///" in dsn else ""
+            self.conn = sqlite3.connect(
+                path or ":memory:", isolation_level=None, timeout=30, check_same_thread=False
+            )
+            self.ph = "?"
+        elif scheme in ("mysql", "mariadb"):
+            import pymysql  # type: ignore
+
+            self.conn = pymysql.connect(
+                host=parts.hostname or "localhost",
+                port=parts.port or 3306,
+                user=unquote(parts.username or ""),
+                password=unquote(parts.password or ""),
+                database=parts.path.lstrip("/"),
+                charset="utf8mb4",
+                autocommit=True,
+            )
+            self.ph = "%s"
+        elif scheme in ("postgres", "postgresql", "pgsql"):
+            import psycopg2  # type: ignore
+
+            self.conn = psycopg2.connect(dsn.replace(parts.scheme + "://", "postgresql://", 1))
+            self.conn.autocommit = True
+            self.ph = "%s"
+        else:
+            raise ValueError(f"unsupported database URL: {dsn}")
+        self.kind = scheme
+        self.table = f"{prefix}spe_sentiment"
+        self.feat_table = f"{prefix}spe_sentiment_feat"
+        self.rating_table = f"{prefix}spe_rating"
+
+    def sql(self, text: str) -> str:
+        text = text.replace("{t}", self.table).replace("{f}", self.feat_table)
+        return text.replace("{r}", self.rating_table).replace("?", self.ph)
+
+    def begin(self):
+        cur = self.conn.cursor()
+        cur.execute("BEGIN IMMEDIATE" if self.kind == "sqlite" else "BEGIN")
+        return cur
+
+    def commit(self, cur) -> None:
+        cur.execute("COMMIT")
+
+    def rollback(self, cur) -> None:
+        try:
+            cur.execute("ROLLBACK")
+        except Exception:
+            pass
+
+    def create_standin(self) -> None:
+        """Create spe_sentiment, spe_sentiment_feat and spe_rating (install.xml layout) for SQLite testing."""
+        self.conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                speid INTEGER NOT NULL, raterid INTEGER NOT NULL, rateeid INTEGER NOT NULL,
+                type VARCHAR(20) NOT NULL, text TEXT NOT NULL,
+                sentiment NUMERIC(10,4), label VARCHAR(20), status VARCHAR(20) NOT NULL,
+                leaseowner VARCHAR(40), leaseuntil INTEGER NOT NULL DEFAULT 0,
+                timecreated INTEGER NOT NULL, timemodified INTEGER)"""
+        )
+        self.conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.feat_table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sentimentid INTEGER NOT NULL UNIQUE,
+                base NUMERIC(12,10) NOT NULL, contrast NUMERIC(12,10) NOT NULL, extreme NUMERIC(12,10),
+                neutralcue INTEGER NOT NULL, strongpos INTEGER NOT NULL, strongneg INTEGER NOT NULL,
+                toxic INTEGER NOT NULL, textlength INTEGER NOT NULL, timemodified INTEGER NOT NULL)"""
+        )
+        self.conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.rating_table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                speid INTEGER NOT NULL, raterid INTEGER NOT NULL, rateeid INTEGER NOT NULL,
+                criterion VARCHAR(50) NOT NULL, score INTEGER NOT NULL, comment TEXT,
+                timecreated INTEGER NOT NULL)"""
+        )
+
+
+def _in_list(db: SentimentDB, n: int) -> str:
+    return ", ".join([db.ph] * n)
+
+
+# (id, compound, label, features)
+WorkerResult = Tuple[int, float, str, Optional[Dict[str, object]]]
+_WORKER_FIELDS = frozenset({"compound", "label", "features"})
+
+
+class SentimentWorker:
+    """Claim pages of pending rows, analyze them, write results in one transaction per page."""
+
+    def __init__(
+        self,
+        db: SentimentDB,
+        page_size: int = 500,
+        lease_seconds: int = 300,
+        max_attempts: int = 5,
+        backoff: float = 2.0,
+        speid: Optional[int] = None,
+        mode: str = "full",
+    ) -> None:
+        self.db = db
+        self.page_size = page_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.speid = speid
+        self.mode = mode
+        self.token = uuid.uuid4().hex  # leaseowner CHAR(40)
+        self.retry: Dict[int, Tuple[int, float, str]] = {}  # id -> (attempts, due, text)
+        self.speids: Dict[int, int] = {}  # id -> speid of claimed/retrying rows (profile lookup)
+        self.stats = Counter()
+
+    def claim(self, now: int) -> List[Tuple[int, str]]:
+        """Lease up to page_size pending rows that no live lease holds; return (id, text)."""
+        db = self.db
+        where = "status = 'pending' AND leaseuntil < ?"
+        params: List[object] = [now]
+        if self.speid is not None:
+            where += " AND speid = ?"
+            params.append(self.speid)
+        cur = db.begin()
+        try:
+            lock = " FOR UPDATE SKIP LOCKED" if db.kind != "sqlite" else ""
+            cur.execute(
+                db.sql(f"SELECT id FROM {{t}} WHERE {where} ORDER BY id LIMIT {int(self.page_size)}{lock}"),
+                params,
+            )
+            ids = [int(r[0]) for r in cur.fetchall()]
+            if ids:
+                cur.execute(
+                    db.sql(
+                        f"UPDATE {{t}} SET leaseowner = ?, leaseuntil = ? "
+                        f"WHERE id IN ({_in_list(db, len(ids))}) AND {where}"
+                    ),
+                    [self.token, now + self.lease_seconds, *ids, *params],
+                )
+                cur.execute(
+                    db.sql(
+                        f"SELECT id, text, speid FROM {{t}} WHERE id IN ({_in_list(db, len(ids))}) "
+                        f"AND status = 'pending' AND leaseowner = ?"
+                    ),
+                    [*ids, self.token],
+                )
+                fetched = cur.fetchall()
+                self.speids.update((int(r[0]), int(r[2])) for r in fetched)
+                rows = [(int(r[0]), str(r[1] or "")) for r in fetched]
+            else:
+                rows = []
+            db.commit(cur)
+        except Exception:
+            db.rollback(cur)
+            raise
+        return rows
+
+    def _analyze(self, rows: List[Tuple[int, str]]) -> Tuple[List[WorkerResult], List[Tuple[int, str]]]:
+        done: List[WorkerResult] = []
+        failed: List[Tuple[int, str]] = []
+        for rid, text in rows:
+            try:
+                profile = analyzer_profiles.for_activity(self.speids.get(rid))
+                r = analyze_text_fields(text, None, None, None, _WORKER_FIELDS, None, self.mode, profile)  # type: ignore[arg-type]
+                done.append((rid, round(float(r["compound"]), 4), str(r["label"]), r["features"]))  # type: ignore[arg-type]
+            except Exception:
+                failed.append((rid, text))
+        return done, failed
+
+    def _write(self, now: int, done: List[WorkerResult], errors: List[int], held: List[int]) -> None:
+        """One transaction: features, bulk CASE update for results, errors, and lease refresh."""
+        db = self.db
+        mine = "leaseowner = ? AND status = 'pending'"
+        cur = db.begin()
+        try:
+            if done:
+                # Features first, while the rows are still leased to us.
+                store_features(db, cur, [(d[0], d[3]) for d in done], now, self.token)
+                ids = [d[0] for d in done]
+                sent_case = " ".join(["WHEN ? THEN ?"] * len(done))
+                label_case = " ".join(["WHEN ? THEN ?"] * len(done))
+                params: List[object] = []
+                for rid, comp, _, _ in done:
+                    params += [rid, comp]
+                for rid, _, lbl, _ in done:
+                    params += [rid, lbl]
+                cur.execute(
+                    db.sql(
+                        f"UPDATE {{t}} SET sentiment = CASE id {sent_case} END, "
+                        f"label = CASE id {label_case} END, status = 'done', "
+                        f"leaseowner = NULL, leaseuntil = 0, timemodified = ? "
+                        f"WHERE id IN ({_in_list(db, len(ids))}) AND {mine}"
+                    ),
+                    [*params, now, *ids, self.token],
+                )
+            if errors:
+                cur.execute(
+                    db.sql(
+                        f"UPDATE {{t}} SET status = 'error', leaseowner = NULL, leaseuntil = 0, timemodified = ? "
+                        f"WHERE id IN ({_in_list(db, len(errors))}) AND {mine}"
+                    ),
+                    [now, *errors, self.token],
+                )
+            if held:
+                cur.execute(
+                    db.sql(
+                        f"UPDATE {{t}} SET leaseuntil = ? "
+                        f"WHERE id IN ({_in_list(db, len(held))}) AND {mine}"
+                    ),
+                    [now + self.lease_seconds, *held, self.token],
+                )
+            db.commit(cur)
+        except Exception:
+            db.rollback(cur)
+            raise
+
+    def _fail(self, rid: int, text: str, now: float, errors: List[int]) -> None:
+        attempts = self.retry.get(rid, (0, 0.0, text))[0] + 1
+        if attempts >= self.max_attempts:
+            self.retry.pop(rid, None)
+            errors.append(rid)
+        else:
+            self.retry[rid] = (attempts, now + self.backoff * (2 ** (attempts - 1)), text)
+
+    def run_once(self) -> int:
+        """Process one page (plus due retries); return rows handled."""
+        now = time.time()
+        due = [(rid, v[2]) for rid, v in self.retry.items() if v[1] <= now]
+        rows = due + self.claim(int(now))
+        if not rows:
+            return 0
+        done, failed = self._analyze(rows)
+        errors: List[int] = []
+        for rid, text in failed:
+            self._fail(rid, text, now, errors)
+        for rid, _, _, _ in done:
+            self.retry.pop(rid, None)
+        held = [rid for rid in self.retry]
+        try:
+            self._write(int(now), done, errors, held)
+        except Exception as exc:
+            # Page write failed: keep the lease and retry every row with backoff.
+            print(f"[worker] write failed: {exc}", file=sys.stderr)
+            self.stats["write_failures"] += 1
+            errors = []
+            for rid, text in rows:
+                self._fail(rid, text, now, errors)
+            self._forget_finished()
+            return len(rows)
+        self.stats["done"] += len(done)
+        self.stats["error"] += len(errors)
+        self.stats["retrying"] = len(self.retry)
+        self._forget_finished()
+        return len(rows)
+
+    def _forget_finished(self) -> None:
+        self.speids = {rid: sp for rid, sp in self.speids.items() if rid in self.retry}
+
+    def run(self, poll: float = 2.0, once: bool = False, stop: Optional[threading.Event] = None) -> Counter:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            n = self.run_once()
+            if n:
+                print(f"[worker] {dict(self.stats)}", file=sys.stderr)
+            elif once and not self.retry:
+                break
+            else:
+                stop.wait(poll)
+        return self.stats
+
+
+# =============================================================================
+# Feature store + relabeling (spe_sentiment_feat)
+# =============================================================================
+# The worker (and analyze_push.php) store each text's pre-threshold feature
+# vector next to its label. Retuning thresholds, damping or disparity bands
+# then only needs relabel_columns() over the stored columns, not VADER.
+FEATURE_COLUMNS: Dict[str, str] = {
+    "base": "base",
+    "contrast": "contrast",
+    "extreme": "extreme",
+    "neutral_cue": "neutralcue",
+    "strong_pos": "strongpos",
+    "strong_neg": "strongneg",
+    "toxic": "toxic",
+    "length": "textlength",
+}
+_FLOAT_FEATURES = frozenset({"base", "contrast", "extreme"})
+
+
+def _feature_row(sid: int, f: Mapping[str, object], now: int) -> List[object]:
+    row: List[object] = [sid]
+    for name in FEATURE_NAMES:
+        v = f[name]
+        row.append(int(v) if isinstance(v, bool) else v)
+    return row + [now]
+
+
+def store_features(
+    db: SentimentDB,
+    cur,
+    rows: List[Tuple[int, Optional[Mapping[str, object]]]],
+    now: int,
+    lease: Optional[str] = None,
+) -> None:
+    """Replace the feature rows of (sentiment id, features); with lease, only rows still leased to it."""
+    rows = [(sid, f) for sid, f in rows if f is not None]
+    if not rows:
+        return
+    ids = [sid for sid, _ in rows]
+    guard = " AND leaseowner = ? AND status = 'pending'" if lease else ""
+    cur.execute(
+        db.sql(
+            f"DELETE FROM {{f}} WHERE sentimentid IN "
+            f"(SELECT id FROM {{t}} WHERE id IN ({_in_list(db, len(ids))}){guard})"
+        ),
+        [*ids, lease] if lease else ids,
+    )
+    cols = ", ".join(["sentimentid", *FEATURE_COLUMNS.values(), "timemodified"])
+    marks = ", ".join(["?"] * (len(FEATURE_COLUMNS) + 2))
+    cur.executemany(
+        db.sql(f"INSERT INTO {{f}} ({cols}) SELECT {marks} FROM {{t}} WHERE id = ?{guard}"),
+        [_feature_row(sid, f, now) + ([sid, lease] if lease else [sid]) for sid, f in rows],
+    )
+
+
+def load_features(db: SentimentDB, speid: int) -> Dict[str, object]:
+    """Columns of every analyzed text of an activity that has stored features."""
+    cur = db.conn.cursor()
+    fcols = ", ".join(f"f.{c}" for c in FEATURE_COLUMNS.values())
+    cur.execute(
+        db.sql(
+            f"SELECT s.id, s.raterid, s.rateeid, s.label, {fcols} FROM {{t}} s "
+            f"JOIN {{f}} f ON f.sentimentid = s.id WHERE s.speid = ? AND s.status = 'done' ORDER BY s.id"
+        ),
+        [speid],
+    )
+    rows = cur.fetchall()
+    cur.execute(
+        db.sql("SELECT raterid, rateeid, SUM(score) FROM {r} WHERE speid = ? GROUP BY raterid, rateeid"),
+        [speid],
+    )
+    totals = {(int(a), int(b)): float(t) for a, b, t in cur.fetchall()}
+    cur.execute(
+        db.sql(
+            "SELECT COUNT(*) FROM {t} s WHERE s.speid = ? AND s.status = 'done' "
+            "AND NOT EXISTS (SELECT 1 FROM {f} f WHERE f.sentimentid = s.id)"
+        ),
+        [speid],
+    )
+    missing = int(cur.fetchone()[0])
+    cols: Dict[str, List[object]] = {name: [] for name in FEATURE_NAMES}
+    for r in rows:
+        for name, v in zip(FEATURE_NAMES, r[4:]):
+            # DECIMAL columns come back as Decimal from MySQL/PostgreSQL.
+            cols[name].append(None if v is None else float(v) if name in _FLOAT_FEATURES else int(v))
+    return {
+        "ids": [int(r[0]) for r in rows],
+        "labels": [r[3] for r in rows],
+        "totals": [totals.get((int(r[1]), int(r[2]))) for r in rows],
+        "columns": cols,
+        "missing": missing,
+    }
+
+
+def relabel_columns(
+    cols: Mapping[str, List[object]],
+    totals: List[Optional[float]],
+    rules: Optional[LabelRules] = None,
+) -> Tuple[List[float], List[str], List[bool]]:
+    """
+    (compound, label, disparity) per stored feature vector, via the same
+    apply_label_rules + evaluate_disparity the analyzer uses. Pure Python:
+    the deployed venv has no numpy, and a whole activity relabels in
+    milliseconds this way.
+    """
+    r = rules or DEFAULT_RULES
+    comps: List[float] = []
+    labels: List[str] = []
+    disp: List[bool] = []
+    for i, total in enumerate(totals):
+        f = {name: cols[name][i] for name in FEATURE_NAMES}
+        comp, label = apply_label_rules(f, r)
+        comps.append(comp)
+        labels.append(label)
+        disp.append(evaluate_disparity(label, total, r.score_min, r.score_max, False, r)[0])
+    return comps, labels, disp
+
+
+def relabel_activity(
+    db: SentimentDB,
+    speid: int,
+    rules: Optional[LabelRules] = None,
+    sweep_pos: Optional[List[float]] = None,
+    sweep_neg: Optional[List[float]] = None,
+    write: bool = False,
+    with_rows: bool = False,
+) -> Dict[str, object]:
+    """Relabel an activity from stored features; optionally write labels back or sweep thresholds."""
+    r = rules or analyzer_profiles.for_activity(speid).rules
+    t0 = perf_counter()
+    data = load_features(db, speid)
+    ids: List[int] = data["ids"]  # type: ignore[assignment]
+    stored: List[Optional[str]] = data["labels"]  # type: ignore[assignment]
+    cols: Dict[str, List[object]] = data["columns"]  # type: ignore[assignment]
+    totals: List[Optional[float]] = data["totals"]  # type: ignore[assignment]
+    comps, labels, disp = relabel_columns(cols, totals, r)
+    changed = [i for i, (a, b) in enumerate(zip(labels, stored)) if a != b]
+    out: Dict[str, object] = {
+        "ok": True,
+        "speid": speid,
+        "items": len(ids),
+        "missing_features": data["missing"],
+        "labels": dict(Counter(labels)),
+        "disparities": sum(disp),
+        "changed": len(changed),
+    }
+    if sweep_pos or sweep_neg:
+        out["sweep"] = _sweep(cols, totals, stored, r, sweep_pos or [r.pos_thr], sweep_neg or [r.neg_thr])
+    if write and changed:
+        _write_labels(db, [(ids[i], round(comps[i], 4), labels[i]) for i in changed])
+        out["written"] = len(changed)
+    if with_rows:
+        out["rows"] = [
+            {"id": sid, "label": lbl, "compound": round(c, 6), "disparity": d, "previous": old}
+            for sid, lbl, c, d, old in zip(ids, labels, comps, disp, stored)
+        ]
+    out["seconds"] = round(perf_counter() - t0, 4)
+    return out
+
+
+def _sweep(
+    cols: Mapping[str, List[object]],
+    totals: List[Optional[float]],
+    stored: List[Optional[str]],
+    r: LabelRules,
+    pos_grid: List[float],
+    neg_grid: List[float],
+) -> List[Dict[str, object]]:
+    """Label/disparity counts per (pos_thr, neg_thr)."""
+    grid = []
+    for pos in pos_grid:
+        for neg in neg_grid:
+            _, lbls, disp = relabel_columns(cols, totals, r.model_copy(update={"pos_thr": pos, "neg_thr": neg}))
+            grid.append(
+                {
+                    "pos_thr": pos,
+                    "neg_thr": neg,
+                    "labels": dict(Counter(lbls)),
+                    "disparities": sum(disp),
+                    "changed": sum(a != b for a, b in zip(lbls, stored)),
+                }
+            )
+    return grid
+
+
+def _write_labels(db: SentimentDB, rows: List[Tuple[int, float, str]], page: int = 500) -> None:
+    now = int(time.time())
+    cur = db.begin()
+    try:
+        for i in range(0, len(rows), page):
+            chunk = rows[i : i + page]
+            case = " ".join(["WHEN ? THEN ?"] * len(chunk))
+            params: List[object] = []
+            for rid, comp, _ in chunk:
+                params += [rid, comp]
+            for rid, _, lbl in chunk:
+                params += [rid, lbl]
+            cur.execute(
+                db.sql(
+                    f"UPDATE {{t}} SET sentiment = CASE id {case} END, label = CASE id {case} END, "
+                    f"timemodified = ? WHERE id IN ({_in_list(db, len(chunk))}) AND status = 'done'"
+                ),
+                [*params, now, *[c[0] for c in chunk]],
+            )
+        db.commit(cur)
+    except Exception:
+        db.rollback(cur)
+        raise
+
+
+def backfill_features(db: SentimentDB, speid: Optional[int] = None, page: int = 500) -> int:
+    """Compute and store features for analyzed rows that have none; return rows filled."""
+    filled = 0
+    where = "s.status = 'done' AND NOT EXISTS (SELECT 1 FROM {f} f WHERE f.sentimentid = s.id)"
+    params: List[object] = []
+    if speid is not None:
+        where += " AND s.speid = ?"
+        params.append(speid)
+    while True:
+        cur = db.conn.cursor()
+        cur.execute(
+            db.sql(f"SELECT s.id, s.text, s.speid FROM {{t}} s WHERE {where} ORDER BY s.id LIMIT {int(page)}"), params
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return filled
+        feats = []
+        for rid, text, sid in rows:
+            profile = analyzer_profiles.for_activity(int(sid))
+            r = analyze_text_fields(str(text or ""), None, None, None, frozenset({"features"}), None, "full", profile)
+            feats.append((int(rid), r["features"]))
+        cur = db.begin()
+        try:
+            store_features(db, cur, feats, int(time.time()))  # type: ignore[arg-type]
+            db.commit(cur)
+        except Exception:
+            db.rollback(cur)
+            raise
+        filled += len(rows)
@@ -0,0 +1,265 @@
+# spe_lexicon.py
+# Tuned lexicon and the compiled pattern tables of the SPE pipeline:
+# phrase collapsing, contrastive cues, toxic words, neutral/strong cues.
+# Everything here is read-only after import and shared by all threads.
+from __future__ import annotations
+
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple, Dict
+import re
+import sys
+
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+from spe_vader import FastVader
+
+# =============================================================================
+# Lexicon tuning (polite academic negatives & phrase collapsing)
+# =============================================================================
+analyzer = SentimentIntensityAnalyzer()
+
+CUSTOM_WEAK_NEG: Dict[str, float] = {
+    "concern": -2.6,
+    "concerns": -2.6,
+    "issue": -2.6,
+    "issues": -2.6,
+    "problem": -2.9,
+    "problems": -2.9,
+    "challenge": -2.6,
+    "challenges": -2.6,
+    "difficult": -2.1,
+    "difficulty": -2.1,
+    "difficulties": -2.1,
+    "delay": -2.5,
+    "delayed": -2.5,
+    "late": -2.5,
+    "inconsistent": -2.6,
+    "inconsistency": -2.6,
+    "struggle": -2.7,
+    "struggles": -2.7,
+    "struggling": -2.7,
+    "unreliable": -3.0,
+    "unresponsive": -3.0,
+    "lack": -2.4,
+    "lacking": -2.4,
+    "insufficient": -2.6,
+    "inflexible": -2.8,
+    "dominating": -2.8,
+    "dominant": -2.6,
+    "needs": -1.2,
+    "improvement": -1.2,
+    "improve": -1.2,
+    "improving": -1.0,
+    "blocking": -2.9,
+    "obstructive": -3.2,
+    "conflict": -2.9,
+    "frustrating": -3.0,
+    "frustration": -3.0,
+}
+
+PHRASE_PATTERNS: Dict[str, str] = {
+    r"\b(can\s+)?create\s+challenges\b": "create_challenges",
+    r"\b(could\s+)?create\s+challenges\b": "create_challenges",
+    r"\b(dominate|dominates|dominating)\s+discussions?\b": "dominate_discussions",
+    r"\brush\s+through\s+tasks?\b": "rush_through_tasks",
+    r"\bminor\s+misunderstandings?\b": "minor_misunderstandings",
+    r"\b(in)?consistenc(y|ies)\b": "inconsistencies",
+    r"\bstrong\s+opinions\b": "strong_opinions",
+    r"\b(in)?flexible\b": "inflexible",
+    r"\btime\s+management\s+could\s+improve\b": "time_mgmt_could_improve",
+    r"\bdelays?\s+in\s+completing\b": "delays_in_completing",
+    r"\baffect(s|ed)?\s+overall\s+progress\b": "affects_overall_progress",
+    r"\bneeds?\s+improvement\b": "needs_improvement",
+    r"\b(in\s+)need\s+of\s+improvement\b": "needs_improvement",
+    r"\broom\s+for\s+improvement\b": "room_for_improvement",
+    r"\bnot\s+always\s+take\s+a\s+leading\s+role\b": "not_leading_role",
+    r"\b(quiet|understated)\b": "quiet_understated",
+    r"\b(neutral|balanced|steady|dependable)\s+member\b": "neutral_member",
+}
+PHRASE_LEXICON: Dict[str, float] = {
+    "create_challenges": -3.1,
+    "dominate_discussions": -3.0,
+    "rush_through_tasks": -2.7,
+    "minor_misunderstandings": -1.8,
+    "inconsistencies": -2.4,
+    "strong_opinions": -1.4,
+    "inflexible": -3.0,
+    "time_mgmt_could_improve": -2.6,
+    "delays_in_completing": -2.8,
+    "affects_overall_progress": -2.6,
+    "needs_improvement": -2.9,
+    "room_for_improvement": -2.2,
+    "not_leading_role": -0.8,
+    "quiet_understated": -0.6,
+    "neutral_member": -0.5,
+}
+
+# Tuned tables, read-only and shared by every thread; nothing writes to them
+# after import. The reference analyzer (selfcheck/bench) gets its own copy.
+LEXICON: Mapping[str, float] = MappingProxyType({**analyzer.lexicon, **CUSTOM_WEAK_NEG, **PHRASE_LEXICON})
+EMOJIS: Mapping[str, str] = MappingProxyType(dict(analyzer.emojis))
+analyzer.lexicon = dict(LEXICON)
+
+
+# FastVader's tables are never written after __init__ and polarity_scores
+# keeps its scratch state in locals, so one instance is shared by every
+# thread, also on free-threaded builds (3.13t+) where the thread pool runs
+# truly in parallel.
+GIL_DISABLED: bool = not getattr(sys, "_is_gil_enabled", lambda: True)()
+vader = FastVader(LEXICON, EMOJIS)
+
+
+# A literal every match of the pattern must contain (lowercase). ASCII text
+# that lacks all of them cannot match, so the substitution is skipped.
+PHRASE_PREFILTER: Dict[str, Tuple[str, ...]] = {
+    "create_challenges": ("challenges",),
+    "dominate_discussions": ("discussion",),
+    "rush_through_tasks": ("rush",),
+    "minor_misunderstandings": ("misunderstanding",),
+    "inconsistencies": ("consistenc",),
+    "strong_opinions": ("opinions",),
+    "inflexible": ("flexible",),
+    "time_mgmt_could_improve": ("improve",),
+    "delays_in_completing": ("completing",),
+    "affects_overall_progress": ("progress",),
+    "needs_improvement": ("improvement",),
+    "room_for_improvement": ("improvement",),
+    "not_leading_role": ("leading",),
+    "quiet_understated": ("quiet", "understated"),
+    "neutral_member": ("member",),
+}
+PHRASE_RES: List[Tuple["re.Pattern[str]", str, Tuple[str, ...]]] = [
+    (re.compile(pat, re.IGNORECASE), token, PHRASE_PREFILTER[token])
+    for pat, token in PHRASE_PATTERNS.items()
+]
+
+
+# =============================================================================
+# Contrastive handling (tail dominates)
+# =============================================================================
+CONTRAST_RE = re.compile(r"\b(but|however|although|though|yet|while|despite)\b", re.IGNORECASE)
+NEG_TAIL_CUES_RE = re.compile(
+    r"\b("
+    r"challenge|challenges|concern|concerns|issue|issues|problem|problems|"
+    r"delay|delays|late|inconsistent|inconsistency|"
+    r"struggle|struggles|inflexible|conflict|"
+    r"create_challenges|dominate_discussions|rush_through_tasks|"
+    r"needs_improvement|room_for_improvement|delays_in_completing|"
+    r"affects_overall_progress|inconsistencies|not_leading_role|quiet_understated"
+    r")\b",
+    re.IGNORECASE,
+)
+
+
+def split_contrast(text: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Split on the first contrastive cue; return (head, cue, tail)."""
+    m = CONTRAST_RE.search(text)
+    if not m:
+        return text, None, None
+    head = text[: m.start()].strip()
+    cue = m.group(0)
+    tail = text[m.end() :].strip()
+    return head if head else "", cue, tail if tail else ""
+
+
+def count_negative_cues(t: str) -> int:
+    return len(list(NEG_TAIL_CUES_RE.finditer(t or "")))
+
+
+# =============================================================================
+# Toxic patterns
+# =============================================================================
+TOXIC_PATTERNS = [
+    r"\b(dumb(?:-|\s*)ass|dumbass|idiot|stupid|moron|retard(?:ed)?)\b",
+    r"\b(useless|garbage|trash|loser|worthless)\b",
+    r"\b(asshole|prick|dick|bitch|cunt|whore|slut)\b",
+    r"\b(fuck(?:ing)?|shit|bullshit|damn|bloody)\b",
+    r"\b(hate|hostile|toxic)\b",
+    r"\b(shut\s*up)\b",
+]
+TOXIC_RE = re.compile("|".join(TOXIC_PATTERNS), re.IGNORECASE)
+
+
+def is_toxic(text: str) -> bool:
+    return bool(TOXIC_RE.search(text or ""))
+
+
+# =============================================================================
+# Neutral-cue / strong-word heuristics (compiled once)
+# =============================================================================
+NEUTRAL_CUE_PATTERNS: List[str] = [
+    r"\bsteady\b",
+    r"\bconsisten(t|cy)\b",
+    r"\breliable\b",
+    r"\bdependable\b",
+    r"\bregular(ly)?\b",
+    r"\bon\s*time\b",
+    r"\bmeets?\s+expectations\b",
+    r"\badequate\b",
+    r"\bsatisfactory\b",
+    r"\bprofessional\b",
+    r"\bparticipat(es|e|ed)\b",
+    r"\bcomplete(s|d)?\s+(their\s+)?assigned\s*tasks?\b",
+    r"\bwithin\s+(the\s+)?(group|team)\b",
+]
+STRONG_POS_WORDS: List[str] = [
+    "excellent",
+    "outstanding",
+    "exceptional",
+    "amazing",
+    "brilliant",
+    "superb",
+    "fantastic",
+    "remarkable",
+    "innovative",
+    "transformative",
+    "inspirational",
+    "exemplary",
+    "great",
+    "phenomenal",
+    "goes above and beyond",
+    "proactive",
+    "initiative",
+    "leadership",
+]
+STRONG_NEG_WORDS: List[str] = [
+    "toxic",
+    "incompetent",
+    "useless",
+    "garbage",
+    "terrible",
+    "awful",
+    "unacceptable",
+    "obstructive",
+    "dishonest",
+    "hostile",
+    "aggressive",
+    "disrespectful",
+    "rude",
+    "lazy",
+    "unreliable",
+    "unresponsive",
+    "inflexible",
+]
+
+
+def word_alternation(words: List[str]) -> "re.Pattern[str]":
+    """One \\b-anchored alternation for the single words of a cue list."""
+    singles = [re.escape(w) for w in words if " " not in w]
+    return re.compile(r"\b(?:" + "|".join(singles) + r")\b")
+
+
+# Any-of over the original patterns is the same as one alternation.
+NEUTRAL_CUE_RE = re.compile("|".join(f"(?:{p})" for p in NEUTRAL_CUE_PATTERNS))
+STRONG_POS_RE = word_alternation(STRONG_POS_WORDS)
+STRONG_POS_PHRASES: Tuple[str, ...] = tuple(w for w in STRONG_POS_WORDS if " " in w)
+STRONG_NEG_RE = word_alternation(STRONG_NEG_WORDS)
+STRONG_NEG_PHRASES: Tuple[str, ...] = tuple(w for w in STRONG_NEG_WORDS if " " in w)
+
+
+def has_any_word(low: str, word_re: "re.Pattern[str]", phrases: Tuple[str, ...]) -> bool:
+    """True if a lowercased text contains any cue word (\\b-bounded) or phrase (substring)."""
+    return any(p in low for p in phrases) or bool(word_re.search(low))
+
+
+WORD_RE = re.compile(r"\b\w+\b")
@@ -0,0 +1,486 @@
+# spe_loadtest.py
+# Load generator for the SPE Sentiment API (stdlib only).
+# - "Classroom typing": virtual students type into view.php textareas; every
+#   keystroke burst is debounced 250 ms before a mode=live badge request and
+#   1 s before a mode=full pass (label/disparity for the hidden inputs), texts
+#   grow over time, and a select change fans out one full pass per field
+#   (view.php updateAll). Payloads match view.php: fields + activity.
+# - "Instructor push": periodic batches of N items with X-API-Token and
+#   fields compound/label/features, like analyze_push.php.
+# - Reports throughput, p50/p95/p99 latency and error rate per traffic kind,
+#   plus server CPU, and ramps the number of students until saturation.
+#
+# Usage:
+#   python spe_loadtest.py --spawn                       # start a local instance
+#   python spe_loadtest.py --url http://127.0.0.1:8000 --server-pid 1234
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple, Union
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+# =============================================================================
+# Traffic model
+# =============================================================================
+DEBOUNCE_S: float = 0.25  # view.php debounce(…, 250): live badge, select-change full pass
+SETTLE_S: float = 1.0  # view.php debounce(full, 1000) after typing
+KEY_GAP_S: Tuple[float, float] = (0.06, 0.20)  # gap between keystrokes in a burst
+BURST_KEYS: Tuple[int, int] = (3, 25)
+THINK_S: Tuple[float, float] = (0.5, 3.0)  # pause between bursts
+SELECT_CHANGE_P: float = 0.10  # chance a burst is followed by a score change
+MAX_FIELD_CHARS: int = 3000
+BROWSER_CONNS: int = 6  # connections a browser opens per origin
+
+FRAGMENTS: List[str] = [
+    "was an excellent teammate and communicated clearly. ",
+    "attended most of the meetings and completed their assigned tasks. ",
+    "was often late to meetings, but the work was good. ",
+    "needs improvement in time management. ",
+    "showed leadership and initiative on the report. ",
+    "tended to dominate discussions, however they listened later. ",
+    "was unresponsive for most of the week. ",
+    "delivered high quality work ahead of deadlines! ",
+    "participated in the group discussions within the team. ",
+    "there were some concerns about communication. ",
+]
+
+
+def grown_text(rng: random.Random, chars: int) -> str:
+    """A comment of roughly `chars` characters built from SPE-like fragments."""
+    out = ""
+    while len(out) < chars:
+        out += rng.choice(FRAGMENTS)
+    return out[:chars]
+
+
+# =============================================================================
+# Minimal keep-alive HTTP/1.1 client
+# =============================================================================
+class HttpConn:
+    """One persistent connection (a PHP curl handle); one request at a time."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def post_json(self, path: str, payload: dict, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        body = json.dumps(payload).encode("utf-8")
+        head = [
+            f"POST {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        raw = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+        for attempt in (0, 1):  # reconnect once if the server closed keep-alive
+            try:
+                if self.writer is None:
+                    await self._connect()
+                self.writer.write(raw)
+                await self.writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+        raise ConnectionError("unreachable")
+
+    async def _read_response(self) -> Tuple[int, bytes]:
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        length = 0
+        close = False
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length":
+                length = int(value.strip())
+            elif name == "connection" and value.strip().lower() == "close":
+                close = True
+        body = await self.reader.readexactly(length) if length else b""
+        if close:
+            await self.close()
+        return status, body
+
+
+class ConnPool:
+    """
+    A browser tab's connections to one origin: each request takes an idle
+    connection, a new one is opened while fewer than `size` exist, and
+    further requests wait for a free one (that wait counts as latency).
+    """
+
+    def __init__(self, host: str, port: int, size: int = BROWSER_CONNS) -> None:
+        self.host = host
+        self.port = port
+        self.conns: List[HttpConn] = []
+        self.idle: List[HttpConn] = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def post_json(self, path: str, payload: dict, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        async with self.slots:
+            if self.idle:
+                conn = self.idle.pop()
+            else:
+                conn = HttpConn(self.host, self.port)
+                self.conns.append(conn)
+            try:
+                return await conn.post_json(path, payload, headers)
+            finally:
+                self.idle.append(conn)
+
+    async def close(self) -> None:
+        for c in self.conns:
+            await c.close()
+
+
+# =============================================================================
+# Statistics
+# =============================================================================
+class Stats:
+    def __init__(self) -> None:
+        self.lat: Dict[str, List[float]] = {}
+        self.err: Dict[str, int] = {}
+
+    def add(self, kind: str, seconds: float, ok: bool) -> None:
+        self.lat.setdefault(kind, []).append(seconds)
+        if not ok:
+            self.err[kind] = self.err.get(kind, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        out = {}
+        for kind, lat in sorted(self.lat.items()):
+            lat = sorted(lat)
+            n = len(lat)
+            out[kind] = {
+                "requests": n,
+                "rps": round(n / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(_pct(lat, 50) * 1000, 1),
+                "p95_ms": round(_pct(lat, 95) * 1000, 1),
+                "p99_ms": round(_pct(lat, 99) * 1000, 1),
+                "error_rate": round(self.err.get(kind, 0) / n, 4) if n else 0.0,
+            }
+        return out
+
+
+def _pct(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+class CpuProbe:
+    """Process CPU seconds (user+sys, children included) via psutil or /proc."""
+
+    def __init__(self, pid: Optional[int]) -> None:
+        self.pid = pid
+        try:
+            import psutil  # type: ignore
+
+            self._proc = psutil.Process(pid) if pid else None
+        except Exception:
+            self._proc = None
+
+    def seconds(self) -> Optional[float]:
+        if not self.pid:
+            return None
+        if self._proc is not None:
+            try:
+                total = sum(self._proc.cpu_times()[:2])
+                for ch in self._proc.children(recursive=True):
+                    total += sum(ch.cpu_times()[:2])
+                return total
+            except Exception:
+                return None
+        try:
+            with open(f"/proc/{self.pid}/stat", "r") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+            ticks = sum(int(x) for x in fields[11:15])  # utime stime cutime cstime
+            return ticks / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return None
+
+
+# =============================================================================
+# Virtual users
+# =============================================================================
+async def _timed_post(
+    conn: Union[HttpConn, ConnPool], stats: Stats, kind: str, path: str, payload: dict, headers: Dict[str, str]
+) -> None:
+    t0 = time.perf_counter()
+    try:
+        status, body = await conn.post_json(path, payload, headers)
+        ok = status < 400
+        if ok and kind == "batch":
+            ok = bool(json.loads(body).get("ok"))
+    except Exception:
+        ok = False
+    stats.add(kind, time.perf_counter() - t0, ok)
+
+
+async def student(
+    host: str,
+    port: int,
+    path: str,
+    stats: Stats,
+    stop_at: float,
+    rng: random.Random,
+    think_scale: float,
+    activity: int,
+) -> None:
+    """One browser tab on view.php: a few textareas, debounced live/full calls, updateAll fan-out."""
+    n_fields = 2 + rng.randint(2, 4)  # self description + reflection + peer comments
+    texts = [grown_text(rng, rng.randint(0, 80)) for _ in range(n_fields)]
+    totals = [rng.randint(5, 25) for _ in range(n_fields)]
+    # Requests can overlap (a fan-out while a live call is in flight), so the
+    # tab shares a pool like a browser instead of pinning one socket per field.
+    pool = ConnPool(host, port)
+    pending: List[asyncio.Task] = []
+    settle: Dict[int, asyncio.TimerHandle] = {}  # per-textarea debounced full pass
+    loop = asyncio.get_running_loop()
+
+    def fire(i: int, kind: str) -> None:
+        live = kind == "live"
+        payload = {
+            "text": texts[i],
+            "mode": "live" if live else "full",
+            "fields": ["label", "word_count"] if live else ["label", "word_count", "disparity"],
+            "activity": activity,
+            "score_total": totals[i],
+        }
+        pending.append(asyncio.ensure_future(_timed_post(pool, stats, kind, path, payload, {})))
+
+    try:
+        while time.perf_counter() < stop_at:
+            i = rng.randrange(n_fields)
+            for _ in range(rng.randint(*BURST_KEYS)):
+                texts[i] += rng.choice(FRAGMENTS)[: rng.randint(1, 3)]
+                if i in settle:
+                    settle[i].cancel()
+                settle[i] = loop.call_later(SETTLE_S, fire, i, "full")
+                await asyncio.sleep(rng.uniform(*KEY_GAP_S) * think_scale)
+            if len(texts[i]) > MAX_FIELD_CHARS:
+                texts[i] = ""
+            await asyncio.sleep(DEBOUNCE_S)
+            fire(i, "live")
+            if rng.random() < SELECT_CHANGE_P:
+                totals = [max(5, min(25, t + rng.randint(-3, 3))) for t in totals]
+                await asyncio.sleep(DEBOUNCE_S)
+                for j in range(n_fields):
+                    fire(j, "full-fanout")
+            await asyncio.sleep(rng.uniform(*THINK_S) * think_scale)
+            pending = [t for t in pending if not t.done()]
+        for handle in settle.values():
+            handle.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        await pool.close()
+
+
+async def instructor(
+    host: str,
+    port: int,
+    path: str,
+    stats: Stats,
+    stop_at: float,
+    rng: random.Random,
+    batch_size: int,
+    interval: float,
+    token: str,
+    activity: int,
+) -> None:
+    """analyze_push.php: POST {items, fields, activity} every `interval` seconds."""
+    conn = HttpConn(host, port)
+    headers = {"X-API-Token": token} if token else {}
+    try:
+        while time.perf_counter() < stop_at:
+            items = [
+                {"id": str(k), "text": grown_text(rng, rng.randint(40, 900))} for k in range(batch_size)
+            ]
+            payload = {"items": items, "fields": ["compound", "label", "features"], "activity": activity}
+            await _timed_post(conn, stats, "batch", path, payload, headers)
+            await asyncio.sleep(interval)
+    finally:
+        await conn.close()
+
+
+# =============================================================================
+# Stages / saturation search
+# =============================================================================
+async def run_stage(args: argparse.Namespace, users: int, cpu: CpuProbe, seed: int) -> dict:
+    parts = urlsplit(args.url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    path = parts.path.rstrip("/")
+    if not path.endswith("/analyze"):
+        path += "/analyze"
+    stats = Stats()
+    rng = random.Random(seed)
+    stop_at = time.perf_counter() + args.duration
+    cpu0 = cpu.seconds()
+    t0 = time.perf_counter()
+
+    tasks = [
+        student(host, port, path, stats, stop_at, random.Random(rng.random()), args.think_scale, args.activity)
+        for _ in range(users)
+    ]
+    if args.batch_size > 0:
+        tasks.append(
+            instructor(
+                host, port, path, stats, stop_at, random.Random(rng.random()),
+                args.batch_size, args.batch_interval, args.token, args.activity,
+            )
+        )
+    await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - t0
+    cpu1 = cpu.seconds()
+    summary = stats.summary(elapsed)
+    total = sum(v["requests"] for v in summary.values())
+    errors = sum(round(v["error_rate"] * v["requests"]) for v in summary.values())
+    return {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "server_cpu_pct": (
+            round(100.0 * (cpu1 - cpu0) / elapsed, 1) if cpu0 is not None and cpu1 is not None else None
+        ),
+        "endpoints": summary,
+    }
+
+
+def saturated(stage: dict, prev: Optional[dict], args: argparse.Namespace) -> Optional[str]:
+    """Reason the stage is past saturation, or None."""
+    live = stage["endpoints"].get("live", {})
+    if live.get("p95_ms", 0.0) > args.slo_ms:
+        return f"live p95 {live['p95_ms']} ms > SLO {args.slo_ms} ms"
+    if stage["error_rate"] > args.max_error_rate:
+        return f"error rate {stage['error_rate']} > {args.max_error_rate}"
+    if prev and prev["rps"] > 0 and stage["rps"] < prev["rps"] * (1.0 + args.min_gain):
+        return f"throughput flat ({prev['rps']} -> {stage['rps']} rps)"
+    return None
+
+
+def print_stage(stage: dict) -> None:
+    cpu = stage["server_cpu_pct"]
+    print(
+        f"\nusers={stage['users']:<5} rps={stage['rps']:<8} errors={stage['error_rate']:<7}"
+        f" cpu={'n/a' if cpu is None else f'{cpu}%'}"
+    )
+    print(f"  {'kind':<12}{'req':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>8}")
+    for kind, v in stage["endpoints"].items():
+        print(
+            f"  {kind:<12}{v['requests']:>7}{v['rps']:>9}{v['p50_ms']:>9}{v['p95_ms']:>9}"
+            f"{v['p99_ms']:>9}{v['error_rate']:>8}"
+        )
+
+
+def spawn_server(port: int, token: str) -> subprocess.Popen:
+    """Start a local single-process instance from this directory and wait for /health."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SPE_API_TOKEN=token, PORT=str(port))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "sentiment_api:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=here, env=env,
+    )
+    import urllib.request
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("spawned server did not become ready")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="SPE sentiment API load test")
+    ap.add_argument("--url", default="http://127.0.0.1:8000", help="service base URL")
+    ap.add_argument("--spawn", action="store_true", help="start a local instance on --url's port")
+    ap.add_argument("--server-pid", type=int, default=None, help="PID to sample for server CPU")
+    ap.add_argument("--token", default=os.environ.get("SPE_API_TOKEN", ""))
+    ap.add_argument("--users", type=int, default=10, help="students in the first stage")
+    ap.add_argument("--max-users", type=int, default=640)
+    ap.add_argument("--step", type=float, default=2.0, help="user multiplier per stage")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds per stage")
+    ap.add_argument("--think-scale", type=float, default=1.0, help="<1 compresses typing/think time")
+    ap.add_argument("--batch-size", type=int, default=200, help="items per instructor push (0 = off)")
+    ap.add_argument("--batch-interval", type=float, default=5.0)
+    ap.add_argument("--activity", type=int, default=1, help="spe instance id sent as 'activity' (profile lookup)")
+    ap.add_argument("--slo-ms", type=float, default=500.0, help="live p95 latency budget")
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--min-gain", type=float, default=0.05, help="min throughput gain per stage")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", default=None, help="write the full report here")
+    args = ap.parse_args(argv)
+
+    proc = None
+    pid = args.server_pid
+    if args.spawn:
+        proc = spawn_server(urlsplit(args.url).port or 8000, args.token)
+        pid = proc.pid
+    cpu = CpuProbe(pid)
+
+    stages: List[dict] = []
+    saturation = None
+    try:
+        users = args.users
+        while users <= args.max_users:
+            stage = asyncio.run(run_stage(args, users, cpu, args.seed + len(stages)))
+            print_stage(stage)
+            reason = saturated(stage, stages[-1] if stages else None, args)
+            stages.append(stage)
+            if reason:
+                saturation = {"users": users, "reason": reason,
+                              "last_good_users": stages[-2]["users"] if len(stages) > 1 else None}
+                break
+            users = max(users + 1, int(users * args.step))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    if saturation:
+        print(f"\nSaturation at {saturation['users']} students: {saturation['reason']}"
+              f" (last good: {saturation['last_good_users']})")
+    else:
+        print(f"\nNo saturation up to {stages[-1]['users'] if stages else 0} students.")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"stages": stages, "saturation": saturation}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# spe_neardup.py
+# Near-duplicate clustering of batch texts (one-permutation MinHash + LSH).
+from __future__ import annotations
+
+from collections import Counter
+from typing import List, Optional, Tuple, Dict
+import zlib
+
+from spe_lexicon import WORD_RE
+
+# =============================================================================
+# Near-duplicate detection (MinHash + LSH)
+# =============================================================================
+# One-permutation MinHash: every word shingle is hashed once and lands in one
+# of bands*rows bins, keeping the minimum per bin; empty bins borrow from the
+# next non-empty bin. Items whose signatures agree on all rows of any band
+# share an LSH bucket, and each bucket member is only compared with the
+# bucket's first item, so the pass stays roughly linear in the batch size.
+_MASK32 = 0xFFFFFFFF
+
+
+def _shingle_hashes(text: str, k: int) -> List[int]:
+    words = [zlib.crc32(w.encode("utf-8")) for w in WORD_RE.findall(text.lower())]
+    if not words:
+        return []
+    if len(words) < k:
+        k = len(words)
+    out = []
+    for i in range(len(words) - k + 1):
+        h = 0
+        for w in words[i : i + k]:
+            h = ((h * 0x01000193) ^ w) & _MASK32
+        h = ((h ^ (h >> 16)) * 0x45D9F3B) & _MASK32  # final avalanche
+        out.append(h ^ (h >> 16))
+    return out
+
+
+def minhash_signature(text: str, slots: int, k: int = 3) -> Optional[List[int]]:
+    """One-permutation MinHash signature with `slots` bins (None for empty text)."""
+    hashes = _shingle_hashes(text, k)
+    if not hashes:
+        return None
+    sig = [-1] * slots
+    for h in hashes:
+        b = h % slots
+        v = h // slots
+        if sig[b] < 0 or v < sig[b]:
+            sig[b] = v
+    # Densify: fill empty bins from the next non-empty bin (circularly), offset
+    # by the distance so borrowed values stay distinct from real ones.
+    if -1 in sig:
+        nxt = next(i for i in range(slots - 1, -1, -1) if sig[i] >= 0)
+        for i in range(slots - 1, -1, -1):
+            if sig[i] >= 0:
+                nxt = i
+            else:
+                sig[i] = sig[nxt] + ((nxt - i) % slots) * (_MASK32 + 1)
+    return sig
+
+
+def _sig_similarity(a: List[int], b: List[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def near_duplicate_clusters(
+    texts: List[str],
+    threshold: float = 0.8,
+    shingle: int = 3,
+    bands: int = 16,
+    rows: int = 4,
+) -> List[Optional[Tuple[int, float]]]:
+    """
+    Return (cluster id, estimated similarity) per text, or None when a text
+    has no near-duplicate. Cluster ids are numbered 1.. in input order;
+    similarity is the best signature agreement with another cluster member.
+    """
+    slots = bands * rows
+    sigs = [minhash_signature(t, slots, shingle) for t in texts]
+    parent = list(range(len(texts)))
+    best = [0.0] * len(texts)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        lo, hi = band * rows, (band + 1) * rows
+        buckets: Dict[Tuple[int, ...], int] = {}
+        for i, sig in enumerate(sigs):
+            if sig is None:
+                continue
+            key = tuple(sig[lo:hi])
+            rep = buckets.setdefault(key, i)
+            if rep == i:
+                continue
+            sim = _sig_similarity(sig, sigs[rep])  # type: ignore[arg-type]
+            if sim >= threshold:
+                best[i] = max(best[i], sim)
+                best[rep] = max(best[rep], sim)
+                ri, rr = find(i), find(rep)
+                if ri != rr:
+                    parent[max(ri, rr)] = min(ri, rr)
+
+    roots = [find(i) for i in range(len(texts))]
+    sizes = Counter(roots)
+    ids: Dict[int, int] = {}
+    out: List[Optional[Tuple[int, float]]] = []
+    for i, root in enumerate(roots):
+        if sizes[root] < 2:
+            out.append(None)
+            continue
+        cid = ids.setdefault(root, len(ids) + 1)
+        out.append((cid, round(best[i], 4)))
+    return out
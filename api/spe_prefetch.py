@@ -0,0 +1,172 @@
+# spe_prefetch.py
+# Idle-time pre-analysis of autosaved drafts (POST /prefetch) for warm batches.
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from typing import List, Optional, Tuple, Dict
+import hashlib
+import os
+import sys
+import threading
+
+from spe_config import PREFETCH_ENTRIES, PREFETCH_PENDING
+from spe_core import budget_text, clip_input, text_features
+from spe_profiles import CompiledProfile, analyzer_profiles
+
+# =============================================================================
+# Draft prefetch (idle-time pre-analysis of autosaved drafts)
+# =============================================================================
+# draft.php forwards each autosave to POST /prefetch. Snapshots are coalesced
+# per (activity, student, field): a newer snapshot replaces the queued one, so
+# a student typing for an hour costs one analysis per idle gap, not one per
+# autosave. A single low-priority thread analyzes queued texts only while no
+# /analyze request is running, one text at a time, and keeps the
+# score-independent part of the result (feature vector + VADER scores) in an
+# LRU keyed by a digest of (profile, text). Form posts arrive with CRLF and
+# autosaves with LF, so the digest ignores line endings; VADER scores both
+# spellings the same and a hit takes the length feature from the batch text.
+# Batches look every item up there; a hit skips the whole VADER pipeline and
+# only reapplies LabelRules and the disparity check, so hit and miss results
+# are identical. Queue and store are per process, so `prefork --workers N`
+# turns prefetch off for N > 1 (a batch would find its drafts about 1/N of the time).
+WarmResult = Tuple[Dict[str, object], Dict[str, float]]
+
+
+class DraftPrefetch:
+    """Coalescing idle-time analysis queue plus a bounded digest-keyed result store."""
+
+    def __init__(self, entries: int = PREFETCH_ENTRIES, max_pending: int = PREFETCH_PENDING) -> None:
+        self.entries = entries
+        self.max_pending = max_pending
+        # (activity, student, field) -> (clipped text, activity)
+        self.pending: "OrderedDict[Tuple[Optional[int], str, str], Tuple[str, Optional[int]]]" = OrderedDict()
+        self.results: "OrderedDict[bytes, WarmResult]" = OrderedDict()
+        self.busy = 0
+        self.cond = threading.Condition()
+        self.stats = Counter()
+        self._owner = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.entries > 0
+
+    @staticmethod
+    def digest(tx: str, profile: CompiledProfile) -> bytes:
+        if "\r" in tx:
+            tx = tx.replace("\r\n", "\n").replace("\r", "\n")
+        return hashlib.blake2b(f"{profile.pid}\0{tx}".encode("utf-8"), digest_size=16).digest()
+
+    # -- foreground -------------------------------------------------------------
+    def begin(self) -> None:
+        with self.cond:
+            self.busy += 1
+
+    def end(self) -> None:
+        with self.cond:
+            self.busy -= 1
+            if not self.busy:
+                self.cond.notify_all()
+
+    def lookup(self, text: str, profile: CompiledProfile) -> Optional[WarmResult]:
+        """Warm (features, scores) for a text as analyze_text_fields would see it, else None."""
+        tx, _ = clip_input(text)
+        if not tx:
+            return None
+        key = self.digest(tx, profile)
+        with self.cond:
+            hit = self.results.get(key)
+            # Other line endings change the length, and with it the budget_text
+            # sample of an over-budget text; only the length can be patched.
+            if hit is None or (hit[0]["length"] != len(tx) and budget_text(tx)[1]):
+                self.stats["misses"] += 1
+                return None
+            self.results.move_to_end(key)
+            self.stats["hits"] += 1
+        return {**hit[0], "length": len(tx)}, hit[1]
+
+    # -- background -------------------------------------------------------------
+    def submit(self, activity: Optional[int], student: str, fields: List[Tuple[str, str]]) -> int:
+        """Queue draft texts (replacing older snapshots of the same field); return how many are new work."""
+        if self._owner != os.getpid():
+            self._start()
+        profile = analyzer_profiles.for_activity(activity)
+        queued = 0
+        with self.cond:
+            for field, text in fields:
+                tx, _ = clip_input(text)
+                if not tx:
+                    continue
+                if self.digest(tx, profile) in self.results:
+                    self.stats["already_warm"] += 1
+                    continue
+                key = (activity, student, field)
+                if key in self.pending:
+                    self.stats["coalesced"] += 1
+                    del self.pending[key]
+                elif len(self.pending) >= self.max_pending:
+                    self.pending.popitem(last=False)
+                    self.stats["dropped"] += 1
+                self.pending[key] = (tx, activity)
+                queued += 1
+            self.stats["submitted"] += queued
+            self.cond.notify_all()
+        return queued
+
+    def _start(self) -> None:
+        with self.cond:
+            if self._owner == os.getpid():
+                return
+            # Forked prefork workers inherit the queue but not the thread.
+            self.pending.clear()
+            threading.Thread(target=self._run, name="spe-prefetch", daemon=True).start()
+            self._owner = os.getpid()
+
+    def _run(self) -> None:
+        try:
+            # Linux applies nice values per thread; elsewhere the idle gate suffices.
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)  # type: ignore[attr-defined]
+        except (AttributeError, OSError):
+            pass
+        while True:
+            with self.cond:
+                while not self.pending or self.busy:
+                    self.cond.wait()
+                _, (tx, activity) = self.pending.popitem(last=False)
+            profile = analyzer_profiles.for_activity(activity)
+            try:
+                body, _ = budget_text(tx, lexicon=profile.vader.lexicon)
+                warm = text_features(tx, body, None, "full", profile)
+            except Exception as exc:
+                self.stats["errors"] += 1
+                print(f"[prefetch] {exc}", file=sys.stderr)
+                continue
+            with self.cond:
+                self.results[self.digest(tx, profile)] = warm
+                while len(self.results) > self.entries:
+                    self.results.popitem(last=False)
+                    self.stats["evicted"] += 1
+                self.stats["analyzed"] += 1
+
+    def report(self) -> Dict[str, object]:
+        with self.cond:
+            stats = dict(self.stats)
+            pending, stored = len(self.pending), len(self.results)
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        return {
+            "enabled": self.enabled,
+            "pending": pending,
+            "stored": stored,
+            "capacity": self.entries,
+            **{k: stats.get(k, 0) for k in ("submitted", "coalesced", "already_warm", "dropped", "analyzed",
+                                             "evicted", "errors", "hits", "misses")},
+            "hit_rate": round(stats.get("hits", 0) / lookups, 4) if lookups else None,
+        }
+
+    def summary(self, hits: int, lookups: int) -> Optional[str]:
+        """Per-batch X-SPE-Prefetch header value (None when prefetch is disabled)."""
+        if not self.enabled:
+            return None
+        return f"hits={hits}; lookups={lookups}"
+
+
+draft_prefetch = DraftPrefetch()
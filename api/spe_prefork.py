@@ -0,0 +1,313 @@
+# spe_prefork.py
+# Running-instance discovery and the prefork supervisor (Linux/Unix).
+from __future__ import annotations
+
+from typing import Optional, Tuple, Dict
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import urllib.request
+
+import uvicorn
+
+from spe_bench import GOLDEN_CORPUS
+from spe_capture import traffic_capture
+from spe_config import PID_FILE, READY_FILE
+from spe_core import analyze_text_full
+
+# =============================================================================
+# Instance discovery / prefork supervisor
+# =============================================================================
+def probe_health(host: str, port: int, timeout: float = 1.0) -> Optional[Dict[str, object]]:
+    """GET /health on host:port; return its JSON if this service answers."""
+    probe_host = "127.0.0.1" if host in ("0.0.0.0", "") else host
+    try:
+        with urllib.request.urlopen(f"http://{probe_host}:{port}/health", timeout=timeout) as r:
+            data = json.loads(r.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) and data.get("ok") else None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+_ANY_HOST = ("0.0.0.0", "", "::")
+
+
+def _serves(bound: str, host: str) -> bool:
+    """True if a listener bound to `bound` accepts connections meant for `host`."""
+    return bound == host or bound in _ANY_HOST
+
+
+def find_running_instance(host: str, port: int) -> Optional[Dict[str, object]]:
+    """
+    Return details of an instance already serving host:port, using the ready
+    file when it is current and describes that address, and falling back to a
+    plain /health probe.
+    """
+    try:
+        with open(READY_FILE, "r", encoding="utf-8") as fh:
+            info = json.load(fh)
+        if (
+            int(info["port"]) == port
+            and _serves(str(info["host"]), host)
+            and _pid_alive(int(info["pid"]))
+            and probe_health(info["host"], int(info["port"]))
+        ):
+            return info
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    health = probe_health(host, port)
+    if health:
+        return {"pid": None, "host": host, "port": port, "version": health.get("version")}
+    return None
+
+
+def _write_atomic(path: str, data: str) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="ascii") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _remove_quiet(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def warm_up() -> None:
+    """Run every analysis path once so the first real request pays no first-call costs."""
+    for t in GOLDEN_CORPUS:
+        analyze_text_full(t, 20, None, None)
+        analyze_text_full(t, 8, None, None, None, "live")
+
+
+class PreforkSupervisor:
+    """
+    Fork N uvicorn workers serving `app` that accept on one inherited listening socket.
+
+    Workers warm up before they start accepting, so the kernel only hands
+    connections to warm workers. SIGHUP replaces workers one at a time (the
+    replacement must report ready before the old worker is asked to drain),
+    dead workers are respawned, SIGTERM/SIGINT drain everything and exit.
+    The ready file lists workers that reported ready and only exists while
+    there is one. A worker that dies within min_uptime counts as a startup
+    failure: respawns back off exponentially, and after max_failures in a
+    row the supervisor gives up (exit 1).
+    """
+
+    def __init__(
+        self,
+        app,
+        host: str,
+        port: int,
+        workers: int,
+        graceful_timeout: float = 30.0,
+        max_failures: int = 5,
+        backoff: float = 1.0,
+        min_uptime: float = 10.0,
+    ) -> None:
+        self.app = app
+        self.host = host
+        self.port = port
+        self.n_workers = max(1, workers)
+        self.graceful_timeout = graceful_timeout
+        self.max_failures = max(1, max_failures)
+        self.backoff = backoff
+        self.min_uptime = min_uptime
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.ready: set = set()  # pids that reported ready
+        self.failures = 0  # consecutive startup failures
+        self.retiring: set = set()
+        self.sock: Optional[socket.socket] = None
+        self._restart = False
+        self._stop = False
+
+    # -- workers ------------------------------------------------------------------
+    def _spawn(self) -> Tuple[int, int]:
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child
+            os.close(rfd)
+            code = 0
+            try:
+                self._worker(wfd)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(wfd)
+        self.workers[pid] = time.time()
+        return pid, rfd
+
+    def _worker(self, ready_fd: int) -> None:
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        warm_up()
+        config = uvicorn.Config(
+            self.app,
+            log_level="warning",
+            timeout_graceful_shutdown=int(self.graceful_timeout),
+        )
+        server = uvicorn.Server(config)
+
+        def report_ready() -> None:
+            while not server.started and not server.should_exit:
+                time.sleep(0.01)
+            os.write(ready_fd, b"1" if server.started else b"0")
+            os.close(ready_fd)
+
+        threading.Thread(target=report_ready, daemon=True).start()
+        server.run(sockets=[self.sock])
+        if traffic_capture is not None:
+            traffic_capture.close()  # os._exit skips atexit
+
+    def _await_ready(self, pid: int, rfd: int, timeout: float = 60.0) -> bool:
+        try:
+            r, _, _ = select.select([rfd], [], [], timeout)
+            ok = bool(r) and os.read(rfd, 1) == b"1"
+        finally:
+            os.close(rfd)
+        if ok:
+            self.ready.add(pid)
+        return ok
+
+    def _stop_worker(self, pid: int) -> None:
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.time() + self.graceful_timeout + 5
+        while time.time() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.05)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+        self.ready.discard(pid)
+        self.retiring.discard(pid)
+
+    def respawn_delay(self) -> float:
+        """Seconds to wait before the next respawn: 0, then backoff * 2^(n-1), capped at 60 s."""
+        if not self.failures:
+            return 0.0
+        return min(60.0, self.backoff * 2 ** (self.failures - 1))
+
+    def _on_exit(self, pid: int) -> bool:
+        """Respawn a worker that died; False once startup failures hit max_failures."""
+        started = self.workers.pop(pid)
+        self.ready.discard(pid)
+        self._write_state()
+        if time.time() - started < self.min_uptime:
+            self.failures += 1
+        else:
+            self.failures = 0
+        if self.failures >= self.max_failures:
+            print(f"[prefork] {self.failures} workers in a row died on startup; giving up", file=sys.stderr)
+            return False
+        delay = self.respawn_delay()
+        print(f"[prefork] worker {pid} exited; respawning in {delay:g}s", file=sys.stderr)
+        deadline = time.time() + delay
+        while not self._stop and time.time() < deadline:
+            time.sleep(min(0.2, max(0.0, deadline - time.time())))
+        if not self._stop:
+            self._await_ready(*self._spawn())
+            self._write_state()
+        return True
+
+    def rolling_restart(self) -> None:
+        for old in list(self.workers):
+            pid, rfd = self._spawn()
+            if self._await_ready(pid, rfd):
+                self._stop_worker(old)
+            else:
+                print(f"[prefork] replacement {pid} failed to start; keeping {old}", file=sys.stderr)
+                self._stop_worker(pid)
+        self._write_state()
+
+    # -- state files ----------------------------------------------------------------
+    def _write_state(self) -> None:
+        _write_atomic(PID_FILE, str(os.getpid()))
+        if not self.ready:
+            _remove_quiet(READY_FILE)  # nothing is serving: callers must not see us as up
+            return
+        _write_atomic(
+            READY_FILE,
+            json.dumps(
+                {
+                    "pid": os.getpid(),
+                    "host": self.host,
+                    "port": self.port,
+                    "workers": sorted(self.ready),
+                    "version": self.app.version,
+                    "ready_at": time.time(),
+                }
+            ),
+        )
+
+    # -- main loop ------------------------------------------------------------------
+    def _on_signal(self, signum, _frame) -> None:
+        if signum == signal.SIGHUP:
+            self._restart = True
+        else:
+            self._stop = True
+
+    def run(self) -> int:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._on_signal)
+
+        code = 0
+        try:
+            started = [self._spawn() for _ in range(self.n_workers)]
+            ready = sum(self._await_ready(pid, rfd) for pid, rfd in started)
+            if not ready:
+                print(f"[prefork] no worker became ready on http://{self.host}:{self.port}/", file=sys.stderr)
+                return 1
+            self._write_state()
+            print(f"[prefork] {ready}/{self.n_workers} workers ready on http://{self.host}:{self.port}/")
+
+            while not self._stop:
+                if self._restart:
+                    self._restart = False
+                    self.rolling_restart()
+                try:
+                    pid, _ = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    pid = 0
+                if pid and pid in self.workers and pid not in self.retiring:
+                    if not self._on_exit(pid):
+                        code = 1
+                        break
+                time.sleep(0.2)
+        finally:
+            for pid in list(self.workers):
+                self._stop_worker(pid)
+            self.sock.close()
+            _remove_quiet(READY_FILE)
+            _remove_quiet(PID_FILE)
+        return code
@@ -0,0 +1,224 @@
+# spe_profiles.py
+# Per-activity analyzer profiles (SPE_PROFILES) and their compiled-profile LRU.
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from time import perf_counter
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple, Dict
+import json
+import re
+import sys
+import threading
+
+from spe_config import ANALYZER_CACHE_SIZE, ANALYZER_PROFILES_FILE
+from spe_lexicon import (
+    EMOJIS,
+    LEXICON,
+    NEUTRAL_CUE_PATTERNS,
+    NEUTRAL_CUE_RE,
+    PHRASE_RES,
+    STRONG_NEG_PHRASES,
+    STRONG_NEG_RE,
+    STRONG_NEG_WORDS,
+    STRONG_POS_PHRASES,
+    STRONG_POS_RE,
+    STRONG_POS_WORDS,
+    WORD_RE,
+    vader,
+    word_alternation,
+)
+from spe_schemas import AnalyzerProfile, DEFAULT_RULES, LabelRules
+from spe_vader import FastVader
+
+# =============================================================================
+# Analyzer profiles (per-activity rules and lexicon overrides)
+# =============================================================================
+# A profile changes what the pipeline scores with (lexicon entries, extra
+# phrases collapsed to tokens, extra neutral/strong cues) and how features
+# become labels (LabelRules). Compiling one copies the ~7.5k-entry lexicon and
+# builds its regexes, so compiled profiles live in a bounded LRU instead of
+# being rebuilt per request; the built-in settings are DEFAULT_PROFILE and
+# never enter the cache. User-supplied words are re.escape'd and joined with
+# \s+, so profile regexes keep the regex_audit() guarantees.
+class CompiledProfile:
+    """Analyzer state for one profile: rules, VADER tables, phrase and cue regexes."""
+
+    def __init__(
+        self,
+        pid: str,
+        rules: LabelRules,
+        vader: FastVader,
+        phrase_res: List[Tuple["re.Pattern[str]", str, Tuple[str, ...]]],
+        neutral_cue_re: "re.Pattern[str]",
+        strong_pos: Tuple["re.Pattern[str]", Tuple[str, ...]],
+        strong_neg: Tuple["re.Pattern[str]", Tuple[str, ...]],
+        approx_bytes: int = 0,
+        compile_ms: float = 0.0,
+    ) -> None:
+        self.pid = pid
+        self.rules = rules
+        self.vader = vader
+        self.phrase_res = phrase_res
+        self.neutral_cue_re = neutral_cue_re
+        self.strong_pos_re, self.strong_pos_phrases = strong_pos
+        self.strong_neg_re, self.strong_neg_phrases = strong_neg
+        self.approx_bytes = approx_bytes
+        self.compile_ms = compile_ms
+        self.hits = 0
+
+
+DEFAULT_PROFILE = CompiledProfile(
+    "default",
+    DEFAULT_RULES,
+    vader,
+    PHRASE_RES,
+    NEUTRAL_CUE_RE,
+    (STRONG_POS_RE, STRONG_POS_PHRASES),
+    (STRONG_NEG_RE, STRONG_NEG_PHRASES),
+)
+
+
+def _cue_words(text: str) -> List[str]:
+    return WORD_RE.findall(text.lower())
+
+
+def _words_pattern(words: List[str]) -> str:
+    return r"\b" + r"\s+".join(re.escape(w) for w in words) + r"\b"
+
+
+def _profile_tables(spec: AnalyzerProfile) -> Tuple[Dict[str, float], List[Tuple[str, str, str]], List[str]]:
+    """Validate overrides; return (lexicon entries, (pattern, token, needle) per phrase, cue patterns)."""
+    entries: Dict[str, float] = {}
+    for word, valence in spec.lexicon.items():
+        w = word.strip().lower()
+        if not w or len(w.split()) != 1:
+            raise ValueError(f"lexicon keys are single words (use 'phrases'): {word!r}")
+        if not -4.0 <= valence <= 4.0:
+            raise ValueError(f"lexicon valence must be in -4..4: {word!r}")
+        entries[w] = float(valence)
+    phrases: List[Tuple[str, str, str]] = []
+    for phrase, valence in spec.phrases.items():
+        words = _cue_words(phrase)
+        if len(words) < 2:
+            raise ValueError(f"phrases need two or more words (use 'lexicon'): {phrase!r}")
+        if not -4.0 <= valence <= 4.0:
+            raise ValueError(f"phrase valence must be in -4..4: {phrase!r}")
+        token = "_".join(words)
+        entries[token] = float(valence)
+        phrases.append((_words_pattern(words), token, max(words, key=len)))
+    cues: List[str] = []
+    for cue in spec.neutral_cues:
+        words = _cue_words(cue)
+        if not words:
+            raise ValueError(f"empty neutral cue: {cue!r}")
+        cues.append(_words_pattern(words))
+    for cue in (*spec.strong_pos, *spec.strong_neg):
+        if not _cue_words(cue):
+            raise ValueError(f"empty strong cue: {cue!r}")
+    return entries, phrases, cues
+
+
+def compile_profile(pid: str, spec: AnalyzerProfile) -> CompiledProfile:
+    """Build the lexicon copy, VADER core and regexes of one profile."""
+    t0 = perf_counter()
+    entries, phrases, cues = _profile_tables(spec)
+    lexicon = {**LEXICON, **entries}
+    core = FastVader(MappingProxyType(lexicon), EMOJIS)
+    phrase_res = list(PHRASE_RES) + [
+        (re.compile(pat, re.IGNORECASE), token, (needle,)) for pat, token, needle in phrases
+    ]
+    neutral_re = re.compile("|".join(f"(?:{p})" for p in [*NEUTRAL_CUE_PATTERNS, *cues]))
+    pos_words = STRONG_POS_WORDS + [" ".join(_cue_words(w)) for w in spec.strong_pos]
+    neg_words = STRONG_NEG_WORDS + [" ".join(_cue_words(w)) for w in spec.strong_neg]
+    # The lexicon copy dominates; its keys/values are shared with LEXICON
+    # except for the overrides.
+    size = sys.getsizeof(lexicon) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in entries.items())
+    size += sum(sys.getsizeof(p) for p, _, _ in phrases) + sum(sys.getsizeof(c) for c in cues)
+    return CompiledProfile(
+        pid,
+        LabelRules(**spec.model_dump(include=set(LabelRules.model_fields))),
+        core,
+        phrase_res,
+        neutral_re,
+        (word_alternation(pos_words), tuple(w for w in pos_words if " " in w)),
+        (word_alternation(neg_words), tuple(w for w in neg_words if " " in w)),
+        size,
+        (perf_counter() - t0) * 1000.0,
+    )
+
+
+def load_profiles(path: str) -> Dict[str, AnalyzerProfile]:
+    """Read and validate an SPE_PROFILES file ({"<id>": AnalyzerProfile, ...})."""
+    with open(path, "r", encoding="utf-8") as fh:
+        raw = json.load(fh)
+    specs = {str(pid): AnalyzerProfile(**spec) for pid, spec in raw.items()}
+    for pid, spec in specs.items():
+        try:
+            _profile_tables(spec)
+        except ValueError as exc:
+            raise ValueError(f"profile {pid!r}: {exc}") from None
+    return specs
+
+
+class ProfileCache:
+    """Bounded LRU of compiled profiles with hit/miss/eviction counters."""
+
+    def __init__(self, specs: Mapping[str, AnalyzerProfile], capacity: int = ANALYZER_CACHE_SIZE) -> None:
+        self.specs: Dict[str, AnalyzerProfile] = dict(specs)
+        self.capacity = max(1, capacity)
+        self.by_activity: Dict[int, str] = {}
+        for pid, spec in self.specs.items():
+            for speid in spec.activities:
+                self.by_activity.setdefault(int(speid), pid)
+        self._lru: "OrderedDict[str, CompiledProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def get(self, pid: Optional[str]) -> CompiledProfile:
+        """Compiled profile by id (None: built-in settings); KeyError for unknown ids."""
+        if pid is None:
+            return DEFAULT_PROFILE
+        with self._lock:
+            cp = self._lru.get(pid)
+            if cp is not None:
+                self._lru.move_to_end(pid)
+                self.stats["hits"] += 1
+                cp.hits += 1
+                return cp
+            spec = self.specs[pid]
+            self.stats["misses"] += 1
+            cp = compile_profile(pid, spec)
+            self._lru[pid] = cp
+            while len(self._lru) > self.capacity:
+                self._lru.popitem(last=False)
+                self.stats["evictions"] += 1
+            return cp
+
+    def for_activity(self, speid: Optional[int]) -> CompiledProfile:
+        """The profile listing this spe id in "activities", else the built-in settings."""
+        return self.get(self.by_activity.get(speid)) if speid is not None else DEFAULT_PROFILE
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            entries = list(self._lru.values())
+            stats = dict(self.stats)
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        return {
+            "defined": sorted(self.specs),
+            "capacity": self.capacity,
+            "cached": len(entries),
+            "hits": stats.get("hits", 0),
+            "misses": stats.get("misses", 0),
+            "evictions": stats.get("evictions", 0),
+            "hit_rate": round(stats.get("hits", 0) / lookups, 4) if lookups else None,
+            # Lexicon copies and regexes; every thread shares each compiled profile.
+            "approx_bytes": sum(cp.approx_bytes for cp in entries),
+            "profiles": [  # least recently used first
+                {"id": cp.pid, "hits": cp.hits, "approx_bytes": cp.approx_bytes, "compile_ms": round(cp.compile_ms, 2)}
+                for cp in entries
+            ],
+        }
+
+
+analyzer_profiles = ProfileCache(load_profiles(ANALYZER_PROFILES_FILE) if ANALYZER_PROFILES_FILE else {})
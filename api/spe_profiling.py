@@ -0,0 +1,92 @@
+# spe_profiling.py
+# Per-request stage timings (Server-Timing) and the sampling stack profiler.
+from __future__ import annotations
+
+from collections import Counter
+from time import perf_counter
+from typing import List, Optional, Tuple, Dict
+import os
+import random
+import sys
+import threading
+import time
+
+from spe_config import PROFILE_INTERVAL_MS, PROFILE_SAMPLE
+
+# =============================================================================
+# Profiling (stage timings + sampled collapsed stacks)
+# =============================================================================
+PROFILE_STAGES: Tuple[str, ...] = ("preprocess", "vader", "contrast", "sentences", "heuristics", "dedup")
+
+
+def lap(timings: Dict[str, float], stage: str, t0: float) -> float:
+    """Add the time since t0 to timings[stage] (seconds); return the new mark."""
+    t1 = perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + (t1 - t0)
+    return t1
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """Format stage timings (seconds) as a Server-Timing header value in ms."""
+    parts = [f"{k};dur={timings[k] * 1000.0:.3f}" for k in PROFILE_STAGES if k in timings]
+    parts.append(f"total;dur={total * 1000.0:.3f}")
+    return ", ".join(parts)
+
+
+class StackSampler:
+    """
+    Low-overhead sampling profiler for one thread.
+
+    A daemon thread reads the target thread's frame every `interval` seconds
+    and counts collapsed stacks ("file:func;file:func ..."), the input format
+    of flamegraph.pl / speedscope. Nothing is hooked into the interpreter, so
+    the profiled request runs at full speed between samples.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000.0) -> None:
+        self.interval = max(0.0002, interval)
+        self.stacks: Counter = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="spe-profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def __enter__(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, directory: str, tag: str) -> Optional[str]:
+        """Write collapsed stacks to <directory>/<tag>-<time>-<pid>.folded."""
+        if not self.stacks:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        name = f"{tag}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}.folded"
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, n in self.stacks.most_common():
+                fh.write(f"{stack} {n}\n")
+        return path
+
+
+def should_sample_profile() -> bool:
+    return PROFILE_SAMPLE > 0.0 and random.random() < PROFILE_SAMPLE
+
+
+def timings_requested(header: Optional[str]) -> bool:
+    """X-SPE-Profile as a boolean: 1/true/yes/on enable timings, anything else does not."""
+    return (header or "").strip().lower() in ("1", "true", "yes", "on")
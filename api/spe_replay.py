@@ -0,0 +1,295 @@
+# spe_replay.py
+# Replay traffic captured by the API (SPE_CAPTURE_FILE) against an instance.
+# - Re-issues the captured requests in timestamp order at the captured pace
+#   (--speed 1), N times faster (--speed N) or back to back (--speed 0; with
+#   --connections 1 one at a time, otherwise that many in flight).
+# - Checks each response against the captured digest. Only captures taken
+#   with SPE_CAPTURE_TEXT=raw can be verified. The default (hash) replaces
+#   text by SPE-like filler of the same length and redacted text is sent
+#   as-is, so those records only measure latency; replay refuses them unless
+#   --latency-only is given.
+# - Reports p50/p95/p99 per endpoint kind next to the captured server-side
+#   latency. Replay latency is measured at the client, so on loopback it
+#   reads slightly (~0.1-0.5 ms) above a server-side figure.
+#
+# Usage:
+#   python spe_replay.py capture/traffic-*.jsonl --spawn --speed 0 --connections 1
+#   python spe_replay.py traffic.jsonl traffic.jsonl.1 --url http://127.0.0.1:8000 --speed 4 --max-regression 0.2
+#   python spe_replay.py hashed-*.jsonl --spawn --latency-only --max-regression 0.2
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+from spe_loadtest import HttpConn, _pct, grown_text, spawn_server
+
+
+# =============================================================================
+# Capture files
+# =============================================================================
+def load_capture(patterns: List[str], limit: Optional[int] = None) -> List[dict]:
+    """Records of every matching file (rotated ones included), oldest first."""
+    records: List[dict] = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    rec = json.loads(line)
+                    if rec.get("method") == "POST" and isinstance(rec.get("payload"), dict):
+                        records.append(rec)
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def _fill_text(value: object) -> object:
+    """Hashed text -> deterministic SPE-like filler of the captured length."""
+    if isinstance(value, dict) and "sha256" in value:
+        rng = random.Random(value["sha256"])
+        return grown_text(rng, int(value.get("chars", 0)))
+    return value
+
+
+def replay_payload(rec: dict) -> Tuple[dict, bool]:
+    """(payload to send, whether the captured response can be checked)."""
+    payload = rec["payload"]
+    if rec.get("text_mode") == "raw":
+        return payload, True
+    if rec.get("text_mode") == "hash":
+        payload = dict(payload)
+        if "text" in payload:
+            payload["text"] = _fill_text(payload["text"])
+        if isinstance(payload.get("items"), list):
+            payload["items"] = [
+                {**it, "text": _fill_text(it.get("text"))} if isinstance(it, dict) else it
+                for it in payload["items"]
+            ]
+    return payload, False
+
+
+def unverifiable(records: List[dict]) -> Dict[str, int]:
+    """Count of records per text mode whose responses cannot be checked (all but raw)."""
+    out: Dict[str, int] = {}
+    for rec in records:
+        mode = str(rec.get("text_mode"))
+        if mode != "raw":
+            out[mode] = out.get(mode, 0) + 1
+    return out
+
+
+def request_kind(rec: dict) -> str:
+    """Endpoint plus traffic shape: "/analyze live", "/analyze batch", ..."""
+    payload = rec["payload"]
+    if "items" in payload:
+        shape = "batch"
+    else:
+        shape = str(payload.get("mode") or "full")
+    return f"{rec['endpoint']} {shape}"
+
+
+# =============================================================================
+# Replay
+# =============================================================================
+async def replay(
+    records: List[dict], host: str, port: int, speed: float, connections: int, token: str
+) -> Tuple[List[dict], float]:
+    """Issue every record; return one result per record and the wall time."""
+    pool: "asyncio.Queue[HttpConn]" = asyncio.Queue()
+    conns = [HttpConn(host, port) for _ in range(max(1, connections))]
+    for c in conns:
+        pool.put_nowait(c)
+    results: List[dict] = [{} for _ in records]
+    t_start = time.perf_counter()
+    ts0 = records[0]["ts"] if records else 0.0
+
+    async def one(i: int, rec: dict, due: float) -> None:
+        payload, verifiable = replay_payload(rec)
+        headers = {"X-API-Token": token} if rec.get("auth") and token else {}
+        conn = await pool.get()
+        t0 = time.perf_counter()
+        try:
+            status, body = await conn.post_json(rec["endpoint"], payload, headers)
+        except Exception:
+            status, body = 0, b""
+        finally:
+            pool.put_nowait(conn)
+        results[i] = {
+            "kind": request_kind(rec),
+            "latency": time.perf_counter() - t0,
+            "lag": max(0.0, t0 - due),
+            "status": status,
+            "verdict": _verdict(rec, verifiable, status, body),
+        }
+
+    tasks: List[asyncio.Task] = []
+    try:
+        for i, rec in enumerate(records):
+            due = t_start + ((rec["ts"] - ts0) / speed if speed > 0 else 0.0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one(i, rec, due)))
+        await asyncio.gather(*tasks)
+    finally:
+        for c in conns:
+            await c.close()
+    return results, time.perf_counter() - t_start
+
+
+def _verdict(rec: dict, verifiable: bool, status: int, body: bytes) -> str:
+    if status == 0:
+        return "error"
+    if status != rec.get("status"):
+        return "status"
+    if not verifiable:
+        return "unverified"
+    if hashlib.sha256(body).hexdigest() == rec.get("response_sha256"):
+        return "match"
+    try:
+        # A batch cut short by the CPU budget is load-dependent, not a regression.
+        if json.loads(body).get("deferred"):
+            return "deferred"
+    except (ValueError, AttributeError):
+        pass
+    return "mismatch"
+
+
+# =============================================================================
+# Report
+# =============================================================================
+def build_report(records: List[dict], results: List[dict], seconds: float, speed: float) -> dict:
+    by_kind: Dict[str, Tuple[List[float], List[float]]] = {}
+    verdicts: Dict[str, int] = {}
+    mismatches: List[dict] = []
+    for rec, res in zip(records, results):
+        base, new = by_kind.setdefault(res["kind"], ([], []))
+        if rec.get("latency_ms") is not None:
+            base.append(float(rec["latency_ms"]) / 1000.0)
+        new.append(res["latency"])
+        verdicts[res["verdict"]] = verdicts.get(res["verdict"], 0) + 1
+        if res["verdict"] in ("mismatch", "status") and len(mismatches) < 20:
+            mismatches.append({"ts": rec["ts"], "kind": res["kind"], "verdict": res["verdict"],
+                               "status": res["status"], "captured_status": rec.get("status")})
+    endpoints = {}
+    for kind, (base, new) in sorted(by_kind.items()):
+        base, new = sorted(base), sorted(new)
+        row = {"requests": len(new)}
+        for p in (50, 95, 99):
+            row[f"captured_p{p}_ms"] = round(_pct(base, p) * 1000, 2) if base else None
+            row[f"replay_p{p}_ms"] = round(_pct(new, p) * 1000, 2)
+        b95 = row["captured_p95_ms"]
+        row["p95_change"] = round(row["replay_p95_ms"] / b95 - 1.0, 4) if b95 else None
+        endpoints[kind] = row
+    lags = sorted(r["lag"] for r in results)
+    span = records[-1]["ts"] - records[0]["ts"] if records else 0.0
+    return {
+        "requests": len(records),
+        "speed": "max" if speed <= 0 else f"{speed:g}x",
+        "captured_seconds": round(span, 2),
+        "seconds": round(seconds, 2),
+        "responses": verdicts,
+        "mismatches": mismatches,
+        # Requests that started >10 ms after their slot: the target (or the
+        # connection pool) could not keep up with the requested pace.
+        "late_starts": sum(1 for x in lags if x > 0.010) if speed > 0 else None,
+        "p99_lag_ms": round(_pct(lags, 99) * 1000, 1) if speed > 0 and lags else None,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"\nreplayed {report['requests']} requests at {report['speed']} in {report['seconds']} s"
+        f" (captured span {report['captured_seconds']} s)"
+    )
+    print("  responses: " + ", ".join(f"{k}={v}" for k, v in sorted(report["responses"].items())))
+    if report["late_starts"] is not None:
+        print(f"  late starts: {report['late_starts']} (p99 lag {report['p99_lag_ms']} ms)")
+    print(f"\n  {'kind':<20}{'req':>7}{'cap p50':>9}{'p50':>9}{'cap p95':>9}{'p95':>9}"
+          f"{'cap p99':>9}{'p99':>9}{'p95 Δ':>9}")
+    for kind, v in report["endpoints"].items():
+        change = "n/a" if v["p95_change"] is None else f"{v['p95_change'] * 100:+.1f}%"
+        cells = [v[f"{w}_p{p}_ms"] for p in (50, 95, 99) for w in ("captured", "replay")]
+        print(f"  {kind:<20}{v['requests']:>7}" + "".join(f"{'n/a' if c is None else c:>9}" for c in cells)
+              + f"{change:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        description="Replay captured SPE sentiment API traffic",
+        epilog="Responses can only be verified for captures taken with SPE_CAPTURE_TEXT=raw. "
+        "hash (the default) and redact captures carry no original text: replaying them "
+        "needs --latency-only and checks status codes and latency, not results.",
+    )
+    ap.add_argument("capture", nargs="+", help="capture JSONL files or globs (rotated files included)")
+    ap.add_argument("--url", default="http://127.0.0.1:8000", help="service base URL")
+    ap.add_argument("--spawn", action="store_true", help="start a local instance on --url's port")
+    ap.add_argument("--token", default=os.environ.get("SPE_API_TOKEN", ""), help="sent for captured batch calls")
+    ap.add_argument("--speed", type=float, default=1.0, help="1 = captured pace, N = N times faster, 0 = max")
+    ap.add_argument("--connections", type=int, default=32, help="keep-alive connections (max concurrency)")
+    ap.add_argument("--limit", type=int, default=None, help="replay only the first N records")
+    ap.add_argument("--max-regression", type=float, default=None,
+                    help="fail if any kind's p95 grows by more than this fraction (0.2 = +20%%)")
+    ap.add_argument("--allow-mismatch", action="store_true", help="don't fail on changed responses")
+    ap.add_argument("--latency-only", action="store_true",
+                    help="accept hash/redact records, whose responses cannot be verified")
+    ap.add_argument("--json", default=None, help="write the full report here")
+    args = ap.parse_args(argv)
+
+    records = load_capture(args.capture, args.limit)
+    if not records:
+        print("no replayable records found", file=sys.stderr)
+        return 2
+    blind = unverifiable(records)
+    if blind:
+        modes = ", ".join(f"{k}={v}" for k, v in sorted(blind.items()))
+        msg = (f"{sum(blind.values())} of {len(records)} records cannot be verified ({modes}): only "
+               f"SPE_CAPTURE_TEXT=raw captures keep the text their response digests were computed from")
+        if not args.latency_only:
+            print(f"refusing to replay: {msg}.\nRe-capture with SPE_CAPTURE_TEXT=raw, or pass "
+                  f"--latency-only to replay for status and latency only.", file=sys.stderr)
+            return 2
+        print(f"WARNING: {msg}; those responses are reported as unverified.", file=sys.stderr)
+    parts = urlsplit(args.url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+
+    proc = spawn_server(port, args.token) if args.spawn else None
+    try:
+        results, seconds = asyncio.run(replay(records, host, port, args.speed, args.connections, args.token))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    report = build_report(records, results, seconds, args.speed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+    failed = False
+    changed = report["responses"].get("mismatch", 0) + report["responses"].get("status", 0)
+    if changed and not args.allow_mismatch:
+        print(f"\n{changed} responses differ from the capture", file=sys.stderr)
+        failed = True
+    if args.max_regression is not None:
+        for kind, v in report["endpoints"].items():
+            if v["p95_change"] is not None and v["p95_change"] > args.max_regression:
+                print(f"{kind}: p95 {v['captured_p95_ms']} -> {v['replay_p95_ms']} ms", file=sys.stderr)
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# spe_schemas.py
+# Request/response models of the SPE Sentiment API and the label rules.
+from __future__ import annotations
+
+from typing import List, Literal, Optional, Dict
+
+from pydantic import BaseModel, Field
+
+from spe_config import (
+    DISPARITY_HIGH_MAX,
+    DISPARITY_HIGH_MIN,
+    DISPARITY_LOW_MAX,
+    DISPARITY_LOW_MIN,
+    NEG_THR,
+    POS_THR,
+    SCORE_MAX_DEFAULT,
+    SCORE_MIN_DEFAULT,
+)
+
+# =============================================================================
+# Schemas
+# =============================================================================
+class AnalyzeIn(BaseModel):
+    text: Optional[str] = None
+    score_total: Optional[float] = None
+    score_min: Optional[float] = None
+    score_max: Optional[float] = None
+
+
+class AnalyzeItemIn(BaseModel):
+    id: str
+    text: str
+    score_total: Optional[float] = None
+    score_min: Optional[float] = None
+    score_max: Optional[float] = None
+
+
+AnalyzeMode = Literal["live", "full"]
+
+
+class LabelRules(BaseModel):
+    """Everything that turns a feature vector into a label and a disparity flag."""
+
+    pos_thr: float = POS_THR
+    neg_thr: float = NEG_THR
+    # Neutral-cue damping (no strong word): scale, then clamp to +/- cap.
+    cue_scale: float = 0.3
+    cue_cap: float = 0.15
+    # Long, weakly polar text (no strong word): scale, then clamp to +/- cap.
+    long_chars: int = 140
+    long_abs: float = 0.35
+    long_scale: float = 0.5
+    long_cap: float = 0.20
+    toxic_floor: float = -0.60
+    score_min: float = SCORE_MIN_DEFAULT
+    score_max: float = SCORE_MAX_DEFAULT
+    disparity_low_min: float = DISPARITY_LOW_MIN
+    disparity_low_max: float = DISPARITY_LOW_MAX
+    disparity_high_min: float = DISPARITY_HIGH_MIN
+    disparity_high_max: float = DISPARITY_HIGH_MAX
+
+
+DEFAULT_RULES = LabelRules()
+
+
+class AnalyzerProfile(LabelRules):
+    """Named per-activity analyzer settings: label rules plus lexicon/cue overrides."""
+
+    activities: List[int] = []  # spe instance ids that use this profile
+    lexicon: Dict[str, float] = Field(default_factory=dict, max_length=5000)  # word -> valence (-4..4)
+    phrases: Dict[str, float] = Field(default_factory=dict, max_length=500)  # "multi word phrase" -> valence
+    neutral_cues: List[str] = Field(default_factory=list, max_length=500)
+    strong_pos: List[str] = Field(default_factory=list, max_length=500)
+    strong_neg: List[str] = Field(default_factory=list, max_length=500)
+
+
+class ThresholdSweepIn(BaseModel):
+    pos_thr: List[float] = Field(default_factory=list, max_length=50)
+    neg_thr: List[float] = Field(default_factory=list, max_length=50)
+
+
+class RelabelIn(BaseModel):
+    speid: int
+    rules: Optional[LabelRules] = None  # defaults: the rules of `profile` / the activity's profile
+    profile: Optional[str] = None
+    sweep: Optional[ThresholdSweepIn] = None  # label counts per (pos_thr, neg_thr)
+    write: bool = False  # store changed labels/compounds in spe_sentiment
+    rows: bool = False  # include per-row results
+
+
+class NearDupIn(BaseModel):
+    threshold: float = Field(0.8, ge=0.0, le=1.0)  # min estimated Jaccard similarity
+    shingle: int = Field(3, ge=1, le=10)  # words per shingle
+    bands: int = Field(16, ge=1, le=64)  # LSH bands
+    rows: int = Field(4, ge=1, le=16)  # signature slots per band
+
+
+class AnalyzeUnifiedIn(BaseModel):
+    text: Optional[str] = None
+    items: Optional[List[AnalyzeItemIn]] = None
+    score_total: Optional[float] = None
+    # Explicit bounds override the profile's score_min/score_max; leave them
+    # unset to use the range of the activity's profile.
+    score_min: Optional[float] = None
+    score_max: Optional[float] = None
+    mode: AnalyzeMode = "full"
+    # Optional projection: only these AnalyzeOut fields are computed/returned.
+    fields: Optional[List[str]] = None
+    # Optional near-duplicate pass over batch items.
+    near_duplicates: Optional[NearDupIn] = None
+    # Analyzer profile id (see GET /profiles), else the profile mapped to
+    # `activity` (spe instance id), else the built-in settings.
+    profile: Optional[str] = None
+    activity: Optional[int] = None
+
+
+class AnalyzeOut(BaseModel):
+    label: str
+    score: float
+    confidence: float
+    compound: float
+    pos: float
+    neu: float
+    neg: float
+    toxic: bool
+    word_count: int
+    char_count: int
+    disparity: bool
+    disparity_reason: Optional[str] = None
+    suggest_confirm: bool
+    # True when the text was over budget and scored on a trimmed copy.
+    trimmed: bool = False
+    # Pre-threshold feature vector; only returned when requested in `fields`.
+    features: Optional[Dict[str, object]] = None
+
+
+class AnalyzeItemOut(AnalyzeOut):
+    id: str
+    # Present only when near_duplicates was requested (null: in no cluster).
+    # /analyze serializes with exclude_unset, so unset fields are left out.
+    dup_cluster: Optional[int] = None
+    dup_similarity: Optional[float] = None
+
+
+class AnalyzeBatchOut(BaseModel):
+    ok: bool
+    results: List[AnalyzeItemOut]
+    # Ids not analyzed because the request ran out of CPU budget; resend them.
+    deferred: List[str] = []
+
+
+class PrefetchFieldIn(BaseModel):
+    key: str = Field(max_length=100)  # e.g. "reflection", "peer_<userid>"
+    text: str
+
+
+class PrefetchIn(BaseModel):
+    activity: Optional[int] = None  # spe instance id (selects the analyzer profile)
+    student: str = Field(max_length=100)
+    fields: List[PrefetchFieldIn] = Field(default_factory=list, max_length=100)
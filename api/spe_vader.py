@@ -0,0 +1,275 @@
+# spe_vader.py
+# Fast VADER core: vaderSentiment's scoring rules over tables compiled once
+# (bit-for-bit equal to SentimentIntensityAnalyzer, see `sentiment_api.py selfcheck`).
+from __future__ import annotations
+
+from typing import List, Mapping, Dict
+import heapq
+import math
+import string
+
+from vaderSentiment import vaderSentiment as vader_ref
+
+# =============================================================================
+# Fast VADER core
+# =============================================================================
+# SentimentIntensityAnalyzer.polarity_scores rebuilds SentiText, re-lowercases
+# the whole token list for every negation/idiom check, concatenates the text
+# char by char for the emoji pass and scans "but" with list.index. FastVader
+# keeps the same rules over tables compiled once from the tuned lexicon, and
+# only runs the emoji and idiom passes when a cheap pre-check finds a candidate.
+# Results are identical to vaderSentiment (run `python sentiment_api.py selfcheck`).
+_PUNCT = string.punctuation
+_B_INCR = vader_ref.B_INCR
+_C_INCR = vader_ref.C_INCR
+_N_SCALAR = vader_ref.N_SCALAR
+_SO_THIS = ("so", "this")
+
+
+def _idiom_bigrams() -> frozenset:
+    """First two words of every multi-word special case / booster phrase."""
+    keys = list(vader_ref.SPECIAL_CASES) + [k for k in vader_ref.BOOSTER_DICT if " " in k]
+    return frozenset(" ".join(k.split()[:2]) for k in keys if " " in k)
+
+
+class FastVader:
+    """Drop-in replacement for SentimentIntensityAnalyzer.polarity_scores."""
+
+    def __init__(self, lexicon: Mapping[str, float], emojis: Mapping[str, str]) -> None:
+        # Only ever read, so a MappingProxyType is used as-is rather than copied.
+        self.lexicon: Mapping[str, float] = lexicon
+        # polarity_scores walks the text one character at a time, so only
+        # single-character emoji keys can ever match.
+        self.emojis: Dict[str, str] = {k: v for k, v in emojis.items() if len(k) == 1}
+        self.emoji_chars = frozenset(self.emojis)
+        self.booster: Dict[str, float] = dict(vader_ref.BOOSTER_DICT)
+        self.negate = frozenset(vader_ref.NEGATE)
+        self.special: Dict[str, float] = dict(vader_ref.SPECIAL_CASES)
+        self.idiom_bigrams = _idiom_bigrams()
+        self.idiom_heads = frozenset(b.split()[0] for b in self.idiom_bigrams)
+
+    # -- text normalisation ---------------------------------------------------
+    def _replace_emojis(self, text: str) -> str:
+        emojis = self.emojis
+        out: List[str] = []
+        prev_space = True
+        for ch in text:
+            desc = emojis.get(ch)
+            if desc is not None:
+                if not prev_space:
+                    out.append(" ")
+                out.append(desc)
+                prev_space = False
+            else:
+                out.append(ch)
+                prev_space = ch == " "
+        return "".join(out)
+
+    def _has_idiom(self, low: List[str]) -> bool:
+        heads = self.idiom_heads
+        bigrams = self.idiom_bigrams
+        for j in range(len(low) - 1):
+            if low[j] in heads and f"{low[j]} {low[j + 1]}" in bigrams:
+                return True
+        return False
+
+    def _negated(self, word: str) -> bool:
+        return word in self.negate or "n't" in word
+
+    # -- rules ------------------------------------------------------------------
+    def _special_idioms(self, valence: float, low: List[str], i: int) -> float:
+        special = self.special
+        onezero = f"{low[i - 1]} {low[i]}"
+        twoonezero = f"{low[i - 2]} {low[i - 1]} {low[i]}"
+        twoone = f"{low[i - 2]} {low[i - 1]}"
+        threetwoone = f"{low[i - 3]} {low[i - 2]} {low[i - 1]}"
+        threetwo = f"{low[i - 3]} {low[i - 2]}"
+        for seq in (onezero, twoonezero, twoone, threetwoone, threetwo):
+            if seq in special:
+                valence = special[seq]
+                break
+        n = len(low)
+        if n - 1 > i:
+            zeroone = f"{low[i]} {low[i + 1]}"
+            if zeroone in special:
+                valence = special[zeroone]
+        if n - 1 > i + 1:
+            zeroonetwo = f"{low[i]} {low[i + 1]} {low[i + 2]}"
+            if zeroonetwo in special:
+                valence = special[zeroonetwo]
+        booster = self.booster
+        for n_gram in (threetwoone, threetwo, twoone):
+            if n_gram in booster:
+                valence = valence + booster[n_gram]
+        return valence
+
+    def _valence(
+        self, words: List[str], low: List[str], i: int, cap_diff: bool, idioms: bool
+    ) -> float:
+        lex = self.lexicon
+        booster = self.booster
+        w = low[i]
+        base = lex[w]
+        valence = base
+        n = len(low)
+        if w == "no" and i != n - 1 and low[i + 1] in lex:
+            valence = 0.0
+        if (
+            (i > 0 and low[i - 1] == "no")
+            or (i > 1 and low[i - 2] == "no")
+            or (i > 2 and low[i - 3] == "no" and low[i - 1] in ("or", "nor"))
+        ):
+            valence = base * _N_SCALAR
+        if cap_diff and words[i].isupper():
+            if valence > 0:
+                valence += _C_INCR
+            else:
+                valence -= _C_INCR
+
+        for start_i in range(3):
+            if i <= start_i:
+                break
+            j = i - (start_i + 1)
+            prev = low[j]
+            if prev in lex:
+                continue
+            s = 0.0
+            if prev in booster:
+                s = booster[prev]
+                if valence < 0:
+                    s *= -1
+                if cap_diff and words[j].isupper():
+                    if valence > 0:
+                        s += _C_INCR
+                    else:
+                        s -= _C_INCR
+            if start_i == 1 and s != 0:
+                s = s * 0.95
+            if start_i == 2 and s != 0:
+                s = s * 0.9
+            valence = valence + s
+
+            if start_i == 0:
+                if self._negated(low[i - 1]):
+                    valence = valence * _N_SCALAR
+            elif start_i == 1:
+                if low[i - 2] == "never" and low[i - 1] in _SO_THIS:
+                    valence = valence * 1.25
+                elif low[i - 2] == "without" and low[i - 1] == "doubt":
+                    pass
+                elif self._negated(low[i - 2]):
+                    valence = valence * _N_SCALAR
+            else:
+                if (low[i - 3] == "never" and low[i - 2] in _SO_THIS) or low[i - 1] in _SO_THIS:
+                    valence = valence * 1.25
+                elif low[i - 3] == "without" and (low[i - 2] == "doubt" or low[i - 1] == "doubt"):
+                    pass
+                elif self._negated(low[i - 3]):
+                    valence = valence * _N_SCALAR
+                if idioms:
+                    valence = self._special_idioms(valence, low, i)
+
+        # "least" check
+        if i > 1 and low[i - 1] not in lex and low[i - 1] == "least":
+            if low[i - 2] != "at" and low[i - 2] != "very":
+                valence = valence * _N_SCALAR
+        elif i > 0 and low[i - 1] not in lex and low[i - 1] == "least":
+            valence = valence * _N_SCALAR
+        return valence
+
+    # -- public -------------------------------------------------------------------
+    def polarity_scores(self, text: str) -> Dict[str, float]:
+        if not text.isascii() and not self.emoji_chars.isdisjoint(text):
+            text = self._replace_emojis(text)
+        text = text.strip()
+
+        words: List[str] = []
+        for tok in text.split():
+            stripped = tok.strip(_PUNCT)
+            words.append(tok if len(stripped) <= 2 else stripped)
+        n = len(words)
+        if not n:
+            return {"neg": 0.0, "neu": 0.0, "pos": 0.0, "compound": 0.0}
+
+        low = [w.lower() for w in words]
+        caps = sum(map(str.isupper, words))
+        cap_diff = 0 < n - caps < n
+        idioms = self._has_idiom(low)
+
+        lex = self.lexicon
+        booster = self.booster
+        sentiments = [0.0] * n
+        for i in range(n):
+            w = low[i]
+            if w in booster or w not in lex:
+                continue
+            if w == "kind" and i < n - 1 and low[i + 1] == "of":
+                continue
+            sentiments[i] = self._valence(words, low, i, cap_diff, idioms)
+
+        # "but" check, including the reference's first-equal-value indexing:
+        # for each nonzero value in order, the first index currently holding
+        # that value is scaled. list.index made this quadratic, so keep a heap
+        # of earlier indices per value; an index whose value was scaled never
+        # holds that value again, so stale entries are simply dropped.
+        if "but" in low:
+            bi = low.index("but")
+            seen: Dict[float, List[int]] = {}
+            for k in range(n):
+                sentiment = sentiments[k]
+                if sentiment == 0:
+                    continue
+                si = k
+                heap = seen.get(sentiment)
+                while heap:
+                    if sentiments[heap[0]] == sentiment:
+                        si = heap[0]
+                        break
+                    heapq.heappop(heap)
+                if si < bi:
+                    sentiments[si] = sentiment * 0.5
+                elif si > bi:
+                    sentiments[si] = sentiment * 1.5
+                for j in {si, k}:
+                    heapq.heappush(seen.setdefault(sentiments[j], []), j)
+
+        # score_valence
+        sum_s = float(sum(sentiments))
+        ep = text.count("!")
+        if ep > 4:
+            ep = 4
+        amp = ep * 0.292
+        qm = text.count("?")
+        if qm > 1:
+            amp += qm * 0.18 if qm <= 3 else 0.96
+        if sum_s > 0:
+            sum_s += amp
+        elif sum_s < 0:
+            sum_s -= amp
+        compound = sum_s / math.sqrt((sum_s * sum_s) + 15)
+        if compound < -1.0:
+            compound = -1.0
+        elif compound > 1.0:
+            compound = 1.0
+
+        pos_sum = 0.0
+        neg_sum = 0.0
+        neu_count = 0
+        for x in sentiments:
+            if x > 0:
+                pos_sum += x + 1
+            elif x < 0:
+                neg_sum += x - 1
+            else:
+                neu_count += 1
+        if pos_sum > math.fabs(neg_sum):
+            pos_sum += amp
+        elif pos_sum < math.fabs(neg_sum):
+            neg_sum -= amp
+        total = pos_sum + math.fabs(neg_sum) + neu_count
+        return {
+            "neg": round(math.fabs(neg_sum / total), 3),
+            "neu": round(math.fabs(neu_count / total), 3),
+            "pos": round(math.fabs(pos_sum / total), 3),
+            "compound": round(compound, 4),
+        }
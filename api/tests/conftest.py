@@ -0,0 +1,5 @@
+# Tests import the service modules from api/ (run: python -m pytest api/tests).
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+
+import sentiment_api as api
+import spe_profiles
+import spe_schemas
+
+client = TestClient(api.app)
+
+
+def test_modes_requires_token(monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, "API_TOKEN", "secret")
+    monkeypatch.setattr(api, "_MODE_REPORT", None)
+    monkeypatch.setattr(api, "mode_agreement_report", lambda: calls.append(1) or {"items": 0})
+
+    assert client.get("/modes").json() == {"ok": False}
+    assert client.get("/modes", headers={"X-API-Token": "wrong"}).json() == {"ok": False}
+    assert calls == []
+
+    ok = {"X-API-Token": "secret"}
+    assert client.get("/modes", headers=ok).json() == {"items": 0}
+    assert client.get("/modes", headers=ok).json() == {"items": 0}
+    assert calls == [1]  # computed once, then cached
+
+
+def test_activity_profile_score_range_applies(monkeypatch):
+    wide = spe_schemas.AnalyzerProfile(
+        activities=[7], score_min=0, score_max=50, disparity_high_min=40, disparity_high_max=50
+    )
+    monkeypatch.setattr(api, "API_TOKEN", None)
+    monkeypatch.setattr(api, "analyzer_profiles", spe_profiles.ProfileCache({"wide": wide}))
+    body = {"text": "This was terrible and useless work.", "score_total": 45, "fields": ["label", "disparity"]}
+
+    assert client.post("/analyze", json=body).json()["disparity"] is False  # 45 is outside the default 5..25
+    out = client.post("/analyze", json={**body, "activity": 7}).json()
+    assert out["label"] == "negative" and out["disparity"] is True
+    # explicit bounds still override the profile's range
+    assert client.post("/analyze", json={**body, "activity": 7, "score_max": 25}).json()["disparity"] is False
@@ -0,0 +1,62 @@
+import spe_core
+import spe_profiles
+import spe_schemas
+
+FILLER = "We met on Tuesday and split the work."
+
+
+def test_within_budget_is_untouched():
+    text = " ".join([FILLER] * 5)
+    assert spe_core.budget_text(text, 1000, 10) == (text, False)
+
+
+def test_sentence_budget_keeps_order_and_extremes():
+    parts = [f"Item {i} was filed on time." for i in range(40)]
+    parts[17] = "Honestly the best, most amazing teammate ever!"
+    parts[29] = "He was rude, useless and hostile."
+    out, trimmed = spe_core.budget_text(" ".join(parts), 100000, 8)
+    assert trimmed
+    kept = spe_core.SENTENCE_SPLIT_RE.split(out)
+    assert parts[17] in kept and parts[29] in kept
+    assert kept == [p for p in parts if p in kept]  # original order
+    assert len(kept) == 8  # the extremes count against the sentence budget
+
+
+def test_contrast_sentence_is_kept():
+    parts = [FILLER] * 30
+    parts[11] = "The slides were fine, however the report was late."
+    out, _ = spe_core.budget_text(" ".join(parts), 100000, 5)
+    assert parts[11] in out
+
+
+def test_char_budget_cuts_one_huge_sentence():
+    text = "word " * 5000
+    out, trimmed = spe_core.budget_text(text.strip(), 1000, 200)
+    assert trimmed and len(out) <= 1000
+    assert not out.startswith(" ") and "wor " not in out
+
+
+def test_defaults_follow_configuration(monkeypatch):
+    text = " ".join([FILLER] * 20)
+    assert spe_core.budget_text(text) == (text, False)
+    monkeypatch.setattr(spe_core, "MAX_SENTENCES", 5)
+    assert spe_core.budget_text(text)[1]
+
+
+def test_extremes_use_the_profile_lexicon():
+    parts = [f"Item {i} was filed on time." for i in range(40)]
+    parts[23] = "The zorbly part was done by Sam."
+    text = " ".join(parts)
+    out, _ = spe_core.budget_text(text, 100000, 4)
+    assert parts[23] not in spe_core.SENTENCE_SPLIT_RE.split(out)
+
+    profile = spe_profiles.compile_profile("p", spe_schemas.AnalyzerProfile(lexicon={"zorbly": 3.0}))
+    out, _ = spe_core.budget_text(text, 100000, 4, profile.vader.lexicon)
+    assert parts[23] in spe_core.SENTENCE_SPLIT_RE.split(out)
+
+
+def test_budget_of_one_keeps_the_extreme():
+    parts = [FILLER] * 12
+    parts[7] = "An outstanding, brilliant contribution."
+    out, trimmed = spe_core.budget_text(" ".join(parts), 100000, 1)
+    assert trimmed and out == parts[7]
@@ -0,0 +1,85 @@
+import csv
+import json
+import re
+
+import pytest
+
+import spe_bulk
+from spe_core import analyze_text_full
+
+RECORDS = [
+    {"id": "a", "text": "Great teamwork, always on time.", "score_total": 24},
+    {"id": "b", "text": "Did nothing and ignored every message.", "score_total": 23},
+    {"id": "c", "text": "Okay.", "score_total": None},
+    {"id": "d", "text": "Helpful at first, but then disappeared for two weeks.", "score_total": 12},
+    {"id": "e", "text": "", "score_total": 15},
+]
+
+
+def expected(rec):
+    out = analyze_text_full(rec["text"], rec["score_total"], None, None).model_dump(exclude={"features"})
+    return {"id": rec["id"], **out}
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_jsonl_rows_equal_analyze_text_full(tmp_path):
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_jsonl(src, RECORDS + [{"request_id": "f", "body": "Nice work on the report."}])
+
+    assert spe_bulk.bulk_analyze(str(src), str(dst), workers=2, chunk_size=2, progress_every=0) == 0
+    rows = read_jsonl(dst)
+    assert rows[:-1] == [expected(r) for r in RECORDS]
+    assert rows[-1] == expected({"id": "f", "text": "Nice work on the report.", "score_total": None})
+    assert all("features" not in r for r in rows)
+
+
+def test_csv_in_and_out(tmp_path):
+    src, dst = tmp_path / "in.csv", tmp_path / "out.csv"
+    with open(src, "w", encoding="utf-8", newline="") as fh:
+        w = csv.DictWriter(fh, fieldnames=["id", "text", "score_total"])
+        w.writeheader()
+        w.writerows({**r, "score_total": "" if r["score_total"] is None else r["score_total"]} for r in RECORDS)
+
+    assert spe_bulk.bulk_analyze(str(src), str(tmp_path / "out.jsonl"), workers=2, chunk_size=2, progress_every=0) == 0
+    assert read_jsonl(tmp_path / "out.jsonl") == [expected(r) for r in RECORDS]
+
+    assert spe_bulk.bulk_analyze(str(src), str(dst), workers=2, chunk_size=2, progress_every=0, features=True) == 0
+    with open(dst, encoding="utf-8", newline="") as fh:
+        reader = csv.DictReader(fh)
+        rows = list(reader)
+    assert reader.fieldnames == spe_bulk.BULK_OUT_FIELDS + ["features", "error"]
+    assert [r["id"] for r in rows] == [r["id"] for r in RECORDS]
+    assert [r["label"] for r in rows] == [expected(r)["label"] for r in RECORDS]
+    assert json.loads(rows[0]["features"])["length"] == len(RECORDS[0]["text"])
+
+
+def test_resume_after_interrupt_skips_finished_ids(tmp_path, monkeypatch, capsys):
+    records = [{"id": f"r{i}", "text": f"Comment number {i} was fine.", "score_total": 10 + i} for i in range(9)]
+    src, dst = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_jsonl(src, records)
+
+    write = spe_bulk._BulkWriter.write
+    calls = []
+
+    def interrupted(self, rows):
+        calls.append(len(rows))
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        write(self, rows)
+
+    monkeypatch.setattr(spe_bulk._BulkWriter, "write", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        spe_bulk.bulk_analyze(str(src), str(dst), workers=2, chunk_size=2, progress_every=1e-9)
+    resume = int(re.findall(r"next offset (\d+)", capsys.readouterr().err)[-1])
+    assert resume == 4 and len(read_jsonl(dst)) == 4
+    monkeypatch.setattr(spe_bulk._BulkWriter, "write", write)
+
+    assert spe_bulk.bulk_analyze(str(src), str(dst), workers=2, chunk_size=2, progress_every=0, resume_from=resume) == 0
+    assert read_jsonl(dst) == [expected(r) for r in records]
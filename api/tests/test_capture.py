@@ -0,0 +1,56 @@
+import json
+
+import spe_capture
+import spe_replay
+
+
+def test_redact_text_keeps_shape():
+    text = "Ana (id 42) did 3/4 of the work, très bien!\nThanks."
+    out = spe_capture.redact_text(text)
+    assert len(out) == len(text)
+    assert out == "xxx (xx 00) xxx 0/0 xx xxx xxxx, xxxx xxxx!\nxxxxxx."
+    assert spe_capture.redact_text("") == ""
+
+
+def test_scrub_applies_text_mode_to_every_text():
+    payload = {"text": "Good work.", "items": [{"id": "a", "text": "Bad."}], "mode": "live"}
+    raw = spe_capture.TrafficCapture("unused", text_mode="raw")._scrub(payload)
+    assert raw == payload
+    hashed = spe_capture.TrafficCapture("unused", text_mode="hash")._scrub(payload)
+    assert hashed["mode"] == "live" and hashed["items"][0]["id"] == "a"
+    assert hashed["text"]["chars"] == 10 and "Good" not in json.dumps(hashed)
+    redacted = spe_capture.TrafficCapture("unused", text_mode="redact")._scrub(payload)
+    assert redacted["items"][0]["text"] == "xxx."
+
+
+def _capture(tmp_path, modes):
+    path = tmp_path / "traffic.jsonl"
+    with open(path, "w", encoding="utf-8") as fh:
+        for i, mode in enumerate(modes):
+            text = "Good work." if mode == "raw" else {"sha256": "ab" * 16, "chars": 10}
+            rec = {"ts": float(i), "method": "POST", "endpoint": "/analyze", "status": 200,
+                   "text_mode": mode, "payload": {"text": text}, "response_sha256": "0" * 64}
+            fh.write(json.dumps(rec) + "\n")
+    return str(path)
+
+
+def test_replay_refuses_unverifiable_captures(tmp_path, capsys):
+    path = _capture(tmp_path, ["raw", "hash", "hash"])
+    assert spe_replay.unverifiable(spe_replay.load_capture([path])) == {"hash": 2}
+    # Refused before any connection is made (nothing listens on port 9).
+    assert spe_replay.main([path, "--url", "http://127.0.0.1:9"]) == 2
+    assert "2 of 3 records cannot be verified" in capsys.readouterr().err
+
+
+def test_hash_records_replay_as_filler_of_the_same_length(tmp_path):
+    rec = spe_replay.load_capture([_capture(tmp_path, ["hash"])])[0]
+    payload, verifiable = spe_replay.replay_payload(rec)
+    assert not verifiable and isinstance(payload["text"], str) and len(payload["text"]) == 10
+    assert spe_replay.replay_payload(rec)[0] == payload  # deterministic
+
+
+def test_per_process_adds_pid_unless_present():
+    cap = spe_capture.TrafficCapture("/var/log/spe/traffic.jsonl")
+    assert cap.per_process() and cap.template == "/var/log/spe/traffic-{pid}.jsonl"
+    assert not cap.per_process() and cap.template == "/var/log/spe/traffic-{pid}.jsonl"
+    assert not spe_capture.TrafficCapture("t.{pid}.jsonl").per_process()
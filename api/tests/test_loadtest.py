@@ -0,0 +1,76 @@
+import asyncio
+import random
+import time
+
+import spe_loadtest
+from spe_loadtest import ConnPool
+
+
+async def _slow_server(delay: float):
+    """Keep-alive HTTP server answering every request after `delay` seconds."""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+                await reader.readexactly(length)
+                await asyncio.sleep(delay)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_pool_overlapping_requests_use_separate_connections():
+    async def run():
+        server = await _slow_server(0.05)
+        port = server.sockets[0].getsockname()[1]
+        pool = ConnPool("127.0.0.1", port, size=3)
+        try:
+            # A fan-out while earlier requests are still in flight.
+            res = await asyncio.gather(*(pool.post_json("/analyze", {"text": "x"}, {}) for _ in range(7)))
+        finally:
+            await pool.close()
+            server.close()
+            await server.wait_closed()
+        return res, len(pool.conns)
+
+    res, opened = asyncio.run(run())
+    assert res == [(200, b"{}")] * 7
+    assert opened == 3
+
+
+def test_payloads_match_the_moodle_callers(monkeypatch):
+    sent = []
+
+    async def record(conn, stats, kind, path, payload, headers):
+        sent.append((kind, payload, headers))
+
+    monkeypatch.setattr(spe_loadtest, "_timed_post", record)
+    monkeypatch.setattr(spe_loadtest, "SETTLE_S", 0.01)
+    monkeypatch.setattr(spe_loadtest, "DEBOUNCE_S", 0.0)
+    monkeypatch.setattr(spe_loadtest, "SELECT_CHANGE_P", 1.0)
+
+    async def run():
+        stop_at = time.perf_counter() + 0.2
+        await asyncio.gather(
+            spe_loadtest.student("127.0.0.1", 9, "/analyze", None, stop_at, random.Random(1), 0.01, 7),
+            spe_loadtest.instructor("127.0.0.1", 9, "/analyze", None, stop_at, random.Random(2), 3, 0.05, "t", 7),
+        )
+
+    asyncio.run(run())
+    by_kind = {kind: (payload, headers) for kind, payload, headers in sent}
+    assert set(by_kind) == {"live", "full", "full-fanout", "batch"}
+
+    live, full = by_kind["live"][0], by_kind["full"][0]
+    # view.php: badge request while typing, full pass for the submitted label/disparity
+    assert (live["mode"], live["fields"], live["activity"]) == ("live", ["label", "word_count"], 7)
+    assert (full["mode"], full["fields"]) == ("full", ["label", "word_count", "disparity"])
+    assert by_kind["full-fanout"][0].keys() == full.keys() == {"text", "mode", "fields", "activity", "score_total"}
+    # analyze_push.php
+    batch, headers = by_kind["batch"]
+    assert (batch["fields"], batch["activity"], headers) == (["compound", "label", "features"], 7, {"X-API-Token": "t"})
+    assert set(batch["items"][0]) == {"id", "text"}
@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+import sentiment_api as api
+import spe_neardup
+
+client = TestClient(api.app)
+
+BASE = "She organised every meeting, wrote most of the report and kept the whole group on schedule."
+OTHER = "He missed the deadline twice and never answered messages in the group chat."
+
+
+def test_minhash_signature():
+    sig = spe_neardup.minhash_signature(BASE, 64)
+    assert len(sig) == 64 and min(sig) >= 0
+    assert spe_neardup.minhash_signature(BASE.upper(), 64) == sig  # case-insensitive
+    assert spe_neardup.minhash_signature("  ...  ", 64) is None
+    # Fewer words than the shingle size still hash (one shorter shingle).
+    assert spe_neardup.minhash_signature("great", 8, k=3) is not None
+
+
+def test_near_duplicate_clusters():
+    texts = [BASE, OTHER, BASE + " Thanks.", "", BASE, OTHER]
+    out = spe_neardup.near_duplicate_clusters(texts, threshold=0.5)
+    assert out[0][0] == out[2][0] == out[4][0] == 1
+    assert out[1][0] == out[5][0] == 2
+    assert out[3] is None
+    assert out[4][1] == 1.0 and 0.5 <= out[2][1] < 1.0
+    assert spe_neardup.near_duplicate_clusters([BASE, OTHER]) == [None, None]
+
+
+def test_dup_fields_only_when_requested(monkeypatch):
+    monkeypatch.setattr(api, "API_TOKEN", "")
+    items = [{"id": "a", "text": BASE}, {"id": "b", "text": BASE}, {"id": "c", "text": OTHER}]
+    for extra in ({}, {"fields": ["label"]}):
+        rows = client.post("/analyze", json={"items": items, **extra}).json()["results"]
+        assert all("dup_cluster" not in r and "dup_similarity" not in r for r in rows)
+
+        body = {"items": items, "near_duplicates": {}, **extra}
+        rows = client.post("/analyze", json=body).json()["results"]
+        assert [(r["dup_cluster"], r["dup_similarity"]) for r in rows] == [(1, 1.0), (1, 1.0), (None, None)]
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import sentiment_api as api
+import spe_core
+import spe_prefetch
+import spe_profiles
+
+client = TestClient(api.app)
+
+DRAFT = "Sam wrote the intro.\nHowever, the charts were late and messy.\n\nStill a solid teammate overall."
+
+
+def wait_analyzed(prefetch, n, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while prefetch.report()["analyzed"] < n:
+        assert time.monotonic() < deadline, prefetch.report()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def prefetch(monkeypatch):
+    p = spe_prefetch.DraftPrefetch(entries=16, max_pending=3)
+    monkeypatch.setattr(api, "draft_prefetch", p)
+    monkeypatch.setattr(api, "API_TOKEN", "")
+    return p
+
+
+def test_submit_coalesces_per_field(prefetch):
+    prefetch.begin()  # hold the worker: nothing is analyzed while "busy"
+    try:
+        assert prefetch.submit(1, "s1", [("reflection", "first draft"), ("peer_2", "  ")]) == 1
+        assert prefetch.submit(1, "s1", [("reflection", "second draft")]) == 1
+        assert list(prefetch.pending.values()) == [("second draft", 1)]
+        prefetch.submit(1, "s2", [("reflection", "a"), ("peer_2", "b"), ("peer_3", "c")])
+        report = prefetch.report()
+        assert (report["coalesced"], report["dropped"], report["pending"]) == (1, 1, 3)
+    finally:
+        prefetch.end()
+    wait_analyzed(prefetch, 3)
+    assert prefetch.submit(1, "s3", [("reflection", "c")]) == 0  # already warm
+    assert prefetch.report()["already_warm"] == 1
+
+
+def test_crlf_batch_item_hits_lf_draft(prefetch):
+    prefetch.submit(None, "s1", [("reflection", DRAFT)])
+    wait_analyzed(prefetch, 1)
+    crlf = DRAFT.replace("\n", "\r\n")
+    profile = spe_profiles.DEFAULT_PROFILE
+    assert prefetch.lookup(crlf, profile) is not None
+    assert prefetch.lookup(DRAFT.replace("\n", "\r"), profile) is not None
+    assert prefetch.lookup(DRAFT + " edited", profile) is None
+
+    warm = prefetch.lookup(crlf, profile)
+    cold = spe_core.analyze_text_fields(crlf, 12, None, None)
+    assert spe_core.analyze_text_fields(crlf, 12, None, None, warm=warm) == cold
+    assert cold["char_count"] == len(crlf)
+    want = frozenset({"label", "compound", "features"})
+    assert warm[0]["length"] == len(crlf)
+    assert spe_core.analyze_text_fields(crlf, 12, None, None, want, warm=warm) == spe_core.analyze_text_fields(
+        crlf, 12, None, None, want
+    )
+
+
+def test_prefetch_hit_matches_cold_batch(prefetch, monkeypatch):
+    texts = [DRAFT, "Great work on the slides!", "Did nothing all term and ignored messages."]
+    body = {"activity": 4, "student": "9", "fields": [{"key": f"f{i}", "text": t} for i, t in enumerate(texts)]}
+    assert client.post("/prefetch", json=body).json() == {"ok": True, "queued": 3}
+    wait_analyzed(prefetch, 3)
+
+    items = [{"id": str(i), "text": t.replace("\n", "\r\n"), "score_total": 5 + 7 * i} for i, t in enumerate(texts)]
+    warm = client.post("/analyze", json={"items": items, "activity": 4})
+    assert warm.headers["X-SPE-Prefetch"] == "hits=3; lookups=3"
+    projected = client.post("/analyze", json={"items": items, "activity": 4, "fields": ["label"]})
+    assert projected.headers["X-SPE-Prefetch"] == "hits=3; lookups=3"
+
+    monkeypatch.setattr(api, "draft_prefetch", spe_prefetch.DraftPrefetch(entries=0))
+    cold = client.post("/analyze", json={"items": items, "activity": 4})
+    assert "X-SPE-Prefetch" not in cold.headers
+    assert warm.content == cold.content  # byte-identical, as spe_replay compares them
@@ -0,0 +1,117 @@
+import json
+import os
+import signal
+
+import pytest
+
+import sentiment_api as api
+import spe_capture
+import spe_prefetch
+import spe_prefork
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="prefork needs os.fork")
+
+
+@pytest.fixture
+def state_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(spe_prefork, "READY_FILE", str(tmp_path / "sentiment_api.ready"))
+    monkeypatch.setattr(spe_prefork, "PID_FILE", str(tmp_path / "sentiment_api.pid"))
+    handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)}
+    yield tmp_path
+    for sig, handler in handlers.items():
+        signal.signal(sig, handler)
+
+
+def test_ready_file_lists_only_ready_workers(state_files):
+    sup = spe_prefork.PreforkSupervisor(api.app, "127.0.0.1", 0, 2)
+    sup.workers = {101: 0.0, 102: 0.0}
+    sup._write_state()
+    assert not os.path.exists(spe_prefork.READY_FILE)
+
+    sup.ready = {102}
+    sup._write_state()
+    with open(spe_prefork.READY_FILE) as fh:
+        assert json.load(fh)["workers"] == [102]
+
+
+def test_no_ready_file_when_no_worker_starts(state_files, monkeypatch):
+    written = []
+    monkeypatch.setattr(spe_prefork, "_write_atomic", lambda path, data: written.append(path))
+
+    def broken_warm_up():
+        raise RuntimeError("bad lexicon")
+
+    monkeypatch.setattr(spe_prefork, "warm_up", broken_warm_up)
+    assert spe_prefork.PreforkSupervisor(api.app, "127.0.0.1", 0, 2).run() == 1
+    assert spe_prefork.READY_FILE not in written
+
+
+def test_respawn_backs_off_then_gives_up(state_files):
+    class CrashAfterReady(spe_prefork.PreforkSupervisor):
+        def _worker(self, ready_fd):
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+            raise RuntimeError("crash")
+
+    sup = CrashAfterReady(api.app, "127.0.0.1", 0, 1, max_failures=3, backoff=0.01, min_uptime=60.0)
+    assert sup.run() == 1
+    assert sup.failures == 3
+    assert not os.path.exists(spe_prefork.READY_FILE)
+
+
+def test_respawn_delay_doubles_and_caps():
+    sup = spe_prefork.PreforkSupervisor(api.app, "127.0.0.1", 0, 1, backoff=0.5)
+    delays = []
+    for n in range(10):
+        sup.failures = n
+        delays.append(sup.respawn_delay())
+    assert delays[:5] == [0.0, 0.5, 1.0, 2.0, 4.0]
+    assert max(delays) == 60.0
+
+
+def test_ready_file_only_answers_for_its_own_address(state_files, monkeypatch):
+    with open(spe_prefork.READY_FILE, "w") as fh:
+        json.dump({"pid": os.getpid(), "host": "127.0.0.1", "port": 8000, "workers": [1]}, fh)
+    monkeypatch.setattr(
+        spe_prefork, "probe_health", lambda host, port, timeout=1.0: {"ok": True} if port == 8000 else None
+    )
+    assert spe_prefork.find_running_instance("127.0.0.1", 8000)["pid"] == os.getpid()
+    assert spe_prefork.find_running_instance("127.0.0.1", 9999) is None
+    assert spe_prefork.find_running_instance("10.0.0.5", 8000)["pid"] is None  # /health probe, not the ready file
+
+
+@pytest.mark.parametrize("workers,enabled", [(1, True), (2, False)])
+def test_multi_worker_prefork_disables_prefetch(monkeypatch, workers, enabled):
+    started = []
+
+    class FakeSupervisor:
+        def __init__(self, app, host, port, n, graceful):
+            started.append(n)
+
+        def run(self):
+            return 0
+
+    monkeypatch.setattr(api, "draft_prefetch", spe_prefetch.DraftPrefetch(entries=5))
+    monkeypatch.setattr(api, "PreforkSupervisor", FakeSupervisor)
+    monkeypatch.setattr(api, "_already_running", lambda host, port: False)
+
+    assert api.main(["prefork", "--workers", str(workers)]) == 0
+    assert started == [workers] and api.draft_prefetch.enabled is enabled
+
+
+@pytest.mark.parametrize("workers,path", [(1, "traffic.jsonl"), (2, "traffic-{pid}.jsonl")])
+def test_multi_worker_prefork_captures_per_worker(monkeypatch, workers, path):
+    class FakeSupervisor:
+        def __init__(self, *args):
+            pass
+
+        def run(self):
+            return 0
+
+    monkeypatch.setattr(api, "traffic_capture", spe_capture.TrafficCapture("traffic.jsonl"))
+    monkeypatch.setattr(api, "draft_prefetch", spe_prefetch.DraftPrefetch(entries=5))
+    monkeypatch.setattr(api, "PreforkSupervisor", FakeSupervisor)
+    monkeypatch.setattr(api, "_already_running", lambda host, port: False)
+
+    assert api.main(["prefork", "--workers", str(workers)]) == 0
+    assert api.traffic_capture.template == path
@@ -0,0 +1,40 @@
+import pytest
+
+import spe_profiles
+import spe_schemas
+
+
+def make_cache(capacity=2):
+    specs = {
+        "a": spe_schemas.AnalyzerProfile(activities=[1], lexicon={"zorbly": 2.0}),
+        "b": spe_schemas.AnalyzerProfile(activities=[2, 3]),
+        "c": spe_schemas.AnalyzerProfile(pos_thr=0.9),
+    }
+    return spe_profiles.ProfileCache(specs, capacity)
+
+
+def test_lru_eviction_and_counters():
+    cache = make_cache()
+    a = cache.get("a")
+    cache.get("b")
+    assert cache.get("a") is a  # hit; "b" is now least recently used
+    cache.get("c")
+    report = cache.report()
+    assert [p["id"] for p in report["profiles"]] == ["a", "c"]
+    assert (report["hits"], report["misses"], report["evictions"]) == (1, 3, 1)
+
+    b = cache.get("b")  # recompiled after eviction, evicts "a"
+    assert b.pid == "b" and [p["id"] for p in cache.report()["profiles"]] == ["c", "b"]
+    assert cache.report()["evictions"] == 2
+
+
+def test_activity_lookup_and_defaults():
+    cache = make_cache(capacity=1)
+    assert cache.get(None) is spe_profiles.DEFAULT_PROFILE
+    assert cache.for_activity(None) is spe_profiles.DEFAULT_PROFILE
+    assert cache.for_activity(99) is spe_profiles.DEFAULT_PROFILE
+    assert cache.for_activity(3).pid == "b"
+    assert cache.for_activity(1).vader.lexicon["zorbly"] == 2.0
+    assert cache.report()["cached"] == 1
+    with pytest.raises(KeyError):
+        cache.get("missing")
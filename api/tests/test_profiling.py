@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import sentiment_api as api
+import spe_profiling
+
+client = TestClient(api.app)
+
+
+def test_should_sample_profile_follows_the_rate(monkeypatch):
+    monkeypatch.setattr(spe_profiling, "PROFILE_SAMPLE", 0.0)
+    assert not any(spe_profiling.should_sample_profile() for _ in range(100))
+
+    monkeypatch.setattr(spe_profiling, "PROFILE_SAMPLE", 0.25)
+    monkeypatch.setattr(spe_profiling.random, "random", lambda: 0.2)
+    assert spe_profiling.should_sample_profile()
+    monkeypatch.setattr(spe_profiling.random, "random", lambda: 0.3)
+    assert not spe_profiling.should_sample_profile()
+
+
+@pytest.mark.parametrize(
+    "header,token,enabled",
+    [
+        (None, "secret", False),
+        ("0", "secret", False),
+        ("false", "secret", False),
+        ("off", "secret", False),
+        ("", "secret", False),
+        ("1", "secret", True),
+        ("true", "secret", True),
+        (" Yes ", "secret", True),
+        ("1", "wrong", False),
+        ("1", None, False),
+    ],
+)
+def test_server_timing_only_when_enabled(monkeypatch, header, token, enabled):
+    monkeypatch.setattr(api, "API_TOKEN", "secret")
+    monkeypatch.setattr(api, "should_sample_profile", lambda: False)
+    headers = {k: v for k, v in (("X-SPE-Profile", header), ("X-API-Token", token)) if v is not None}
+
+    r = client.post("/analyze", json={"text": "Great work, thanks for the help."}, headers=headers)
+    assert r.status_code == 200 and r.json()["label"] == "positive"
+    assert ("server-timing" in r.headers) is enabled
+    if enabled:
+        assert "preprocess;dur=" in r.headers["server-timing"] and ", total;dur=" in r.headers["server-timing"]
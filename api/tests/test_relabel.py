@@ -0,0 +1,69 @@
+import pytest
+
+import spe_bench
+import spe_core
+import spe_db
+import spe_schemas
+
+PLAIN = {
+    "base": 0.0, "contrast": 0.0, "extreme": None, "neutral_cue": False,
+    "strong_pos": False, "strong_neg": False, "toxic": False, "length": 40,
+}
+
+
+def rules(**kw):
+    return spe_schemas.DEFAULT_RULES.model_copy(update=kw)
+
+
+def test_apply_label_rules_combines_and_thresholds():
+    assert spe_core.apply_label_rules({**PLAIN, "contrast": 0.9}) == (0.9, "positive")
+    comp, label = spe_core.apply_label_rules({**PLAIN, "contrast": 0.2, "extreme": -0.9})
+    assert comp == pytest.approx(-0.35) and label == "negative"
+    assert spe_core.apply_label_rules({**PLAIN, "contrast": 0.02})[1] == "neutral"
+    assert spe_core.apply_label_rules({**PLAIN, "contrast": 0.5}, rules(pos_thr=0.9))[1] == "neutral"
+
+
+def test_apply_label_rules_damping():
+    r = spe_schemas.DEFAULT_RULES
+    assert spe_core.apply_label_rules({**PLAIN, "contrast": 0.9, "neutral_cue": True})[0] == r.cue_cap
+    strong = {**PLAIN, "contrast": 0.9, "neutral_cue": True, "strong_pos": True}
+    assert spe_core.apply_label_rules(strong)[0] == 0.9
+    long_ = {**PLAIN, "contrast": 0.3, "length": r.long_chars}
+    assert spe_core.apply_label_rules(long_)[0] == pytest.approx(0.3 * r.long_scale)
+    assert spe_core.apply_label_rules({**long_, "length": r.long_chars - 1})[0] == 0.3
+
+
+def test_apply_label_rules_toxic_floor():
+    floor = spe_schemas.DEFAULT_RULES.toxic_floor
+    assert spe_core.apply_label_rules({**PLAIN, "contrast": 0.5, "toxic": True}) == (floor, "toxic")
+    assert spe_core.apply_label_rules({**PLAIN, "contrast": -0.9, "toxic": True}) == (-0.9, "negative")
+
+
+def test_relabel_columns_matches_analyze():
+    corpus = spe_bench.spe_corpus(300, 3)
+    want = frozenset({"label", "compound", "disparity", "features"})
+    rows = [spe_core.analyze_text_fields(str(r["text"]), r["score_total"], None, None, want) for r in corpus]
+    cols = {name: [row["features"][name] for row in rows] for name in spe_core.FEATURE_NAMES}
+    comps, labels, disp = spe_db.relabel_columns(cols, [r["score_total"] for r in corpus])
+    assert labels == [row["label"] for row in rows]
+    assert [round(c, 6) for c in comps] == [row["compound"] for row in rows]
+    assert disp == [row["disparity"] for row in rows]
+
+
+def test_relabel_activity_after_worker(tmp_path):
+    db = spe_db.SentimentDB(f"sqlite:///{tmp_path / 'spe.db'}")
+    db.create_standin()
+    for i, r in enumerate(spe_bench.spe_corpus(60, 5)):
+        db.conn.execute(
+            db.sql(
+                "INSERT INTO {t} (speid, raterid, rateeid, type, text, status, timecreated) "
+                "VALUES (7, ?, 1, 'peer_comment', ?, 'pending', 0)"
+            ),
+            [100 + i, str(r["text"])],
+        )
+    spe_db.SentimentWorker(db).run(once=True)
+
+    out = spe_db.relabel_activity(db, 7)
+    assert (out["items"], out["missing_features"], out["changed"]) == (60, 0, 0)
+    sweep = spe_db.relabel_activity(db, 7, sweep_pos=[spe_schemas.DEFAULT_RULES.pos_thr, 0.99])["sweep"]
+    assert sweep[0]["changed"] == 0 and sweep[1]["labels"].get("positive", 0) <= out["labels"].get("positive", 0)
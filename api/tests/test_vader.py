@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+import spe_bench
+import spe_lexicon
+import spe_profiles
+import spe_schemas
+
+
+def test_selfcheck_parity():
+    assert spe_bench.selfcheck(300) == 0
+
+
+def test_shares_the_read_only_lexicon():
+    assert spe_lexicon.vader.lexicon is spe_lexicon.LEXICON
+    assert isinstance(spe_lexicon.vader.lexicon, MappingProxyType)
+
+
+def test_shared_instance_across_threads():
+    texts = spe_bench.GOLDEN_CORPUS * 4
+    want = [spe_lexicon.analyzer.polarity_scores(t) for t in texts]
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(spe_lexicon.vader.polarity_scores, texts)) == want
+
+
+def test_profile_lexicon_is_read_only():
+    cp = spe_profiles.compile_profile("t", spe_schemas.AnalyzerProfile(lexicon={"zorbly": -1.5}))
+    assert cp.vader.lexicon["zorbly"] == -1.5
+    assert "zorbly" not in spe_lexicon.LEXICON
+    assert isinstance(cp.vader.lexicon, MappingProxyType)
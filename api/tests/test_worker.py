@@ -0,0 +1,58 @@
+import pytest
+
+import spe_core
+import spe_db
+
+TEXTS = ["Great teammate, always on time.", "Never replied to anyone.", "Did the slides."]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = spe_db.SentimentDB(f"sqlite:///{tmp_path / 'spe.db'}")
+    db.create_standin()
+    for i, text in enumerate(TEXTS):
+        db.conn.execute(
+            db.sql(
+                "INSERT INTO {t} (speid, raterid, rateeid, type, text, status, timecreated) "
+                "VALUES (1, ?, 2, 'peer_comment', ?, 'pending', 0)"
+            ),
+            [10 + i, text],
+        )
+    return db
+
+
+def _rows(db):
+    cur = db.conn.execute(db.sql("SELECT id, status, label, leaseowner, leaseuntil FROM {t} ORDER BY id"))
+    return cur.fetchall()
+
+
+def test_claim_leases_without_touching_status_or_label(db):
+    worker = spe_db.SentimentWorker(db, lease_seconds=60)
+    assert len(worker.claim(1000)) == len(TEXTS)
+    for _, status, label, owner, until in _rows(db):
+        assert (status, label, owner, until) == ("pending", None, worker.token, 1060)
+
+    other = spe_db.SentimentWorker(db, lease_seconds=60)
+    assert other.claim(1030) == []
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_cannot_write(db):
+    first = spe_db.SentimentWorker(db, lease_seconds=60)
+    rows = first.claim(1000)
+    second = spe_db.SentimentWorker(db, lease_seconds=60)
+    assert sorted(second.claim(1061)) == sorted(rows)
+
+    rid = rows[0][0]
+    first._write(1070, [(rid, 0.5, "positive", None)], [], [])
+    assert _rows(db)[0][1:4] == ("pending", None, second.token)
+
+
+def test_run_finishes_rows_and_releases_lease(db):
+    worker = spe_db.SentimentWorker(db)
+    stats = worker.run(once=True)
+    assert stats["done"] == len(TEXTS)
+    for (rid, status, label, owner, until), text in zip(_rows(db), TEXTS):
+        assert (status, owner, until) == ("done", None, 0)
+        assert label == spe_core.analyze_text_full(text, None, None, None).label
+    n = db.conn.execute(db.sql("SELECT COUNT(*) FROM {f}")).fetchone()[0]
+    assert n == len(TEXTS)
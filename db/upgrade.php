@@ -136,5 +136,55 @@ function xmldb_spe_upgrade(int $oldversion) {
         upgrade_mod_savepoint(true, 2025102500, 'spe');
     }
 
+    // STEP 3: Sentiment feature store (relabeling without re-analysis)
+    if ($oldversion < 2025102600) {
+        $table = new xmldb_table('spe_sentiment_feat');
+        if (!$dbman->table_exists($table)) {
+            $table->add_field('id',           XMLDB_TYPE_INTEGER, '10',    null, XMLDB_NOTNULL, XMLDB_SEQUENCE, null);
+            $table->add_field('sentimentid',  XMLDB_TYPE_INTEGER, '10',    null, XMLDB_NOTNULL, null, null);
+            $table->add_field('base',         XMLDB_TYPE_NUMBER,  '12,10', null, XMLDB_NOTNULL, null, null);
+            $table->add_field('contrast',     XMLDB_TYPE_NUMBER,  '12,10', null, XMLDB_NOTNULL, null, null);
+            $table->add_field('extreme',      XMLDB_TYPE_NUMBER,  '12,10', null, null,          null, null);
+            $table->add_field('neutralcue',   XMLDB_TYPE_INTEGER, '1',     null, XMLDB_NOTNULL, null, '0');
+            $table->add_field('strongpos',    XMLDB_TYPE_INTEGER, '1',     null, XMLDB_NOTNULL, null, '0');
+            $table->add_field('strongneg',    XMLDB_TYPE_INTEGER, '1',     null, XMLDB_NOTNULL, null, '0');
+            $table->add_field('toxic',        XMLDB_TYPE_INTEGER, '1',     null, XMLDB_NOTNULL, null, '0');
+            $table->add_field('textlength',   XMLDB_TYPE_INTEGER, '10',    null, XMLDB_NOTNULL, null, '0');
+            $table->add_field('timemodified', XMLDB_TYPE_INTEGER, '10',    null, XMLDB_NOTNULL, null, '0');
+
+            $table->add_key('primary', XMLDB_KEY_PRIMARY, ['id']);
+            // 3-arg add_index
+            $table->add_index('sentimentid_ix', XMLDB_INDEX_UNIQUE, ['sentimentid']);
+
+            $dbman->create_table($table);
+        }
+
+        upgrade_mod_savepoint(true, 2025102600, 'spe');
+    }
+
+    // STEP 4: Worker lease columns on the sentiment queue
+    if ($oldversion < 2025102700) {
+        $table = new xmldb_table('spe_sentiment');
+
+        $field = new xmldb_field('leaseowner', XMLDB_TYPE_CHAR, '40', null, null, null, null, 'status');
+        if (!$dbman->field_exists($table, $field)) {
+            $dbman->add_field($table, $field);
+        }
+        $field = new xmldb_field('leaseuntil', XMLDB_TYPE_INTEGER, '10', null, XMLDB_NOTNULL, null, '0', 'leaseowner');
+        if (!$dbman->field_exists($table, $field)) {
+            $dbman->add_field($table, $field);
+        }
+
+        $index = new xmldb_index('status_lease_ix', XMLDB_INDEX_NOTUNIQUE, ['status', 'leaseuntil']);
+        if (!$dbman->index_exists($table, $index)) {
+            $dbman->add_index($table, $index);
+        }
+
+        // New columns start free (leaseowner NULL, leaseuntil 0): every pending
+        // row is claimable, and status/label keep their install.xml meaning.
+
+        upgrade_mod_savepoint(true, 2025102700, 'spe');
+    }
+
     return true;
 }
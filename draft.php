@@ -1,6 +1,7 @@
 <?php
 // mod/spe/draft.php
 require('../../config.php');
+require_once($CFG->libdir . '/filelib.php'); // curl, for the prefetch call
 
 $cmid = required_param('id', PARAM_INT);
 $action = required_param('action', PARAM_ALPHA); // save|load|clear
@@ -25,6 +26,48 @@ switch ($action) {
             $raw = substr($raw, 0, 200000);
         }
         set_user_preference($key, $raw, $USER);
+
+        // Best effort: let the sentiment API pre-analyze the texts that will
+        // be queued on submit (reflection + peer comments), so the approval
+        // batch finds them warm. The call is synchronous but /prefetch only
+        // queues the texts, and the timeouts cap it at 500 ms per autosave.
+        $draft = json_decode($raw, true);
+        if (is_array($draft)) {
+            $fields = [];
+            if (!empty($draft['reflection']) && is_string($draft['reflection'])) {
+                $fields[] = ['key' => 'reflection', 'text' => $draft['reflection']];
+            }
+            foreach ((array)($draft['peertexts'] ?? []) as $pid => $text) {
+                if (is_string($text) && trim($text) !== '') {
+                    $fields[] = ['key' => 'peer_' . (int)$pid, 'text' => $text];
+                }
+            }
+            if ($fields) {
+                $apiurl = trim((string)get_config('spe', 'sentiment_live_url')) ?: 'http://127.0.0.1:8000/analyze';
+                $apiurl = preg_replace('#/analyze/?$#', '', rtrim($apiurl, '/')) . '/prefetch';
+                $apitoken = trim((string)get_config('spe', 'sentiment_api_token'));
+                $headers = ['Content-Type: application/json'];
+                if ($apitoken !== '') {
+                    $headers[] = 'X-API-Token: ' . $apitoken;
+                }
+                try {
+                    $curl = new curl();
+                    $curl->post($apiurl, json_encode([
+                        'activity' => (int)$cm->instance,
+                        'student'  => (string)$USER->id,
+                        'fields'   => $fields,
+                    ], JSON_UNESCAPED_UNICODE), [
+                        'CURLOPT_HTTPHEADER'        => $headers,
+                        'CURLOPT_NOSIGNAL'          => 1,
+                        'CURLOPT_CONNECTTIMEOUT_MS' => 200,
+                        'CURLOPT_TIMEOUT_MS'        => 500,
+                    ]);
+                } catch (Exception $e) {
+                    // Prefetch is best effort; the approval batch analyzes anything missed.
+                }
+            }
+        }
+
         echo json_encode(['ok' => true]);
         break;
 
@@ -2,7 +2,7 @@
 defined('MOODLE_INTERNAL') || die();
 
 $plugin->component = 'mod_spe';       // Full name of the plugin.
-$plugin->version   = 2025100500;      // YYYYMMDDHH (update when you change code).
+$plugin->version   = 2025102700;      // YYYYMMDDHH (update when you change code).
 $plugin->requires  = 2022041900;      // Minimum Moodle version (Moodle 4.x).
 $plugin->maturity  = MATURITY_ALPHA;  // This is still early development.
 $plugin->release   = 'v0.1';          // Human-readable version.
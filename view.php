@@ -687,6 +687,7 @@ if (!$submitted) {
 
         const wrappers = document.querySelectorAll('.spe-livewrap[data-live="1"]');
         const updates  = [];
+        const pending  = [];  // per textarea: run the full pass if one is due
 
         wrappers.forEach(wrap => {
             const ta    = wrap.querySelector('textarea.spe-live-textarea');
@@ -711,24 +712,45 @@ if (!$submitted) {
             const peerLabel = (ctx.kind === 'peer') ? document.getElementById(`disparity_peer_label_${ctx.id}`) : null;
             const peerTotal = (ctx.kind === 'peer') ? document.getElementById(`disparity_peer_total_${ctx.id}`) : null;
 
-            const update = debounce(async () => {
-                const text = ta.value || "";
-                wc.textContent = "Words: " + (text.trim().split(/\s+/).filter(Boolean).length || 0);
+            // Typing gets a cheap mode=live badge; the label and disparity that
+            // go into the hidden inputs always come from a mode=full pass, run
+            // once the text settles (and before submit if one is still due).
+            let dirty = true;  // current text/scores not yet seen by a full pass
+            let seq = 0;
 
+            async function analyze(mode, fields) {
+                const text = ta.value || "";
                 const score_total = (ctx.kind === 'peer') ? currentPeerTotal(ctx.id) : currentSelfTotal();
+                const res = await fetch(LIVE_API, {
+                    method: "POST",
+                    headers: { "Content-Type": "application/json" },
+                    body: JSON.stringify({
+                        text,
+                        mode,
+                        fields,
+                        activity: <?php echo (int)$cm->instance; ?>,
+                        score_total
+                    })
+                });
+                return { data: await res.json(), score_total };
+            }
 
+            const preview = debounce(async () => {
+                const text = ta.value || "";
+                wc.textContent = "Words: " + (text.trim().split(/\s+/).filter(Boolean).length || 0);
                 try {
-                    const res = await fetch(LIVE_API, {
-                        method: "POST",
-                        headers: { "Content-Type": "application/json" },
-                        body: JSON.stringify({
-                            text,
-                            score_total,
-                            score_min: <?php echo (int)SPE_SCORE_MIN; ?>,
-                            score_max: <?php echo (int)SPE_SCORE_MAX; ?>
-                        })
-                    });
-                    const data = await res.json();
+                    const { data } = await analyze("live", ["label", "word_count"]);
+                    if (dirty) applyBadge(badge, data.label || "neutral");  // a full result wins
+                } catch {
+                    // keep the last badge; the full pass reports errors
+                }
+            }, 250);
+
+            async function full() {
+                const mine = ++seq;
+                try {
+                    const { data, score_total } = await analyze("full", ["label", "word_count", "disparity"]);
+                    if (mine !== seq) return;  // a newer pass is on its way
 
                     applyBadge(badge, data.label || "neutral");
                     wc.textContent = "Words: " + (data.word_count ?? 0);
@@ -754,14 +776,19 @@ if (!$submitted) {
                     }
 
                     refreshGlobalBanner();
+                    dirty = false;
                 } catch {
-                    applyBadge(badge, "neutral");
+                    if (mine === seq) applyBadge(badge, "neutral");
                 }
-            }, 250);
+            }
+            const settle = debounce(full, 1000);
+            const rescore = debounce(full, 250);
+            const update = () => { dirty = true; rescore(); };
 
-            ta.addEventListener('input', update);
+            ta.addEventListener('input', () => { dirty = true; preview(); settle(); });
             wrap._update = update;
             updates.push(update);
+            pending.push(() => (dirty ? full() : null));
         });
 
         // Recompute when any select changes (self or peer)
@@ -771,6 +798,18 @@ if (!$submitted) {
             sel.addEventListener('input',  updateAll);
         });
 
+        // Submitting before a full pass caught up: finish it, then submit.
+        const form = document.querySelector('form[action*="/mod/spe/view.php"]');
+        if (form) {
+            form.addEventListener('submit', async (ev) => {
+                const due = pending.map(fn => fn()).filter(Boolean);
+                if (!due.length) return;
+                ev.preventDefault();
+                await Promise.all(due);
+                form.submit();
+            });
+        }
+
         // initial pass
         updateAll();
     })();